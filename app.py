@@ -18,6 +18,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 from config.database import get_database_connection
 from src.database_service import DatabaseService
 from src.database_service_provisioning import ProvisioningService
+from src.warmup import PAGES, record_visit, likely_next, prefetch_async, warm_in_background
+from utils.rerun_timing import timed, timing_summary, SHOW_TIMINGS
 
 # Configuração da página
 st.set_page_config(
@@ -104,9 +106,17 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource(show_spinner=False)
+def start_process_warmup():
+    """Uma vez por processo do servidor: aquece o st.cache_data de todas as páginas"""
+    return warm_in_background()
+
 def main():
     """Função principal da aplicação"""
     
+    # Primeira sessão do processo: caches em memória começam a aquecer em segundo plano
+    start_process_warmup()
+    
     # Header
     st.markdown('<h1 class="main-header">🚛 Sistema FOX - Auditoria Completa</h1>', unsafe_allow_html=True)
     
@@ -116,31 +126,35 @@ def main():
     # Menu de navegação completo
     page = st.sidebar.selectbox(
         "Selecione uma página:",
-        [
-            "🚚 Cargas",
-            "📦 Provisionamento",
-            "💰 Financeiro",
-            "📋 Contratos",
-            "🗺️ Mapa"
-        ]
+        list(PAGES)
     )
     
-    # Roteamento de páginas
-    if page == "🚚 Cargas":
-        from pages.cargas import show_cargas_page
-        show_cargas_page()
-    elif page == "📦 Provisionamento":
-        from pages.provisionamento import show_provisionamento_page
-        show_provisionamento_page()
-    elif page == "💰 Financeiro":
-        from pages.financeiro import show_financeiro_page
-        show_financeiro_page()
-    elif page == "📋 Contratos":
-        from pages.contratos import show_contratos_page
-        show_contratos_page()
-    elif page == "🗺️ Mapa":
-        from pages.mapa import show_mapa_page
-        show_mapa_page()
+    # Roteamento de páginas (rerun completo; reruns de fragmentos são medidos à parte)
+    with timed(f"{page}:pagina"):
+        if page == "🚚 Cargas":
+            from pages.cargas import show_cargas_page
+            show_cargas_page()
+        elif page == "📦 Provisionamento":
+            from pages.provisionamento import show_provisionamento_page
+            show_provisionamento_page()
+        elif page == "💰 Financeiro":
+            from pages.financeiro import show_financeiro_page
+            show_financeiro_page()
+        elif page == "📋 Contratos":
+            from pages.contratos import show_contratos_page
+            show_contratos_page()
+        elif page == "🗺️ Mapa":
+            from pages.mapa import show_mapa_page
+            show_mapa_page()
+    
+    if SHOW_TIMINGS:
+        with st.sidebar.expander("⏱️ Tempos de execução"):
+            st.dataframe(pd.DataFrame.from_dict(timing_summary(), orient='index').round(1))
+    
+    # Página pronta: pré-carregar em segundo plano as próximas prováveis
+    record_visit(st.session_state.get('last_page'), page)
+    st.session_state['last_page'] = page
+    prefetch_async(likely_next(page))
 
 if __name__ == "__main__":
     main()
@@ -4,6 +4,25 @@ Configuração de conexão com MongoDB
 import os
 from pymongo import MongoClient
 
+# Coleções usadas pelo sistema de auditoria
+COLLECTION_NAMES = [
+    'ticketv2',
+    'ticketv2_transactions',
+    'orderv2',
+    'users',
+    'provisionings',
+    'grains',
+    'finances',
+    'finances_categories',
+    'addresses',
+    'cities',
+    'contract_delivery_summary'
+]
+
+def get_collections_from_db(db):
+    """Monta o dicionário de coleções a partir de um database pymongo"""
+    return {name: db[name] for name in COLLECTION_NAMES}
+
 class DatabaseConfig:
     """Configuração e conexão com MongoDB"""
     
@@ -39,20 +58,7 @@ class DatabaseConfig:
         if self.db is None:
             raise Exception("Conexão com banco não estabelecida")
             
-        collections = {
-            'ticketv2': self.db['ticketv2'],
-            'ticketv2_transactions': self.db['ticketv2_transactions'],
-            'orderv2': self.db['orderv2'],
-            'users': self.db['users'],
-            'provisionings': self.db['provisionings'],
-            'grains': self.db['grains'],
-            'finances': self.db['finances'],
-            'finances_categories': self.db['finances_categories'],
-            'addresses': self.db['addresses'],
-            'cities': self.db['cities']
-        }
-        
-        return collections
+        return get_collections_from_db(self.db)
     
     def test_collections(self):
         """Testa se as coleções existem e têm dados"""
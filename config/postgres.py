@@ -0,0 +1,157 @@
+"""
+Configuração de conexão com PostgreSQL
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import pg8000
+    PG8000_AVAILABLE = True
+except ImportError:
+    PG8000_AVAILABLE = False
+    pg8000 = None
+
+POSTGRES_CONFIG = {
+    'host': "24.199.75.66",
+    'port': 5432,
+    'user': "myuser",
+    'password': "mypassword",
+    'database': "mydb"
+}
+
+def get_postgres_connection():
+    """Abre uma nova conexão pg8000 com o PostgreSQL"""
+    if not PG8000_AVAILABLE:
+        raise ImportError("pg8000 não instalado. Execute: pip install pg8000")
+    return pg8000.connect(**POSTGRES_CONFIG)
+
+# Pool compartilhado pelas leituras do dashboard
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 8
+POOL_ACQUIRE_TIMEOUT = 10
+# Conexões ociosas há mais tempo que isso são testadas antes do uso
+POOL_HEALTH_CHECK_IDLE = 30
+STATEMENT_TIMEOUT_MS = 30000
+
+class PostgresPool:
+    """Pool de conexões pg8000 compartilhado pelo processo"""
+
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 statement_timeout_ms=STATEMENT_TIMEOUT_MS, connect=None):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_timeout_ms = statement_timeout_ms
+        self._connect = connect or get_postgres_connection
+        self._idle = []  # (conexão, momento em que voltou ao pool)
+        self._size = 0
+        self._condition = threading.Condition()
+
+        for _ in range(min_size):
+            self._idle.append((self._open(), time.monotonic()))
+            self._size += 1
+
+    def _open(self):
+        connection = self._connect()
+        cursor = connection.cursor()
+        cursor.execute(f"SET statement_timeout = {int(self.statement_timeout_ms)}")
+        cursor.close()
+        connection.commit()
+        return connection
+
+    @staticmethod
+    def _healthy(connection) -> bool:
+        try:
+            # Transação abortada por erro de SQL não significa conexão quebrada
+            connection.rollback()
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=POOL_ACQUIRE_TIMEOUT):
+        """Retira uma conexão do pool, abrindo uma nova se houver vaga"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                    if time.monotonic() - returned_at < POOL_HEALTH_CHECK_IDLE or self._healthy(connection):
+                        return connection
+                    self._discard(connection)
+                    self._size -= 1
+                    continue
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Pool PostgreSQL esgotado ({self.max_size} conexões em uso)")
+                self._condition.wait(remaining)
+
+        # Abrir fora do lock para não bloquear quem está devolvendo conexões
+        try:
+            return self._open()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, connection, discard=False):
+        """Devolve a conexão; transação aberta é desfeita antes de reutilizar"""
+        if not discard:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+
+        with self._condition:
+            if discard:
+                self._discard(connection)
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Empresta uma conexão pelo tempo do bloco with"""
+        connection = self.acquire()
+        try:
+            yield connection
+        except Exception:
+            # Conexão quebrada não volta para o pool
+            self.release(connection, discard=not self._healthy(connection))
+            raise
+        else:
+            self.release(connection)
+
+    def close_all(self):
+        with self._condition:
+            for connection, _ in self._idle:
+                self._discard(connection)
+            self._size -= len(self._idle)
+            self._idle = []
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_postgres_pool() -> PostgresPool:
+    """Pool único do processo, criado no primeiro uso"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PostgresPool()
+        return _pool
@@ -0,0 +1,96 @@
+"""
+Dublês compartilhados pelos testes
+Coleção do MongoDB que devolve documentos fixos e conexão do PostgreSQL que
+registra os comandos e responde às consultas por trecho do SQL
+"""
+from contextlib import contextmanager
+
+def normalize_sql(sql: str) -> str:
+    """SQL numa linha só, com espaços simples (como os testes comparam)"""
+    return " ".join(sql.split())
+
+class FakeCollection:
+    """Coleção que registra os pipelines recebidos e devolve documentos fixos"""
+
+    def __init__(self, documents=None):
+        self.documents = documents or []
+        self.pipelines = []
+        self.options = []
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        self.options.append(kwargs)
+        return list(self.documents)
+
+    def find(self, query, projection=None):
+        """Só o filtro de marca d'água: um campo com $gte"""
+        (field, condition), = query.items()
+        return [doc for doc in self.documents if doc.get(field) and doc[field] >= condition['$gte']]
+
+class RecordingConnection:
+    """Conexão (e pool) do PostgreSQL que guarda (sql, params) de cada comando.
+
+    `results`: {trecho do SQL: linhas ou função dos parâmetros}; o primeiro
+    trecho contido no comando define o que fetchall/fetchone devolvem.
+    `fail_on`: {trecho do SQL: valor}; comando com o trecho e o valor entre
+    os parâmetros levanta ValueError.
+    """
+
+    def __init__(self, results=None, fail_on=None):
+        self.results = results or {}
+        self.fail_on = fail_on or {}
+        self.commands = []
+        self.commits = 0
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def statements(self):
+        """Só o SQL dos comandos executados"""
+        return [sql for sql, _ in self.commands]
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+class RecordingCursor:
+    """Cursor da RecordingConnection: registra o comando e prepara a resposta"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.description = []
+
+    @property
+    def commands(self):
+        return self.connection.commands
+
+    def execute(self, sql, params=None):
+        sql = normalize_sql(sql)
+        self.connection.commands.append((sql, params))
+        for fragment, value in self.connection.fail_on.items():
+            if fragment in sql and value in (params or ()):
+                raise ValueError("linha inválida")
+        self.rows = []
+        for fragment, rows in self.connection.results.items():
+            if fragment in sql:
+                self.rows = list(rows(params) if callable(rows) else rows)
+                break
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
@@ -3,12 +3,82 @@ Página de Cargas - Sistema de Auditoria FOX
 """
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import datetime
+from typing import Optional
 from config.database import get_database_connection
 from src.database_service import DatabaseService
+from src.postgres_service import PostgreSQLService
+from src.cargas_query import CargasFilters
+from src.query_cache import stale_while_revalidate
+from src.cache_versions import versioned_cache, BACKSTOP_TTL
+from src.snapshots import load_dataset
+from src.analytics import frame_totals
+from src.filter_index import FilterIndex
+from src.search_index import TicketIndex
+from utils.formatters import format_brl, format_number, format_frame
+from utils.paginated_grid import paginated_grid, frame_page_fetcher
+from utils.rerun_timing import timed_stage
 
-@st.cache_data(ttl=60)
+# Linhas por página da tabela (PostgreSQL e memória)
+PG_PAGE_SIZE = 100
+
+# Colunas dos seletores (bitmap por valor) e de data (busca binária) no índice de filtros
+CARGAS_FILTER_DIMENSIONS = [
+    'status', 'provisioning_status', 'paid_status', 'grain_name', 'contract_type',
+    'buyer_display', 'seller_display'
+]
+CARGAS_FILTER_DATES = ['loadingDate']
+
+# Totalizador -> coluna somada no recorte filtrado
+CARGAS_TOTALS = {
+    'revenue': 'revenue_value',
+    'cost': 'cost_value',
+    'freight': 'total_freight_value',
+    'gross_profit': 'gross_profit',
+    'bags': 'amount'
+}
+
+# Rótulo -> coluna para a ordenação da tabela (todas ordenáveis no servidor)
+CARGAS_SORT_OPTIONS = {
+    'Data de Carregamento': 'loadingDate',
+    'Nro Ticket': 'ticket',
+    'Comprador': 'buyer_display',
+    'Vendedor': 'seller_display',
+    'Grão': 'grain_name',
+    'Status': 'status',
+    'Sacas': 'amount',
+    'Receita': 'revenue_value',
+    'Custo': 'cost_value',
+    'Frete': 'total_freight_value',
+    'Lucro Bruto': 'gross_profit'
+}
+
+def _contract_suffix(codes: pd.Series) -> pd.Series:
+    """Últimos 6 caracteres do código do contrato ('' quando ausente)"""
+    return codes.where(codes.notna(), '').astype(str).str[-6:]
+
+def add_display_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Nomes de produtor e comprador com o contrato: '[123456] Nome'.
+
+    Mesma regra de SELLER_DISPLAY_SQL/BUYER_DISPLAY_SQL, calculada na coluna
+    inteira na carga dos dados (o resultado vai para o cache junto com eles).
+    """
+    for display, name, order in (('seller_display', 'seller_name', 'originOrder'),
+                                 ('buyer_display', 'buyer_name', 'destinationOrder')):
+        if name not in df.columns:
+            continue
+        names = df[name].fillna('N/A').astype(str)
+        if order in df.columns:
+            suffix = _contract_suffix(df[order])
+            df[display] = np.where(suffix != '', '[' + suffix + '] ' + names, names)
+        else:
+            df[display] = names
+    return df
+
+@versioned_cache('cargas')
+@stale_while_revalidate('cargas', fresh_ttl=BACKSTOP_TTL)
 def load_cargas_data():
     """Carrega dados de cargas do MongoDB"""
     try:
@@ -17,6 +87,13 @@ def load_cargas_data():
             return None, None
         
         collections = db_config.get_collections()
+        
+        # Snapshot do job de sincronização + tickets alterados depois dele
+        snapshot = load_dataset('cargas', collections)
+        if snapshot is not None:
+            db_config.close_connection()
+            return add_display_columns(snapshot), []
+        
         db_service = DatabaseService(collections)
         
         # Buscar tickets com lookup de users
@@ -26,59 +103,324 @@ def load_cargas_data():
         transactions = db_service.get_ticket_transactions(limit=1000)
         
         db_config.close_connection()
-        return tickets, transactions
+        return add_display_columns(pd.DataFrame(tickets)), transactions
     
     except Exception as e:
         st.error(f"❌ Erro ao carregar cargas: {e}")
         return None, None
 
+@versioned_cache('cargas')
+def load_cargas_view():
+    """Índices de filtros e de tickets das cargas (etapa em cache, fora dos reruns de filtro).
+
+    Retorna (FilterIndex, TicketIndex) ou (None, None) sem dados.
+    """
+    tickets_data, _ = load_cargas_data()
+    if tickets_data is None:
+        return None, None
+    df = pd.DataFrame(tickets_data)
+    if df.empty:
+        return FilterIndex(df), None
+    
+    # Resultados em cache gravados antes das colunas de exibição existirem são completados aqui
+    if 'seller_display' not in df.columns or 'buyer_display' not in df.columns:
+        df = add_display_columns(df)
+    if 'loadingDate' in df.columns:
+        df['loadingDate'] = pd.to_datetime(df['loadingDate'], errors='coerce')
+    tickets = TicketIndex(df['ticket']) if 'ticket' in df.columns else None
+    return FilterIndex(df, CARGAS_FILTER_DIMENSIONS, CARGAS_FILTER_DATES), tickets
+
+def show_totals(totals):
+    """Exibe os totalizadores (receita, custo, frete, lucro e sacas)"""
+    total_revenue = totals.get('revenue', 0)
+    total_cost = totals.get('cost', 0)
+    total_freight = totals.get('freight', 0)
+    total_gross_profit = totals.get('gross_profit', 0)
+    total_bags = totals.get('bags', 0)
+    
+    # Exibir totalizadores em métricas
+    col1, col2, col3, col4, col5 = st.columns(5)
+    
+    # Calcular valores médios por saca
+    avg_revenue_per_bag = (total_revenue / total_bags) if total_bags > 0 else 0
+    avg_cost_per_bag = (total_cost / total_bags) if total_bags > 0 else 0
+    avg_freight_per_bag = (total_freight / total_bags) if total_bags > 0 else 0
+    avg_profit_per_bag = (total_gross_profit / total_bags) if total_bags > 0 else 0
+    
+    with col1:
+        st.metric(
+            label="💰 Receita Total",
+            value=format_brl(total_revenue),
+            delta=f"{format_brl(avg_revenue_per_bag)}/saca" if total_bags > 0 else None
+        )
+    
+    with col2:
+        st.metric(
+            label="💸 Custo Total", 
+            value=format_brl(total_cost),
+            delta=f"{format_brl(avg_cost_per_bag)}/saca" if total_bags > 0 else None
+        )
+    
+    with col3:
+        st.metric(
+            label="🚛 Frete Total",
+            value=format_brl(total_freight),
+            delta=f"{format_brl(avg_freight_per_bag)}/saca" if total_bags > 0 else None
+        )
+    
+    with col4:
+        st.metric(
+            label="📈 Lucro Bruto Total",
+            value=format_brl(total_gross_profit),
+            delta=f"{format_brl(avg_profit_per_bag)}/saca" if total_bags > 0 else None
+        )
+    
+    with col5:
+        # Calcular margem de lucro percentual
+        profit_margin = ((total_gross_profit / total_revenue * 100) if total_revenue > 0 else 0)
+        st.metric(
+            label="📦 Total Sacas",
+            value=format_number(total_bags),
+            delta=f"{profit_margin:.1f}% margem" if total_revenue > 0 else None
+        )
+
+def show_cargas_table(df_filtered):
+    """Exibe a tabela de cargas com colunas renomeadas e valores formatados"""
+    # Selecionar colunas específicas solicitadas
+    display_columns = []
+    column_mapping = {
+        'provisioning_status': 'Conformidade',
+        'paid_status': 'Pago',
+        'ticket': 'Nro Ticket',
+        'loadingDate': 'Data de Carregamento', 
+        'buyer_display': 'Comprador',
+        'seller_display': 'Vendedor',
+        'driver_name': 'Caminhoneiro',
+        'grain_name': 'Grão',
+        'contract_type': 'Tipo Contrato',
+        'status': 'Status',
+        'amount': 'Sacas',
+        'revenue_value': 'Receita',
+        'cost_value': 'Custo',
+        'total_freight_value': 'Frete',
+        'gross_profit': 'Lucro Bruto'
+    }
+    
+    # Verificar quais colunas existem e adicionar
+    for col, display_name in column_mapping.items():
+        if col in df_filtered.columns:
+            display_columns.append(col)
+    
+    # Se temos transaction_amount mas não amount, usar transaction_amount como Sacas
+    if 'amount' not in df_filtered.columns and 'transaction_amount' in df_filtered.columns:
+        df_filtered['amount'] = df_filtered['transaction_amount']
+        if 'amount' not in display_columns:
+            display_columns.append('amount')
+    
+    if display_columns:
+        # Renomear colunas para exibição
+        df_display = df_filtered[display_columns].copy()
+        df_display.columns = [column_mapping.get(col, col) for col in display_columns]
+        
+        # Data e valores monetários no padrão brasileiro (colunas inteiras de uma vez)
+        df_display = format_frame(
+            df_display,
+            currency=['Receita', 'Custo', 'Frete', 'Lucro Bruto'],
+            dates=['Data de Carregamento']
+        )
+        
+        # Sacas continuam numéricas; o formato fica com a coluna da tabela
+        if 'Sacas' in df_display.columns:
+            df_display['Sacas'] = pd.to_numeric(df_display['Sacas'], errors='coerce').fillna(0)
+        
+        st.dataframe(
+            df_display,
+            use_container_width=True,
+            column_config={'Sacas': st.column_config.NumberColumn('Sacas', format="%d")}
+        )
+    else:
+        st.warning("Colunas solicitadas não encontradas nos dados.")
+        st.dataframe(df_filtered, use_container_width=True)
+
+def show_cargas_charts(status_counts, date_counts):
+    """Exibe distribuição por status e número de cargas por data"""
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        if status_counts is not None:
+            st.subheader("📈 Distribuição por Status")
+            
+            if not status_counts.empty:
+                fig = px.pie(
+                    values=status_counts.values,
+                    names=status_counts.index,
+                    title="Distribuição de Cargas por Status"
+                )
+                st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        if date_counts is not None:
+            st.subheader("📅 Cargas por Data")
+            
+            if not date_counts.empty:
+                fig = px.line(
+                    x=date_counts.index,
+                    y=date_counts.values,
+                    title="Número de Cargas por Data"
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+@st.cache_resource
+def get_postgres_service():
+    """Serviço PostgreSQL compartilhado (as conexões vêm do pool do processo)"""
+    return PostgreSQLService()
+
+@versioned_cache('cargas')
+def load_pg_filter_options(start_date, end_date):
+    """Valores dos seletores no período, lidos da réplica PostgreSQL"""
+    return get_postgres_service().get_cargas_filter_options(start_date, end_date)
+
+def prefetch():
+    """Aquece o cache da página (warmup e pré-carga em segundo plano)"""
+    load_cargas_view()
+    if get_postgres_service().available:
+        # Mesmo período padrão do seletor de datas
+        end_date = datetime.date.today()
+        load_pg_filter_options(end_date - datetime.timedelta(days=30), end_date)
+
+@st.fragment
+@timed_stage("pg_cargas:filtros")
+def show_cargas_page_postgres():
+    """Página de cargas servida pela réplica PostgreSQL: filtros, totais e paginação no servidor.
+
+    Fragmento: mudar um filtro reexecuta só os filtros, totais, tabela e gráficos.
+    """
+    pg_service = get_postgres_service()
+    if not pg_service.available:
+        st.error("❌ PostgreSQL não disponível.")
+        return
+    
+    # Filtros
+    st.subheader("🔍 Filtros")
+    
+    ticket_search = st.text_input(
+        "🎫 Pesquisar por Número de Ticket:",
+        placeholder="Digite o número do ticket...",
+        help="Início do número (ex.: 123) ou faixa (ex.: 1000-1100)",
+        key="pg_ticket_search"
+    )
+    
+    st.divider()
+    
+    # O período define as opções dos demais filtros
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=30)
+    date_range = st.date_input(
+        "Intervalo de datas:",
+        value=(start_date, end_date),
+        key="pg_date_range_filter"
+    )
+    if date_range and len(date_range) == 2:
+        start_date, end_date = date_range
+    
+    options = load_pg_filter_options(start_date, end_date)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        status_filter = st.selectbox("Status:", ['Todos'] + options['status'], key="pg_status_filter")
+    with col2:
+        conformity_filter = st.selectbox(
+            "Conformidade:", ["Todos", "✅ Conforme", "❌ Não Conforme"], key="pg_conformity_filter"
+        )
+    with col3:
+        payment_filter = st.selectbox(
+            "Status Pagamento:", ["Todos", "✅ Pago", "⏰ Não Pago"], key="pg_payment_filter"
+        )
+    with col4:
+        grain_filter = st.selectbox("Grão:", ["Todos"] + options['grain_name'], key="pg_grain_filter")
+    
+    col5, col6, col7 = st.columns(3)
+    with col5:
+        contract_filter = st.selectbox(
+            "Tipo de Contrato:", ["Todos"] + options['contract_type'], key="pg_contract_filter"
+        )
+    with col6:
+        producer_filter = st.multiselect(
+            "Produtor(es):",
+            options=options['seller_display'],
+            key="pg_producer_filter",
+            help="Selecione um ou mais produtores (deixe vazio para todos)"
+        )
+    with col7:
+        buyer_filter = st.selectbox("Comprador:", ["Todos"] + options['buyer_display'], key="pg_buyer_filter")
+    
+    filters = CargasFilters(
+        start_date=start_date,
+        end_date=end_date,
+        status=None if status_filter == "Todos" else status_filter,
+        grain=None if grain_filter == "Todos" else grain_filter,
+        contract_type=None if contract_filter == "Todos" else contract_filter,
+        paid={"✅ Pago": True, "⏰ Não Pago": False}.get(payment_filter),
+        provisioning_status=None if conformity_filter == "Todos" else conformity_filter,
+        buyer=None if buyer_filter == "Todos" else buyer_filter,
+        sellers=producer_filter,
+        ticket_search=ticket_search or ''
+    )
+    
+    # Totais pela consulta agregada; a tabela busca só a página visível,
+    # ordenada e paginada por chave no servidor
+    aggregates = pg_service.get_cargas_aggregates(filters)
+    totals = aggregates['totals']
+    
+    st.subheader(f"📊 Resultados: {int(totals['loads'])} cargas")
+    
+    if not totals['loads']:
+        st.info("Nenhuma carga encontrada com os filtros aplicados.")
+        return
+    
+    show_totals(totals)
+    st.divider()
+    paginated_grid(
+        "pg_cargas",
+        lambda sort, descending, after: pg_service.query_cargas_page(filters, PG_PAGE_SIZE, after, sort, descending),
+        CARGAS_SORT_OPTIONS, 'Data de Carregamento', show_cargas_table,
+        reset_on=filters, empty_message="Nenhuma carga encontrada com os filtros aplicados."
+    )
+    
+    show_cargas_charts(aggregates['status_counts'], aggregates['daily_counts'])
+
 def show_cargas_page():
     """Mostra página de cargas"""
     st.header("🚚 Gestão de Cargas")
     
-    # Carregar dados
-    tickets_data, transactions_data = load_cargas_data()
+    # A réplica PostgreSQL atende qualquer período sem carregar tudo no app
+    source = st.radio("Fonte de dados:", ["MongoDB", "PostgreSQL"], horizontal=True, key="cargas_source")
+    if source == "PostgreSQL":
+        show_cargas_page_postgres()
+        return
     
-    if tickets_data is None:
+    # Carregar dados (prontos para filtrar)
+    index, tickets = load_cargas_view()
+    
+    if index is None:
         st.error("❌ Não foi possível carregar os dados de cargas.")
         return
     
-    # Converter para DataFrame
-    df_tickets = pd.DataFrame(tickets_data)
-    
-    if df_tickets.empty:
+    if index.df.empty:
         st.warning("Nenhuma carga encontrada.")
         return
     
-    # Função para extrair últimos 6 dígitos de um código
-    def get_last_6_digits(code):
-        if pd.isna(code) or code is None:
-            return ""
-        code_str = str(code)
-        return code_str[-6:] if len(code_str) >= 6 else code_str
-    
-    # Adicionar códigos de contrato aos nomes
-    if 'seller_name' in df_tickets.columns:
-        # Para produtor, usar contrato de origem (originOrder)
-        if 'originOrder' in df_tickets.columns:
-            df_tickets['seller_display'] = df_tickets.apply(
-                lambda row: f"[{get_last_6_digits(row.get('originOrder', ''))}] {row.get('seller_name', 'N/A')}" 
-                if get_last_6_digits(row.get('originOrder', '')) else row.get('seller_name', 'N/A'), 
-                axis=1
-            )
-        else:
-            df_tickets['seller_display'] = df_tickets['seller_name']
-    
-    if 'buyer_name' in df_tickets.columns:
-        # Para comprador, usar contrato de destino (destinationOrder)
-        if 'destinationOrder' in df_tickets.columns:
-            df_tickets['buyer_display'] = df_tickets.apply(
-                lambda row: f"[{get_last_6_digits(row.get('destinationOrder', ''))}] {row.get('buyer_name', 'N/A')}" 
-                if get_last_6_digits(row.get('destinationOrder', '')) else row.get('buyer_name', 'N/A'), 
-                axis=1
-            )
-        else:
-            df_tickets['buyer_display'] = df_tickets['buyer_name']
+    show_cargas_results(index, tickets)
+
+@st.fragment
+@timed_stage("cargas:filtros")
+def show_cargas_results(index: FilterIndex, tickets: Optional[TicketIndex]):
+    """Filtros, totais, tabela e gráficos.
+
+    Fragmento: mudar um filtro reexecuta só esta parte, sobre o índice de
+    filtros já montado.
+    """
+    df_tickets = index.df
     
     # Filtros
     st.subheader("🔍 Filtros")
@@ -87,7 +429,7 @@ def show_cargas_page():
     ticket_search = st.text_input(
         "🎫 Pesquisar por Número de Ticket:",
         placeholder="Digite o número do ticket...",
-        help="Pesquise por número específico de ticket"
+        help="Início do número (ex.: 123) ou faixa (ex.: 1000-1100)"
     )
     
     st.divider()
@@ -97,7 +439,7 @@ def show_cargas_page():
     
     with col1:
         if 'status' in df_tickets.columns:
-            status_options = ['Todos'] + list(df_tickets['status'].dropna().unique())
+            status_options = ['Todos'] + index.values('status')
             status_filter = st.selectbox("Status:", status_options)
         else:
             status_filter = "Todos"
@@ -122,10 +464,7 @@ def show_cargas_page():
     
     with col4:
         # Filtro por grão
-        grain_options = ["Todos"]
-        if 'grain_name' in df_tickets.columns:
-            unique_grains = df_tickets['grain_name'].dropna().unique()
-            grain_options.extend(sorted(unique_grains))
+        grain_options = ["Todos"] + index.values('grain_name')
         
         grain_filter = st.selectbox(
             "Grão:",
@@ -139,8 +478,6 @@ def show_cargas_page():
     with col5:
         # Filtro por intervalo de datas
         if 'loadingDate' in df_tickets.columns:
-            df_tickets['loadingDate'] = pd.to_datetime(df_tickets['loadingDate'], errors='coerce')
-            
             # Definir padrão de 30 dias
             end_date = datetime.date.today()
             start_date = end_date - datetime.timedelta(days=30)
@@ -155,10 +492,7 @@ def show_cargas_page():
     
     with col6:
         # Filtro por tipo de contrato
-        contract_types = ["Todos"]
-        if 'contract_type' in df_tickets.columns:
-            unique_types = df_tickets['contract_type'].dropna().unique()
-            contract_types.extend(unique_types)
+        contract_types = ["Todos"] + index.values('contract_type')
         
         contract_filter = st.selectbox(
             "Tipo de Contrato:",
@@ -168,10 +502,7 @@ def show_cargas_page():
     
     with col7:
         # Filtro por produtor (múltipla seleção)
-        producer_options = []
-        if 'seller_display' in df_tickets.columns:
-            unique_producers = df_tickets['seller_display'].dropna().unique()
-            producer_options = sorted(unique_producers)
+        producer_options = index.values('seller_display')
         
         producer_filter = st.multiselect(
             "Produtor(es):",
@@ -185,10 +516,7 @@ def show_cargas_page():
     
     with col8:
         # Filtro por comprador (movido para terceira linha)
-        buyer_options = ["Todos"]
-        if 'buyer_display' in df_tickets.columns:
-            unique_buyers = df_tickets['buyer_display'].dropna().unique()
-            buyer_options.extend(sorted(unique_buyers))
+        buyer_options = ["Todos"] + index.values('buyer_display')
         
         buyer_filter = st.selectbox(
             "Comprador:",
@@ -196,214 +524,47 @@ def show_cargas_page():
             key="buyer_filter"
         )
     
-    # Aplicar filtros
-    df_filtered = df_tickets.copy()
-    
-    # Filtro por número de ticket
-    if ticket_search:
-        # Converter para string e filtrar por contém (case insensitive)
-        df_filtered = df_filtered[
-            df_filtered['ticket'].astype(str).str.contains(str(ticket_search), case=False, na=False)
-        ]
-    
-    # Filtro por status
-    if status_filter != "Todos" and 'status' in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered['status'] == status_filter]
-    
-    # Filtro por conformidade de provisioning
-    if conformity_filter != "Todos" and 'provisioning_status' in df_filtered.columns:
-        if conformity_filter == "✅ Conforme":
-            df_filtered = df_filtered[df_filtered['provisioning_status'] == "✅ Conforme"]
-        elif conformity_filter == "❌ Não Conforme":
-            df_filtered = df_filtered[df_filtered['provisioning_status'] == "❌ Não Conforme"]
-    
-    # Filtro por status de pagamento
-    if payment_filter != "Todos" and 'paid_status' in df_filtered.columns:
-        if payment_filter == "✅ Pago":
-            df_filtered = df_filtered[df_filtered['paid_status'] == "✅"]
-        elif payment_filter == "⏰ Não Pago":
-            df_filtered = df_filtered[df_filtered['paid_status'] == "⏰"]
-    
-    # Filtro por grão
-    if grain_filter != "Todos" and 'grain_name' in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered['grain_name'] == grain_filter]
-    
-    # Filtro por intervalo de datas
-    if date_range and len(date_range) == 2 and 'loadingDate' in df_filtered.columns:
-        start_date, end_date = date_range
-        df_filtered['loadingDate'] = pd.to_datetime(df_filtered['loadingDate'], errors='coerce')
-        df_filtered = df_filtered[
-            (df_filtered['loadingDate'].dt.date >= start_date) & 
-            (df_filtered['loadingDate'].dt.date <= end_date)
-        ]
-    
-    # Filtro por tipo de contrato
-    if contract_filter != "Todos" and 'contract_type' in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered['contract_type'] == contract_filter]
-    
-    # Filtro por comprador
-    if buyer_filter != "Todos" and 'buyer_display' in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered['buyer_display'] == buyer_filter]
-    
-    # Filtro por produtor (múltiplos)
-    if producer_filter and 'seller_display' in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered['seller_display'].isin(producer_filter)]
+    # Aplicar filtros: AND dos bitmaps de cada seletor e um único take
+    # Ticket por prefixo ou faixa no array ordenado de números
+    ticket_mask = tickets.mask(ticket_search) if tickets is not None else None
+    
+    df_filtered = index.filter(
+        equals={
+            'status': None if status_filter == "Todos" else status_filter,
+            'provisioning_status': None if conformity_filter == "Todos" else conformity_filter,
+            'paid_status': {"✅ Pago": "✅", "⏰ Não Pago": "⏰"}.get(payment_filter),
+            'grain_name': None if grain_filter == "Todos" else grain_filter,
+            'contract_type': None if contract_filter == "Todos" else contract_filter,
+            'buyer_display': None if buyer_filter == "Todos" else buyer_filter,
+            'seller_display': producer_filter
+        },
+        date_ranges={'loadingDate': tuple(date_range) if date_range and len(date_range) == 2 else None},
+        mask=ticket_mask
+    )
     
     # Mostrar resultados
     st.subheader(f"📊 Resultados: {len(df_filtered)} cargas (apenas 2025+)")
     
     if not df_filtered.empty:
-        # Calcular totalizadores
-        total_revenue = df_filtered['revenue_value'].sum() if 'revenue_value' in df_filtered.columns else 0
-        total_cost = df_filtered['cost_value'].sum() if 'cost_value' in df_filtered.columns else 0
-        total_freight = df_filtered['total_freight_value'].sum() if 'total_freight_value' in df_filtered.columns else 0
-        total_gross_profit = df_filtered['gross_profit'].sum() if 'gross_profit' in df_filtered.columns else 0
-        total_bags = df_filtered['amount'].sum() if 'amount' in df_filtered.columns else 0
-        
-        # Exibir totalizadores em métricas
-        col1, col2, col3, col4, col5 = st.columns(5)
-        
-        # Calcular valores médios por saca
-        avg_revenue_per_bag = (total_revenue / total_bags) if total_bags > 0 else 0
-        avg_cost_per_bag = (total_cost / total_bags) if total_bags > 0 else 0
-        avg_freight_per_bag = (total_freight / total_bags) if total_bags > 0 else 0
-        avg_profit_per_bag = (total_gross_profit / total_bags) if total_bags > 0 else 0
-        
-        with col1:
-            st.metric(
-                label="💰 Receita Total",
-                value=f"R$ {total_revenue:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
-                delta=f"R$ {avg_revenue_per_bag:.2f}/saca".replace('.', ',') if total_bags > 0 else None
-            )
-        
-        with col2:
-            st.metric(
-                label="💸 Custo Total", 
-                value=f"R$ {total_cost:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
-                delta=f"R$ {avg_cost_per_bag:.2f}/saca".replace('.', ',') if total_bags > 0 else None
-            )
-        
-        with col3:
-            st.metric(
-                label="🚛 Frete Total",
-                value=f"R$ {total_freight:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
-                delta=f"R$ {avg_freight_per_bag:.2f}/saca".replace('.', ',') if total_bags > 0 else None
-            )
-        
-        with col4:
-            st.metric(
-                label="📈 Lucro Bruto Total",
-                value=f"R$ {total_gross_profit:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
-                delta=f"R$ {avg_profit_per_bag:.2f}/saca".replace('.', ',') if total_bags > 0 else None
-            )
-        
-        with col5:
-            # Calcular margem de lucro percentual
-            profit_margin = ((total_gross_profit / total_revenue * 100) if total_revenue > 0 else 0)
-            st.metric(
-                label="📦 Total Sacas",
-                value=f"{total_bags:,.0f}".replace(',', '.'),
-                delta=f"{profit_margin:.1f}% margem" if total_revenue > 0 else None
-            )
+        # Totalizadores somados no motor analítico
+        show_totals(frame_totals(df_filtered, CARGAS_TOTALS))
         
         st.divider()
-        # Selecionar colunas específicas solicitadas
-        display_columns = []
-        column_mapping = {
-            'provisioning_status': 'Conformidade',
-            'paid_status': 'Pago',
-            'ticket': 'Nro Ticket',
-            'loadingDate': 'Data de Carregamento', 
-            'buyer_display': 'Comprador',
-            'seller_display': 'Vendedor',
-            'driver_name': 'Caminhoneiro',
-            'grain_name': 'Grão',
-            'contract_type': 'Tipo Contrato',
-            'status': 'Status',
-            'amount': 'Sacas',
-            'revenue_value': 'Receita',
-            'cost_value': 'Custo',
-            'total_freight_value': 'Frete',
-            'gross_profit': 'Lucro Bruto'
-        }
-        
-        # Verificar quais colunas existem e adicionar
-        for col, display_name in column_mapping.items():
-            if col in df_filtered.columns:
-                display_columns.append(col)
-        
-        # Se temos transaction_amount mas não amount, usar transaction_amount como Sacas
-        if 'amount' not in df_filtered.columns and 'transaction_amount' in df_filtered.columns:
-            df_filtered['amount'] = df_filtered['transaction_amount']
-            if 'amount' not in display_columns:
-                display_columns.append('amount')
-        
-        if display_columns:
-            # Renomear colunas para exibição
-            df_display = df_filtered[display_columns].copy()
-            df_display.columns = [column_mapping.get(col, col) for col in display_columns]
-            
-            # Formatar data se existir
-            if 'Data de Carregamento' in df_display.columns:
-                # Garantir que é datetime antes de formatar
-                df_display['Data de Carregamento'] = pd.to_datetime(
-                    df_display['Data de Carregamento'], errors='coerce'
-                ).dt.strftime('%d/%m/%Y')
-            
-            # Formatar valores monetários no padrão brasileiro
-            monetary_columns = ['Receita', 'Custo', 'Frete', 'Lucro Bruto']
-            
-            for col in monetary_columns:
-                if col in df_display.columns:
-                    df_display[col] = df_display[col].apply(
-                        lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.') if pd.notnull(x) and x != 0 else "R$ 0,00"
-                    )
-            
-            # Formatar sacas como número inteiro
-            if 'Sacas' in df_display.columns:
-                df_display['Sacas'] = df_display['Sacas'].apply(
-                    lambda x: f"{int(x)}" if pd.notnull(x) and x != 0 else "0"
-                )
-            
-            st.dataframe(
-                df_display,
-                use_container_width=True
-            )
-        else:
-            st.warning("Colunas solicitadas não encontradas nos dados.")
-            st.dataframe(df_filtered, use_container_width=True)
+        sort_options = {label: col for label, col in CARGAS_SORT_OPTIONS.items() if col in df_filtered.columns}
+        paginated_grid(
+            "cargas", frame_page_fetcher(df_filtered, PG_PAGE_SIZE), sort_options,
+            'Data de Carregamento' if 'loadingDate' in df_filtered.columns else next(iter(sort_options)),
+            show_cargas_table,
+            reset_on=(ticket_search, status_filter, conformity_filter, payment_filter, grain_filter,
+                      tuple(date_range or ()), contract_filter, buyer_filter, tuple(producer_filter))
+        )
         
         # Gráficos
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if 'status' in df_filtered.columns:
-                st.subheader("📈 Distribuição por Status")
-                status_counts = df_filtered['status'].value_counts()
-                
-                if not status_counts.empty:
-                    fig = px.pie(
-                        values=status_counts.values,
-                        names=status_counts.index,
-                        title="Distribuição de Cargas por Status"
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            if 'loadingDate' in df_filtered.columns:
-                st.subheader("📅 Cargas por Data")
-                df_filtered['loadingDate'] = pd.to_datetime(df_filtered['loadingDate'])
-                df_filtered['data'] = df_filtered['loadingDate'].dt.date
-                
-                date_counts = df_filtered['data'].value_counts().sort_index()
-                
-                if not date_counts.empty:
-                    fig = px.line(
-                        x=date_counts.index,
-                        y=date_counts.values,
-                        title="Número de Cargas por Data"
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
+        status_counts = df_filtered['status'].value_counts() if 'status' in df_filtered.columns else None
+        date_counts = None
+        if 'loadingDate' in df_filtered.columns:
+            date_counts = df_filtered['loadingDate'].dt.date.value_counts().sort_index()
+        show_cargas_charts(status_counts, date_counts)
     
     else:
         st.info("Nenhuma carga encontrada com os filtros aplicados.")
@@ -1,9 +1,55 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from src.database_service import DatabaseService
 from config.database import DatabaseConfig
+from src.query_cache import stale_while_revalidate
+from src.cache_versions import versioned_cache, BACKSTOP_TTL
+from src.analytics import open_engine, contract_totals, contract_client_volumes
+from src.filter_index import FilterIndex
+from src.search_index import NameIndex
+from src.delivery_summary import DIVERGENCE_TOLERANCE, summary_ready
+from utils.formatters import (
+    format_brl, format_number, format_brl_series, format_number_series, format_frame
+)
+from utils.paginated_grid import paginated_grid, frame_page_fetcher
+from utils.rerun_timing import timed_stage
 
-@st.cache_data(ttl=60)
+# Linhas por página da tabela de contratos
+CONTRATOS_PAGE_SIZE = 100
+
+# Colunas dos seletores (bitmap por valor) e de data (busca binária) no índice de filtros
+CONTRATOS_FILTER_DIMENSIONS = [
+    'grain_name', 'contract_type', 'direction_type', 'pis_status', 'status_display',
+    'delivery_year', 'delivery_month', 'Divergência'
+]
+CONTRATOS_FILTER_DATES = ['createdAt', 'deliveryDate']
+
+# Colunas usadas pela página; o restante do snapshot nem é lido
+CONTRATOS_COLUMNS = [
+    '_id', 'createdAt', 'loadingDate', 'deliveryDate', 'grain_name', 'contract_type',
+    'direction_type', 'status_display', 'pis_status', 'buyer_name', 'seller_name',
+    'amount', 'amountOrderedSafe', 'bagPrice', 'paymentDaysSafe', 'pis_cofins_value',
+    'deliveredBags', 'deliveryDivergence'
+]
+
+def add_cliente_column(df: pd.DataFrame) -> pd.DataFrame:
+    """Cliente do contrato.
+
+    Frete: vendedor; fluxo diferente de Originação: comprador; senão vendedor.
+    """
+    missing = pd.Series('N/A', index=df.index, dtype=object)
+    seller = df.get('seller_name', missing)
+    buyer = df.get('buyer_name', missing)
+    df['cliente'] = np.select(
+        [df.get('contract_type', missing) == '🚛 Frete', df.get('direction_type', missing) != 'Originação'],
+        [seller.to_numpy(dtype=object), buyer.to_numpy(dtype=object)],
+        default=seller.to_numpy(dtype=object)
+    )
+    return df
+
+@versioned_cache('contratos')
+@stale_while_revalidate('contratos', fresh_ttl=BACKSTOP_TTL)
 def load_contratos_data():
     """Carrega dados de contratos do MongoDB"""
     try:
@@ -11,224 +57,216 @@ def load_contratos_data():
         if not db_config.connect():
             return pd.DataFrame()
         collections = db_config.get_collections()
-        db_service = DatabaseService(collections)
-
-        pipeline = [
-            {"$lookup": {"from": "ticketv2", "let": {"contractId": "$_id"},
-             "pipeline": [
-                 {"$unwind": "$transactions"},
-                 {"$match": {"$expr": {"$eq": ["$transactions.destinationOrder", "$$contractId"]}}},
-                 {"$group": {"_id": "$_id", "loadingDate": {"$max": "$loadingDate"},
-                            "deliveryDate": {"$max": "$deliveredIn"}, "transactions": {"$push": "$transactions"}}}
-             ], "as": "tickets"}},
-            {"$lookup": {"from": "users", "localField": "buyer", "foreignField": "_id", "as": "buyer_info"}},
-            {"$lookup": {"from": "users", "localField": "seller", "foreignField": "_id", "as": "seller_info"}},
-            {"$lookup": {"from": "grains", "localField": "grain", "foreignField": "_id", "as": "grain_info"}},
-            {"$addFields": {
-                "buyer_name": {"$ifNull": [{"$arrayElemAt": ["$buyer_info.name", 0]}, {"$arrayElemAt": ["$buyer_info.companyName", 0]}]},
-                "seller_name": {"$ifNull": [{"$arrayElemAt": ["$seller_info.name", 0]}, {"$arrayElemAt": ["$seller_info.companyName", 0]}]},
-                "grain_name": {"$arrayElemAt": ["$grain_info.name", 0]},
-                "contract_type": {"$switch": {"branches": [
-                    {"case": {"$eq": ["$isGrain", True]}, "then": "🌾 Grão"},
-                    {"case": {"$eq": ["$isFreight", True]}, "then": "🚛 Frete"},
-                    {"case": {"$eq": ["$isService", True]}, "then": "⭐ Clube FX"}],
-                "default": "❓ Indefinido"}},
-                "direction_type": {"$cond": {"if": {"$eq": ["$isBuying", True]}, "then": "Originação", "else": "Supply"}},
-                "status_display": {"$switch": {"branches": [
-                    {"case": {"$eq": ["$isDone", True]}, "then": "✅ Concluído"},
-                    {"case": {"$eq": ["$isCanceled", True]}, "then": "❌ Cancelado"},
-                    {"case": {"$eq": ["$isInProgress", True]}, "then": "🔄 Em Progresso"}],
-                "default": "⏳ Pendente"}},
-                "loadingDate": {"$arrayElemAt": ["$tickets.loadingDate", 0]},
-                "deliveryDate": {"$arrayElemAt": ["$tickets.deliveryDate", 0]},
-                "amountOrderedSafe": {"$ifNull": ["$amountOrdered", 0]},
-                "paymentDaysSafe": {"$ifNull": ["$paymentDaysAfterDelivery", 0]},
-                "destOrderList": {"$map": {"input": {"$arrayElemAt": ["$tickets.transactions", 0]}, "as": "tr", "in": "$$tr.destinationOrder"}},
-                "origOrderList": {"$map": {"input": {"$arrayElemAt": ["$tickets.transactions", 0]}, "as": "tr", "in": "$$tr.originOrder"}},
-                "Ordem": {"$cond": [
-                    {"$eq": ["$direction_type", "Supply"]},
-                    {"$arrayElemAt": ["$destOrderList", -1]},
-                    {"$arrayElemAt": ["$origOrderList", -1]}
-                ]},
-                "pis_status": {"$cond": {"if": {"$eq": ["$hasPIS", True]}, "then": "✅ Com PIS", "else": "❌ Sem PIS"}},
-                "pis_cofins_value": {"$cond": {
-                    "if": {"$eq": ["$hasPIS", True]}, 
-                    "then": {"$multiply": [{"$multiply": ["$amount", "$bagPrice"]}, 0.0925]}, 
-                    "else": 0
-                }}
-            }},
-            {"$match": {"$expr": {"$ne": ["$isCanceled", True]}}},
-            {"$sort": {"createdAt": -1}},
-            {"$limit": 1000}
-        ]
-        results = list(db_service.orderv2.aggregate(pipeline))
-        df = pd.DataFrame(results)
+
+        # Snapshot do job de sincronização + contratos alterados depois dele
+        engine = open_engine(collections, ['contratos'])
+        if engine is not None:
+            try:
+                df = engine.select('contratos', CONTRATOS_COLUMNS)
+            finally:
+                engine.close()
+        else:
+            # Sem snapshot: todos os contratos, como no snapshot
+            db_service = DatabaseService(collections)
+            df = pd.DataFrame(db_service.get_contracts_data(limit=None))
         for col in ['createdAt', 'loadingDate', 'deliveryDate']:
             if col in df.columns:
                 df[col] = pd.to_datetime(df[col], errors='coerce')
-        return df
+        # Mesma ordem nas duas origens: mais recentes primeiro
+        if 'createdAt' in df.columns:
+            df = df.sort_values('createdAt', ascending=False, kind='stable', ignore_index=True)
+        # Sem resumo de entregas o entregue seria zero em todos os contratos:
+        # volta para amountOrdered e não aponta divergências
+        if not summary_ready(collections):
+            df = df.drop(columns=['deliveredBags', 'deliveryDivergence'], errors='ignore')
+        return add_cliente_column(df) if not df.empty else df
     except Exception as e:
         st.error(f"Erro ao carregar dados de contratos: {e}")
         return pd.DataFrame()
 
 
-def show_contratos_page():
-    st.title("📋 Contratos")
+def prefetch():
+    """Aquece o cache da página (warmup e pré-carga em segundo plano)"""
+    load_contratos_view()
+
+
+# Nomes dos meses para o filtro de entrega
+MONTH_NAMES = {
+    1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
+    5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto',
+    9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
+}
+
+
+def _date_bounds(dates: pd.Series):
+    """(menor, maior) data da coluna; hoje quando não há datas"""
+    if dates.isna().all():
+        today = pd.Timestamp.now().date()
+        return today, today
+    return dates.min().date(), dates.max().date()
+
+
+@versioned_cache('contratos')
+def load_contratos_view():
+    """
+    Contratos com as colunas derivadas por linha, os índices de filtros e
+    de clientes e as opções dos seletores (etapa em cache, fora dos reruns
+    de filtro). Retorna (índice de filtros, índice de nomes, opções).
+    """
     df = load_contratos_data()
     if df.empty:
+        return FilterIndex(df), None, {}
+
+    # Cliente já vem da carga; resultados em cache anteriores à coluna são completados aqui
+    if 'cliente' not in df.columns:
+        df = add_cliente_column(df)
+
+    df['delivery_year'] = df['deliveryDate'].dt.year
+    df['delivery_month'] = df['deliveryDate'].dt.month
+    # Entregue pelas transações dos tickets (resumo de entregas); linhas de
+    # snapshots anteriores ao resumo ainda não têm a coluna e usam amountOrdered
+    missing = pd.Series(np.nan, index=df.index)
+    df['Entregue'] = pd.to_numeric(df.get('deliveredBags', missing), errors='coerce').fillna(df['amountOrderedSafe'])
+    df['Restante'] = (df['amount'] - df['Entregue']).clip(lower=0)
+    df['Divergência'] = df.get('deliveryDivergence', missing).eq(True)
+    df['% Entregue'] = (df['Entregue']/df['amount']*100).round(2).fillna(0)
+    df['Prazo Pagamento (dias)'] = pd.to_numeric(df['paymentDaysSafe'], errors='coerce').fillna(0).astype(int)
+    df['Data Pagamento'] = df['deliveryDate'] + pd.to_timedelta(df['Prazo Pagamento (dias)'], unit='d')
+    df['total'] = df['amount'] * df['bagPrice']
+
+    index = FilterIndex(df, CONTRATOS_FILTER_DIMENSIONS, CONTRATOS_FILTER_DATES)
+    options = {
+        'created': _date_bounds(df['createdAt']),
+        'delivery': _date_bounds(df['deliveryDate']),
+        'grains': index.values('grain_name'),
+        'types': index.values('contract_type'),
+        'directions': index.values('direction_type'),
+        'statuses': index.values('status_display'),
+        'pis': index.values('pis_status'),
+        'years': [int(year) for year in reversed(index.values('delivery_year'))],
+        'months': [int(month) for month in index.values('delivery_month')],
+        # Divergência só existe com o resumo de entregas
+        'divergence': 'deliveryDivergence' in df.columns
+    }
+    return index, NameIndex(df, ['cliente']), options
+
+
+def show_contratos_page():
+    st.title("📋 Contratos")
+    index, names, options = load_contratos_view()
+    if index.df.empty:
         st.warning("Nenhum contrato encontrado.")
         return
+    show_contratos_results(index, names, options)
 
-    # Filtros de data baseados em createdAt
-    min_created_date = df['createdAt'].min().date() if not df['createdAt'].isna().all() else pd.Timestamp.now().date()
-    max_created_date = df['createdAt'].max().date() if not df['createdAt'].isna().all() else pd.Timestamp.now().date()
-    
-    # Filtros de entrega baseados em deliveryDate
-    min_deliv_date = df['deliveryDate'].min().date() if not df['deliveryDate'].isna().all() else pd.Timestamp.now().date()
-    max_deliv_date = df['deliveryDate'].max().date() if not df['deliveryDate'].isna().all() else pd.Timestamp.now().date()
-
-    grains = sorted(df['grain_name'].dropna().unique())
-    types = sorted(df['contract_type'].dropna().unique())
-    directions = sorted(df['direction_type'].dropna().unique())
-    statuses = sorted(df['status_display'].dropna().unique())
-    pis_options = sorted(df['pis_status'].dropna().unique()) if 'pis_status' in df.columns else []
-
-    # Extrair anos e meses da deliveryDate para filtros
-    if 'deliveryDate' in df.columns:
-        df['delivery_year'] = pd.to_datetime(df['deliveryDate'], errors='coerce').dt.year
-        df['delivery_month'] = pd.to_datetime(df['deliveryDate'], errors='coerce').dt.month
-        
-        # Listas para filtros
-        delivery_years = sorted([year for year in df['delivery_year'].dropna().unique() if not pd.isna(year)], reverse=True)
-        delivery_months = sorted([month for month in df['delivery_month'].dropna().unique() if not pd.isna(month)])
-        
-        # Nomes dos meses
-        month_names = {
-            1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
-            5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto',
-            9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
-        }
-        
-        year_options = ['Todos'] + [str(int(year)) for year in delivery_years]
-        month_options = ['Todos'] + [month_names[month] for month in delivery_months]
-    else:
-        year_options = ['Todos']
-        month_options = ['Todos']
+
+@st.fragment
+@timed_stage("contratos:filtros")
+def show_contratos_results(index: FilterIndex, names: NameIndex, options: dict):
+    """
+    Filtros, métricas, volumes por cliente e tabela. Fragmento: mudar um
+    filtro reexecuta só esta parte, sobre o índice de filtros já montado.
+    """
+    min_created_date, max_created_date = options['created']
+    min_deliv_date, max_deliv_date = options['delivery']
+    directions = options['directions']
+    statuses = options['statuses']
+    year_options = ['Todos'] + [str(year) for year in options['years']]
+    month_options = ['Todos'] + [MONTH_NAMES[month] for month in options['months']]
 
     c1, c2, c3, c4, c5, c6, c7 = st.columns(7)
-    with c1: grain_opt = st.selectbox("Grão", ["Todos"] + grains)
-    with c2: type_opt = st.selectbox("Tipo de contrato", ["Todos"] + types)
+    with c1: grain_opt = st.selectbox("Grão", ["Todos"] + options['grains'])
+    with c2: type_opt = st.selectbox("Tipo de contrato", ["Todos"] + options['types'])
     with c3: 
         # Definir valor padrão como Originação se existir, senão o primeiro da lista
         default_direction = "Originação" if "Originação" in directions else (directions[0] if directions else "Todos")
         direction_options = ["Todos"] + directions
         default_index = direction_options.index(default_direction) if default_direction in direction_options else 0
         dir_opt = st.selectbox("Fluxo", direction_options, index=default_index)
-    with c4: pis_opt = st.selectbox("PIS", ["Todos"] + pis_options)
+    with c4: pis_opt = st.selectbox("PIS", ["Todos"] + options['pis'])
     with c5: year_opt = st.selectbox("Ano Entrega", year_options)
     with c6: month_opt = st.selectbox("Mês Entrega", month_options)
     with c7: cli_search = st.text_input("Pesquisar cliente")
     
-    # Definir cliente baseado no tipo de contrato e direção
-    def define_cliente(row):
-        # Para contratos de frete, sempre usar seller_name
-        if row.get('contract_type') == '🚛 Frete':
-            return row.get('seller_name', 'N/A')
-        # Para outros tipos, usar regra original
-        elif row.get('direction_type') != 'Originação':
-            return row.get('buyer_name', 'N/A')
-        else:
-            return row.get('seller_name', 'N/A')
-    
-    df['cliente'] = df.apply(define_cliente, axis=1)
-    
     c8, c9 = st.columns(2)
     with c8: status_opt = st.multiselect("Status", statuses, default=statuses)
     with c9: created_date_range = st.date_input("Intervalo de Criação (createdAt)", [min_created_date, max_created_date])
     
     c10, c11 = st.columns(2)
     with c10: deliv_range = st.date_input("Intervalo Última Entrega", [min_deliv_date, max_deliv_date])
+    has_divergence = options.get('divergence', False)
+    only_divergent = False
+    if has_divergence:
+        with c11: only_divergent = st.checkbox(
+            "Só com divergência de entrega",
+            help=f"Entregue nas cargas difere do amountOrdered em mais de {format_number(DIVERGENCE_TOLERANCE)} sacas"
+        )
 
-    df_f = df.copy()
-    if grain_opt != "Todos": df_f = df_f[df_f['grain_name']==grain_opt]
-    if type_opt != "Todos": df_f = df_f[df_f['contract_type']==type_opt]
-    if dir_opt != "Todos": df_f = df_f[df_f['direction_type']==dir_opt]
-    if pis_opt != "Todos": df_f = df_f[df_f['pis_status']==pis_opt]
-    
-    # Filtros de ano e mês de entrega
-    if year_opt != "Todos" and 'delivery_year' in df_f.columns:
-        df_f = df_f[df_f['delivery_year'] == int(year_opt)]
-    
-    if month_opt != "Todos" and 'delivery_month' in df_f.columns:
-        # Converter nome do mês para número
-        month_names_reverse = {v: k for k, v in month_names.items()}
-        selected_month = month_names_reverse.get(month_opt)
-        if selected_month:
-            df_f = df_f[df_f['delivery_month'] == selected_month]
-    if cli_search: df_f = df_f[df_f['cliente'].str.contains(cli_search, case=False, na=False)]
-    if status_opt: df_f = df_f[df_f['status_display'].isin(status_opt)]
-    
-    # Filtro por data de criação (createdAt)
-    if isinstance(created_date_range, list) and len(created_date_range) == 2:
-        start_date, end_date = created_date_range
-        df_f = df_f[(df_f['createdAt'].dt.date >= start_date) & (df_f['createdAt'].dt.date <= end_date)]
-    
-    # Filtro por data de entrega
-    if isinstance(deliv_range, list) and len(deliv_range) == 2:
-        deliv_start, deliv_end = deliv_range
-        df_f = df_f[(df_f['deliveryDate'].dt.date >= deliv_start) & (df_f['deliveryDate'].dt.date <= deliv_end)]
-
-    df_f['Entregue'] = df_f['amountOrderedSafe']
-    df_f['% Entregue'] = (df_f['Entregue']/df_f['amount']*100).round(2).fillna(0)
-    df_f.loc[(df_f['Entregue']>0)&(df_f['status_display']!='✅ Concluído'),'status_display']='🔄 Em Progresso'
-
-    df_f['Prazo Pagamento (dias)'] = pd.to_numeric(df_f['paymentDaysSafe'], errors='coerce').fillna(0).astype(int)
-    df_f['Data Pagamento'] = df_f['deliveryDate'] + pd.to_timedelta(df_f['Prazo Pagamento (dias)'], unit='d')
+    # Filtros: AND dos bitmaps de cada seletor e um único take
+    month_numbers = {v: k for k, v in MONTH_NAMES.items()}
+    # Cliente por trecho do nome, sem diferenciar acentos (índice de trigramas)
+    client_mask = names.mask(cli_search)
+    df_f = index.filter(
+        equals={
+            'grain_name': None if grain_opt == "Todos" else grain_opt,
+            'contract_type': None if type_opt == "Todos" else type_opt,
+            'direction_type': None if dir_opt == "Todos" else dir_opt,
+            'pis_status': None if pis_opt == "Todos" else pis_opt,
+            'delivery_year': None if year_opt == "Todos" else int(year_opt),
+            'delivery_month': None if month_opt == "Todos" else month_numbers.get(month_opt),
+            'status_display': status_opt,
+            'Divergência': True if only_divergent else None
+        },
+        date_ranges={
+            # Intervalos só valem quando o seletor devolve lista
+            'createdAt': tuple(created_date_range) if isinstance(created_date_range, list) and len(created_date_range) == 2 else None,
+            'deliveryDate': tuple(deliv_range) if isinstance(deliv_range, list) and len(deliv_range) == 2 else None
+        },
+        mask=client_mask
+    )
 
-    df_f['total'] = df_f['amount'] * df_f['bagPrice']
+    # Status exibido depende de ter entrega; o filtro de status usa o original
+    in_progress = (df_f['Entregue']>0)&(df_f['status_display']!='✅ Concluído')
+    df_f = df_f.assign(status_display=df_f['status_display'].mask(in_progress, '🔄 Em Progresso'))
     
-    # Cards de métricas
+    divergent = int(df_f['Divergência'].sum()) if has_divergence else 0
+    if divergent and not only_divergent:
+        st.warning(f"⚠️ {divergent} contratos com entregue nas cargas diferente do amountOrdered")
+
+    # Cards de métricas e volumes por cliente: agregados no motor analítico
+    totals = contract_totals(df_f)
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        st.metric("Total de Sacas", f"{int(df_f['amount'].sum()):,}".replace(',', '.'))
+        st.metric("Total de Sacas", format_number(totals['bags']))
     
     with col2:
-        st.metric("Valor Total (R$)", f"R$ {df_f['total'].sum():,.2f}".replace(',', 'X').replace('.', ',').replace('X','.'))
+        st.metric("Valor Total (R$)", format_brl(totals['value']))
     
     with col3:
         # Número de clientes únicos
-        unique_clients = df_f['cliente'].nunique()
+        unique_clients = totals['clients']
         st.metric("Número de Clientes", f"{unique_clients}")
     
     with col4:
         # Volume médio por cliente
-        avg_volume_per_client = df_f['amount'].sum() / unique_clients if unique_clients > 0 else 0
-        st.metric("Volume Médio/Cliente", f"{int(avg_volume_per_client):,}".replace(',', '.'))
+        avg_volume_per_client = totals['bags'] / unique_clients if unique_clients > 0 else 0
+        st.metric("Volume Médio/Cliente", format_number(int(avg_volume_per_client)))
     
     with col5:
         # Total PIS/COFINS
-        total_pis_cofins = df_f['pis_cofins_value'].sum()
-        st.metric("Total PIS/COFINS", f"R$ {total_pis_cofins:,.2f}".replace(',', 'X').replace('.', ',').replace('X','.'))
+        st.metric("Total PIS/COFINS", format_brl(totals['pis_cofins']))
     
     # Análise de volumes por cliente
     st.subheader("📊 Volumes Comercializados por Cliente")
-    
-    # Calcular volumes por cliente
-    client_volumes = df_f.groupby('cliente').agg({
-        'amount': 'sum',
-        'total': 'sum',
-        '_id': 'count'  # número de contratos
-    }).round(2)
-    client_volumes.columns = ['Volume (Sacas)', 'Valor Total (R$)', 'Nº Contratos']
-    client_volumes = client_volumes.sort_values('Volume (Sacas)', ascending=False)
+    client_volumes = contract_client_volumes(df_f)
     
     # Top 10 clientes
     top_clients = client_volumes.head(10).copy()
     
     # Formatar valores para exibição
-    top_clients['Volume (Sacas)'] = top_clients['Volume (Sacas)'].astype(int).apply(lambda x: f"{x:,}".replace(',', '.'))
-    top_clients['Valor Total (R$)'] = top_clients['Valor Total (R$)'].apply(lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
+    top_clients['Volume (Sacas)'] = format_number_series(top_clients['Volume (Sacas)'].astype(int))
+    top_clients['Valor Total (R$)'] = format_brl_series(top_clients['Valor Total (R$)'])
     
     # Exibir tabela dos top clientes
     col1, col2 = st.columns([2, 1])
@@ -256,33 +294,38 @@ def show_contratos_page():
     display_map = {
         'Status':'status_display','Última Carga':'loadingDate','Data Pagamento':'Data Pagamento',
         '% Entregue':'% Entregue','Cliente':'cliente','Grão':'grain_name',
-        'Quantidade':'amount','Total':'total','Preço/Saca':'bagPrice'
+        'Quantidade':'amount','Entregue':'Entregue','Restante':'Restante','Divergência':'Divergência',
+        'Total':'total','Preço/Saca':'bagPrice'
     }
-
-    sort_label = st.selectbox("Ordenar por", list(display_map.keys()), index=list(display_map.keys()).index('Última Carga'))
-    ascending = st.checkbox("Ascendente", value=False)
-    df_f = df_f.sort_values(by=display_map[sort_label], ascending=ascending)
+    if not has_divergence:
+        del display_map['Divergência']
 
     st.subheader(f"📊 {len(df_f)} contratos")
     labels = list(display_map.keys())
     cols = [display_map[label] for label in labels]
-    df_disp = df_f[cols].copy()
-    df_disp.columns = labels
-
-    date_cols = ['Última Carga','Data Pagamento']
-    for dc in date_cols:
-        if dc in df_disp:
-            df_disp[dc] = pd.to_datetime(df_disp[dc], errors='coerce').dt.strftime('%d/%m/%Y')
-    if 'Preço/Saca' in df_disp:
-        df_disp['Preço/Saca'] = df_disp['Preço/Saca'].apply(lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X','.'))
-    if 'Quantidade' in df_disp:
-        df_disp['Quantidade'] = df_disp['Quantidade'].astype(int).apply(lambda x: f"{x:,}".replace(',', '.'))
-    if '% Entregue' in df_disp:
-        df_disp['% Entregue'] = df_disp['% Entregue'].apply(lambda x: f"{x:.2f}%")
-    if 'Total' in df_disp:
-        df_disp['Total'] = df_disp['Total'].apply(lambda x: f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X','.'))
-
-    st.dataframe(df_disp, use_container_width=True, height=600)
+
+    def show_page(df_page):
+        # Só as linhas da página são formatadas e enviadas ao navegador
+        df_disp = df_page[cols].copy()
+        df_disp.columns = labels
+        if has_divergence:
+            df_disp['Divergência'] = np.where(df_disp['Divergência'], '⚠️', '')
+        df_disp = format_frame(
+            df_disp,
+            currency=['Preço/Saca', 'Total'],
+            numbers=['Quantidade', 'Entregue', 'Restante'],
+            percents=['% Entregue'],
+            dates=['Última Carga', 'Data Pagamento']
+        )
+        st.dataframe(df_disp, use_container_width=True)
+
+    # Ao mudar algum filtro, volta para a primeira página
+    paginated_grid(
+        "contratos", frame_page_fetcher(df_f, CONTRATOS_PAGE_SIZE), display_map, 'Última Carga', show_page,
+        reset_on=(grain_opt, type_opt, dir_opt, pis_opt, year_opt, month_opt, cli_search,
+                  tuple(status_opt), tuple(created_date_range), tuple(deliv_range), only_divergent),
+        empty_message="Nenhum contrato encontrado com os filtros aplicados."
+    )
 
 
 if __name__ == "__main__":
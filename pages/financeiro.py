@@ -1,19 +1,30 @@
 import streamlit as st
 import pandas as pd
+from datetime import date
 from typing import Optional
 from config.database import get_database_connection
 from src.database_service import DatabaseService
+from src.query_cache import stale_while_revalidate
+from src.cache_versions import versioned_cache, BACKSTOP_TTL
+from src.snapshots import load_dataset
+from src.analytics import open_engine, engine_available, finance_years, finance_monthly
+from src.postgres_service import PostgreSQLService
+from src.finance_ledger import build_ledger, compute_report, empty_ledger, ledger_from_rollup
+from utils.formatters import format_brl, format_brl_series, format_percent, format_percent_series
+from utils.rerun_timing import timed_stage
 from bson import ObjectId
 
+# Fontes do razão mensal: snapshot/MongoDB ou agregado incremental na réplica
+SOURCE_MONGO = "MongoDB"
+SOURCE_POSTGRES = "PostgreSQL"
+
 
 def format_currency(value: float) -> str:
     """
     Formata um número float como moeda brasileira.
     Exibe 0 como 'R$ 0,00'.
     """
-    if pd.isna(value) or value == 0:
-        return "R$ 0,00"
-    return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    return format_brl(value)
 
 
 def clean_objectids(data):
@@ -28,7 +39,8 @@ def clean_objectids(data):
         return str(data)
     return data
 
-@st.cache_data(ttl=60)
+@versioned_cache('financeiro')
+@stale_while_revalidate('financeiro', fresh_ttl=BACKSTOP_TTL)
 def load_finances_data(
     year_filter: Optional[str] = None,
     limit: Optional[int] = None
@@ -45,6 +57,10 @@ def load_finances_data(
         if not cols:
             st.error("Coleções não disponíveis.")
             return pd.DataFrame()
+        # Snapshot do job de sincronização + lançamentos alterados depois dele
+        snapshot = load_dataset('finances', cols)
+        if snapshot is not None:
+            return snapshot
         service = DatabaseService(cols)
         raw = service.get_finances_with_lookups(year_filter=year_filter, limit=limit)
         if not raw:
@@ -56,158 +72,202 @@ def load_finances_data(
         return pd.DataFrame()
 
 
+@versioned_cache('financeiro')
+@stale_while_revalidate('financeiro', fresh_ttl=BACKSTOP_TTL)
+def load_finances_monthly(year_filter: Optional[str] = None):
+    """
+    Lançamentos já somados por mês e categoria, calculados no motor analítico
+    sobre o snapshot. Retorna (anos, dados) ou None sem snapshot.
+    """
+    try:
+        db = get_database_connection()
+        engine = open_engine(db.get_collections() if db else None, ['finances'])
+        if engine is None:
+            return None
+        try:
+            return finance_years(engine), finance_monthly(engine, int(year_filter) if year_filter else None)
+        finally:
+            engine.close()
+    except Exception as e:
+        st.error(f"Erro ao carregar dados: {e}")
+        return None
+
+
+@versioned_cache('financeiro')
+@stale_while_revalidate('financeiro', fresh_ttl=BACKSTOP_TTL)
+def load_finance_year_list() -> list:
+    """
+    Anos com lançamentos agrupados no MongoDB, sem carregar os lançamentos.
+    """
+    try:
+        db = get_database_connection()
+        if not db:
+            return []
+        return DatabaseService(db.get_collections()).get_finance_years()
+    except Exception as e:
+        st.error(f"Erro ao carregar anos: {e}")
+        return []
+
+
+def parse_finance_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte o campo date (AAAAMMDD) em datetime.
+    """
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'].astype(str), format='%Y%m%d', errors='coerce')
+    return df
+
+
+def prefetch():
+    """
+    Aquece o cache da página (warmup e pré-carga em segundo plano).
+    """
+    load_finance_report()
+
+
+def build_finance_report(df: pd.DataFrame) -> dict:
+    """
+    Fluxos mensais por categoria, caixa total, linhas do DRE, EBITDA e fluxo
+    de caixa a partir dos lançamentos (ou somas mensais) do período.
+    """
+    return compute_report(build_ledger(df))
+
+
+@st.cache_resource
+def get_postgres_service():
+    """Serviço PostgreSQL compartilhado (as conexões vêm do pool do processo)"""
+    return PostgreSQLService()
+
+
+def _year_bounds(year_filter: Optional[str]):
+    if year_filter is None:
+        return None, None
+    return date(int(year_filter), 1, 1), date(int(year_filter), 12, 31)
+
+
+@versioned_cache('financeiro')
+def load_pg_finance_ledger(year_filter: Optional[str] = None) -> pd.DataFrame:
+    """
+    Razão mensal do agregado incremental (finances_monthly_ledger) na réplica.
+    """
+    service = get_postgres_service()
+    if not service.available:
+        return empty_ledger()
+    start, end = _year_bounds(year_filter)
+    return ledger_from_rollup(service.get_rollup_slice(
+        'finances_monthly', ['day', 'category_name', 'category_item'], start_date=start, end_date=end
+    ))
+
+
+@versioned_cache('financeiro')
+def load_finance_report(year_filter: Optional[str] = None, source: str = SOURCE_MONGO) -> Optional[dict]:
+    """
+    Relatório do ano (ou de todos), montado uma vez por versão dos dados;
+    None quando não há lançamentos no período.
+    """
+    if source == SOURCE_POSTGRES:
+        ledger = load_pg_finance_ledger(year_filter)
+        return compute_report(ledger) if not ledger.empty else None
+    # Só o ano pedido é somado no motor; sem snapshot, lançamentos do MongoDB
+    monthly = load_finances_monthly(year_filter) if engine_available(['finances']) else None
+    if monthly is not None:
+        df = monthly[1]
+    else:
+        df = parse_finance_dates(load_finances_data(year_filter=year_filter))
+    if df.empty:
+        return None
+    if year_filter is not None:
+        df = df[df['date'].dt.year == int(year_filter)]
+        if df.empty:
+            return None
+    return build_finance_report(df)
+
+
+def load_finance_years(source: str = SOURCE_MONGO) -> list:
+    """
+    Anos com lançamentos (agregados do snapshot ou da réplica quando disponíveis).
+    """
+    if source == SOURCE_POSTGRES:
+        # Razão vazio vem com month datetime64; lançamentos sem data não têm ano
+        months = load_pg_finance_ledger()['month'].dropna()
+        return sorted((int(year) for year in months.dt.year.unique()), reverse=True)
+    monthly = load_finances_monthly()
+    if monthly is not None:
+        return list(monthly[0])
+    return load_finance_year_list()
+
+
+def display_pivot(df_pivot: pd.DataFrame):
+    """
+    Pivô com coluna TOTAL, valores em reais.
+    """
+    if df_pivot.empty:
+        st.write("Sem registros.")
+        return
+    df_sum = df_pivot.copy()
+    df_sum['TOTAL'] = df_sum.sum(axis=1)
+    df_fmt = df_sum.astype(float).apply(format_brl_series)
+    st.dataframe(df_fmt)
+
+
 def show_financeiro_page():
     """
     Renderiza a página Financeiro.
     """
     st.title("💰 Financeiro")
+    # O agregado mensal da réplica é atualizado a cada sincronização
+    source = st.radio("Fonte de dados:", [SOURCE_MONGO, SOURCE_POSTGRES], horizontal=True, key="financeiro_source")
+    years = load_finance_years(source)
+    show_financeiro_report(['Todos'] + [str(int(y)) for y in years], source)
 
-    # 1. Seleção de ano
-    df_all = load_finances_data()
-    if 'date' in df_all.columns:
-        df_all['date'] = pd.to_datetime(df_all['date'].astype(str), format='%Y%m%d', errors='coerce')
-        years = sorted(df_all['date'].dt.year.dropna().unique(), reverse=True)
-    else:
-        years = []
-    year_options = ['Todos'] + [str(int(y)) for y in years]
-    year_filter = st.selectbox("Ano:", year_options)
 
-    # 2. Carregar e filtrar dados
+@st.fragment
+@timed_stage("financeiro:relatorio")
+def show_financeiro_report(year_options: list, source: str = SOURCE_MONGO):
+    """
+    Seleção de ano e relatório. Fragmento: trocar o ano reexecuta só esta
+    parte, e o relatório de cada ano vem pronto do cache.
+    """
+    year_filter = st.selectbox("Ano:", year_options)
     yf = None if year_filter == 'Todos' else year_filter
-    df = load_finances_data(year_filter=yf)
-    if df.empty:
-        st.info("Nenhum dado encontrado para o filtro selecionado.")
+    report = load_finance_report(yf, source)
+    if report is None:
+        st.info("Nenhum dado encontrado para o filtro selecionado." if yf is None
+                else f"Nenhum dado para o ano {year_filter}.")
         return
-    df['date'] = pd.to_datetime(df['date'].astype(str), format='%Y%m%d', errors='coerce')
-    if year_filter != 'Todos':
-        df = df[df['date'].dt.year == int(year_filter)]
-        if df.empty:
-            st.info(f"Nenhum dado para o ano {year_filter}.")
-            return
-
-    # Função auxiliar para exibir pivôs
-    def display_pivot(df_pivot: pd.DataFrame):
-        if df_pivot.empty:
-            st.write("Sem registros.")
-            return
-        df_sum = df_pivot.copy()
-        df_sum['TOTAL'] = df_sum.sum(axis=1)
-        df_fmt = df_sum.astype(float)
-        for col in df_fmt.columns:
-            df_fmt[col] = df_fmt[col].apply(format_currency)
-        st.dataframe(df_fmt)
-
-    # 3. Dados Operacional
-    oper_mask = df['category_name'].str.upper().str.contains('OPERACIONAL', na=False)
-    df_oper = df[oper_mask].copy()
-    df_oper['month_year'] = df_oper['date'].dt.to_period('M')
-    df_oper['tipo_oper'] = df_oper['value'].apply(
-        lambda v: 'RECEITA OPERACIONAL' if v > 0 else 'CUSTO OPERACIONAL'
-    )
-    grouped_oper = (
-        df_oper
-        .groupby(['tipo_oper','category_item','month_year'])['value']
-        .sum()
-        .reset_index()
-    )
-
-    # 4. Caixa Total: soma de todos os lançamentos por mês
-    caixa_total = (
-        df
-        .groupby(df['date'].dt.to_period('M'))['value']
-        .sum()
-        .to_frame()
-    )
-
-    # 5. Financiamento e Impostos
-    def prepare_category(name: str) -> pd.DataFrame:
-        mask = df['category_name'].str.upper().str.contains(name, na=False)
-        df_cat = df[mask].copy()
-        if df_cat.empty:
-            return pd.DataFrame()
-        df_cat['month_year'] = df_cat['date'].dt.to_period('M')
-        return df_cat.pivot_table(
-            index='category_item',
-            columns='month_year',
-            values='value',
-            aggfunc='sum',
-            fill_value=0
-        )
-    pivot_fin = prepare_category('FINANCIAMENTO')
-    pivot_imp = prepare_category('IMPOSTOS')
-
-    # 6. Seções colapsáveis
+
+    # Seções colapsáveis
     st.subheader("📅 Fluxos Mensais por Categoria")
-    sections = [
-        ('RECEITA OPERACIONAL', grouped_oper[grouped_oper['tipo_oper']=='RECEITA OPERACIONAL']),
-        ('CUSTO OPERACIONAL', grouped_oper[grouped_oper['tipo_oper']=='CUSTO OPERACIONAL']),
-        ('FINANCIAMENTO', pivot_fin),
-        ('IMPOSTOS', pivot_imp),
-        ('CAIXA TOTAL', caixa_total.T)
-    ]
-    for title, data in sections:
+    for title, data in report['sections']:
         with st.expander(f"▶️ {title}"):
-            if title == 'CAIXA TOTAL':
-                display_pivot(data)
-            elif isinstance(data, pd.DataFrame) and 'value' in data.columns:
-                pivot_long = data.pivot_table(
-                    index='category_item',
-                    columns='month_year',
-                    values='value',
-                    aggfunc='sum',
-                    fill_value=0
-                )
-                display_pivot(pivot_long)
-            elif isinstance(data, pd.DataFrame):
-                display_pivot(data)
-            else:
-                st.write("Sem registros.")
-
-    # 7. DRE Simplificado com Percentual
+            display_pivot(data)
+
+    # Entradas, saídas e saldo por mês
+    st.subheader("💵 Fluxo de Caixa")
+    cash_flow = report['cash_flow']
+    if cash_flow.empty:
+        st.write("Sem registros.")
+    else:
+        cash_fmt = cash_flow.apply(format_brl_series)
+        cash_fmt.index = cash_fmt.index.astype(str)
+        st.dataframe(cash_fmt, use_container_width=True)
+
+    # DRE Simplificado com Percentual
     st.subheader("📊 DRE Simplificado")
-    dre_order = [
-        'RECEITA OPERACIONAL',
-        'CUSTO OPERACIONAL',
-        'DESPESAS ADMINISTRATIVAS',
-        'DESPESAS NAO OPERACIONAL',
-        'NAO OPERACIONAL',
-        'IMPOSTOS',
-        'FINANCIAMENTO',
-        'INVESTIMENTOS',
-        'OUTROS',
-        'CAIXA TOTAL'
-    ]
-    dre_values = {}
-    for line in dre_order:
-        if line in ['RECEITA OPERACIONAL','CUSTO OPERACIONAL']:
-            mask = df_oper[df_oper['tipo_oper']==line]['value']
-        elif line == 'CAIXA TOTAL':
-            mask = caixa_total['value']
-        else:
-            mask = df[df['category_name'].str.upper().str.contains(line, na=False)]['value']
-        dre_values[line] = mask.sum() if not mask.empty else 0
+    dre_values = report['dre']
     dre_df = pd.DataFrame.from_dict(dre_values, orient='index', columns=['VALOR'])
     base = dre_values.get('RECEITA OPERACIONAL',1)
-    dre_df['%'] = (dre_df['VALOR']/base*100).round(2).astype(str) + '%'
-    dre_df['VALOR'] = dre_df['VALOR'].apply(format_currency)
+    dre_df['%'] = format_percent_series(dre_df['VALOR']/base*100)
+    dre_df['VALOR'] = format_brl_series(dre_df['VALOR'])
     st.table(dre_df)
 
-        # 8. EBITDA
-    # EBITDA = soma de receitas e custos/despesas (negativos)
-    ebitda_value = (
-        dre_values.get('RECEITA OPERACIONAL', 0)
-        + dre_values.get('CUSTO OPERACIONAL', 0)
-        + dre_values.get('DESPESAS ADMINISTRATIVAS', 0)
-        + dre_values.get('DESPESAS NAO OPERACIONAL', 0)
-    )
-    # Percentual de EBITDA sobre Receita Operacional
-    receita_base = dre_values.get('RECEITA OPERACIONAL', 1)
-    ebitda_pct = (ebitda_value / receita_base * 100) if receita_base != 0 else 0
+    # EBITDA = soma de receitas e custos/despesas (negativos), % sobre a receita operacional
+    ebitda_value, ebitda_pct = report['ebitda']
 
     st.subheader("📈 EBITDA")
     col1, col2 = st.columns(2)
     col1.metric("EBITDA", format_currency(ebitda_value))
-    col2.metric("EBITDA (%)", f"{ebitda_pct:.2f}%")
+    col2.metric("EBITDA (%)", format_percent(ebitda_pct))
 
 
 if __name__ == "__main__":
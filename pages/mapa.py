@@ -4,6 +4,8 @@ Página de Mapa - Sistema de Auditoria FOX
 import streamlit as st
 import pandas as pd
 from config.database import get_database_connection
+from src.query_cache import stale_while_revalidate
+from src.cache_versions import versioned_cache, BACKSTOP_TTL
 
 # Import condicional do folium
 try:
@@ -74,6 +76,23 @@ def get_addresses_with_cities(collections):
         st.error(f"❌ Erro na consulta de endereços: {str(e)}")
         return None
 
+@versioned_cache('mapa')
+@stale_while_revalidate('mapa', fresh_ttl=BACKSTOP_TTL)
+def load_addresses():
+    """Endereços com cidade e estado; None se a coleção não estiver disponível"""
+    db_config = get_database_connection()
+    if not db_config:
+        st.error("❌ Erro ao conectar com o banco de dados")
+        return None
+    try:
+        return get_addresses_with_cities(db_config.get_collections())
+    finally:
+        db_config.close_connection()
+
+def prefetch():
+    """Aquece o cache da página (warmup e pré-carga em segundo plano)"""
+    load_addresses()
+
 def show_mapa_page():
     """Mostra página de mapa com endereços da Fox"""
     st.header("🗺️ Mapa de Endereços Fox")
@@ -98,28 +117,18 @@ def show_mapa_page():
         """)
         return
     
-    # Obter dados de endereços
-    db_config = get_database_connection()
-    if not db_config:
-        st.error("❌ Erro ao conectar com o banco de dados")
-        return
-    
-    collections = db_config.get_collections()
-    
     # Buscar endereços na coleção addresses com lookup de cities
     with st.spinner("Carregando endereços..."):
         try:
-            # Usar função otimizada com lookup
-            addresses = get_addresses_with_cities(collections)
+            # Usar função otimizada com lookup (resultado em cache)
+            addresses = load_addresses()
             
             if addresses is None:
                 st.error("❌ Coleção 'addresses' não encontrada")
-                db_config.close_connection()
                 return
             
             if not addresses:
                 st.warning("⚠️ Nenhum endereço encontrado na base de dados")
-                db_config.close_connection()
                 return
             
             # Converter para DataFrame para análise
@@ -316,9 +325,6 @@ def show_mapa_page():
             
         except Exception as e:
             st.error(f"❌ Erro ao carregar endereços: {str(e)}")
-        
-        finally:
-            db_config.close_connection()
 
 if __name__ == "__main__":
     show_mapa_page()
@@ -5,23 +5,48 @@ import streamlit as st
 import pandas as pd
 from config.database import get_database_connection
 from src.database_service_provisioning import ProvisioningService
+from src.query_cache import stale_while_revalidate
+from src.cache_versions import versioned_cache, BACKSTOP_TTL
+from src.snapshots import load_dataset
+from utils.formatters import format_number
+
+@versioned_cache('provisionamento')
+@stale_while_revalidate('provisionamento', fresh_ttl=BACKSTOP_TTL)
+def load_provisionamento_data():
+    """Carrega a tabela de provisionamentos (snapshot + delta ou consulta completa)"""
+    try:
+        db_config = get_database_connection()
+        if not db_config:
+            return None
+        
+        collections = db_config.get_collections()
+        try:
+            df_provisionings = load_dataset('provisionamentos', collections)
+            if df_provisionings is None:
+                df_provisionings = ProvisioningService(collections).get_simple_provisionings_table()
+            return df_provisionings
+        finally:
+            db_config.close_connection()
+    
+    except Exception as e:
+        st.error(f"❌ Erro ao carregar provisionamentos: {e}")
+        return None
+
+def prefetch():
+    """Aquece o cache da página (warmup e pré-carga em segundo plano)"""
+    load_provisionamento_data()
 
 def show_provisionamento_page():
     """Mostra página de provisionamento"""
     st.header("📦 Gestão de Provisionamento")
     
-    # Obter dados de provisionamento
-    db_config = get_database_connection()
-    if not db_config:
-        st.error("❌ Erro ao conectar com o banco de dados")
-        return
-    
-    collections = db_config.get_collections()
-    prov_service = ProvisioningService(collections)
-    
     # Carregar dados com a consulta específica
     with st.spinner("Carregando dados de provisionamento..."):
-        df_provisionings = prov_service.get_simple_provisionings_table()
+        df_provisionings = load_provisionamento_data()
+    
+    if df_provisionings is None:
+        st.error("❌ Erro ao conectar com o banco de dados")
+        return
     
     if not df_provisionings.empty:
         st.subheader(f"📋 Provisionamentos: {len(df_provisionings)} registros")
@@ -49,7 +74,7 @@ def show_provisionamento_page():
         
         with col1:
             total_amount = df_provisionings['amount'].sum()
-            st.metric("📦 Total Amount Remaining", f"{total_amount:,.0f}")
+            st.metric("📦 Total Amount Remaining", format_number(total_amount))
         
         with col2:
             unique_buyers = df_provisionings['comprador'].nunique()
@@ -61,8 +86,6 @@ def show_provisionamento_page():
     
     else:
         st.warning("Nenhum dado de provisionamento encontrado.")
-    
-    db_config.close_connection()
 
 if __name__ == "__main__":
     show_provisionamento_page()
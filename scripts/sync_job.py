@@ -27,7 +27,15 @@ def main():
         
         # Importar módulos necessários
         from config.database import get_database_connection
-        from src.database_service import DatabaseService
+        from config.postgres import get_postgres_connection
+        from src.sync_pipeline import run_parallel_sync
+        from src.dead_letter import DeadLetterQueue
+        from src.pg_partitions import detach_partitions_before, add_months, month_start
+        from src.pg_rollups import discard_rollup_before
+        from src.query_cache import get_query_cache, ENTITY_CACHE_NAMESPACES
+        from src.snapshots import build_stale_snapshots
+        from src.delivery_summary import refresh_delivery_summary
+        from src.cache_versions import ensure_probe_indexes
         
         logger.info("📊 Conectando ao MongoDB...")
         
@@ -39,48 +47,93 @@ def main():
         
         # Obter coleções
         collections = db_config.get_collections()
-        db_service = DatabaseService(collections)
         
         logger.info("🔄 Executando sincronização de dados...")
         
-        # Buscar tickets atualizados
-        tickets = db_service.get_tickets_with_users(limit=1000)
-        logger.info(f"📋 Processados {len(tickets)} tickets")
+        full_sync = os.getenv('SYNC_FULL', '').lower() in ('1', 'true', 'yes')
         
-        # Buscar dados de provisionamento
+        # Índices em updatedAt usados pela sonda de versões do cache das páginas
         try:
-            if hasattr(db_service, 'get_provisioning_data'):
-                provisioning = db_service.get_provisioning_data(limit=500)
-                logger.info(f"📦 Processados {len(provisioning)} registros de provisionamento")
+            ensure_probe_indexes(collections)
         except Exception as e:
-            logger.warning(f"⚠️ Erro ao processar provisionamento: {str(e)}")
+            logger.warning(f"⚠️ Erro ao criar índices da sonda: {str(e)}")
         
-        # Buscar dados financeiros
+        # Resumo de entregas antes dos contratos: o pipeline de contratos lê dele
         try:
-            if hasattr(db_service, 'get_finances_with_lookups'):
-                finances = db_service.get_finances_with_lookups(limit=500)
-                logger.info(f"💰 Processados {len(finances)} registros financeiros")
+            refresh_delivery_summary(collections, full=full_sync)
         except Exception as e:
-            logger.warning(f"⚠️ Erro ao processar financeiro: {str(e)}")
-        
-        # Buscar contratos
+            logger.warning(f"⚠️ Erro ao atualizar resumo de entregas: {str(e)}")
+        
+        # Cada entidade roda em paralelo, com sua tabela e sua marca d'água
+        results = run_parallel_sync(collections, full=full_sync)
+        
+        # Entidades com alterações invalidam o cache compartilhado das páginas
+        changed_namespaces = {
+            namespace
+            for name, result in results.items() if result.success and result.rows
+            for namespace in ENTITY_CACHE_NAMESPACES.get(name, [])
+        }
+        for namespace in sorted(changed_namespaces):
+            get_query_cache().invalidate(namespace)
+        if changed_namespaces:
+            logger.info(f"🧹 Cache invalidado: {', '.join(sorted(changed_namespaces))}")
+        
+        # Reprocessar linhas da dead-letter cujo backoff já venceu
+        try:
+            pg_connection = get_postgres_connection()
+            try:
+                retry_stats = DeadLetterQueue(pg_connection).retry_due(collections)
+                logger.info(f"🔁 Dead-letter: {retry_stats['resolved']} resolvidas, {retry_stats['failed']} reagendadas")
+            finally:
+                pg_connection.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao reprocessar dead-letter: {str(e)}")
+        
+        # Retenção: meses de cargas mais antigos que CARGAS_RETENTION_MONTHS são
+        # arquivados (ou removidos com CARGAS_RETENTION_DROP=true)
+        retention_months = os.getenv('CARGAS_RETENTION_MONTHS')
+        if retention_months:
+            try:
+                pg_connection = get_postgres_connection()
+                try:
+                    cursor = pg_connection.cursor()
+                    cutoff = add_months(month_start(datetime.now()), -int(retention_months))
+                    drop = os.getenv('CARGAS_RETENTION_DROP', '').lower() in ('1', 'true', 'yes')
+                    detached = detach_partitions_before(cursor, 'cargas', cutoff, archive=not drop)
+                    discard_rollup_before(cursor, 'cargas', cutoff)
+                    pg_connection.commit()
+                    cursor.close()
+                    logger.info(f"🗄️ Retenção de cargas: {len(detached)} partições destacadas")
+                finally:
+                    pg_connection.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Erro na retenção de partições: {str(e)}")
+        
+        # Snapshots das páginas: reconstruídos quando passam de FOX_SNAPSHOT_MAX_AGE;
+        # entre uma reconstrução e outra as páginas buscam só o delta
         try:
-            if hasattr(db_service, 'get_contracts_data'):
-                contracts = db_service.get_contracts_data(limit=500)
-                logger.info(f"📋 Processados {len(contracts)} contratos")
+            built = build_stale_snapshots(collections)
+            for name, rows in built.items():
+                logger.info(f"🗂️ Snapshot {name}: {rows} linhas")
         except Exception as e:
-            logger.warning(f"⚠️ Erro ao processar contratos: {str(e)}")
+            logger.warning(f"⚠️ Erro ao gerar snapshots: {str(e)}")
         
         # Fechar conexão
         db_config.close_connection()
         
-        logger.info("✅ Sincronização concluída com sucesso!")
-        
         # Estatísticas finais
         logger.info(f"📊 Resumo da sincronização:")
-        logger.info(f"   - Tickets: {len(tickets)}")
+        for name, result in results.items():
+            status = "✅" if result.success else "❌"
+            logger.info(f"   {status} {name}: {result.rows} linhas, {result.dead_letters} na dead-letter, {result.elapsed:.1f}s")
         logger.info(f"   - Timestamp: {datetime.now().isoformat()}")
         
+        failed = [name for name, result in results.items() if not result.success]
+        if failed:
+            logger.error(f"❌ Entidades com falha: {', '.join(failed)}")
+            return 1
+        
+        logger.info("✅ Sincronização concluída com sucesso!")
         return 0
         
     except ImportError as e:
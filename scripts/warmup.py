@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Aquecimento dos caches na subida do container
+Roda antes do Streamlit: a porta só abre (e o readiness só passa) depois
+que os dados das páginas estão no cache compartilhado (FOX_CACHE_REDIS_URL).
+Os caches em memória do servidor (st.cache_data) são aquecidos pelo próprio
+app na primeira sessão, lendo deste cache já quente
+"""
+
+import sys
+import os
+import logging
+import time
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Aquece todas as páginas; nunca impede a subida do app"""
+    try:
+        logger.info("🔥 Aquecendo caches das páginas")
+
+        # Adicionar path da aplicação
+        sys.path.append('/app')
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        from src.warmup import PAGES, warm_all
+        from src.query_cache import RedisCacheBackend, get_query_cache
+
+        if not isinstance(get_query_cache().backend, RedisCacheBackend):
+            logger.warning("⚠️ Sem cache compartilhado: o aquecimento só vale para o disco deste pod")
+
+        start = time.time()
+        timings = warm_all()
+        logger.info(f"✅ {len(timings)}/{len(PAGES)} páginas aquecidas em {time.time() - start:.1f}s")
+
+    except Exception as e:
+        logger.error(f"❌ Erro no aquecimento: {str(e)}")
+
+    # Página fria é só mais lenta: o app sobe mesmo se o aquecimento falhar
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Motor analítico embutido (DuckDB) sobre os snapshots das páginas
+Cada conjunto vira uma view SQL (snapshot mapeado em memória + delta do MongoDB);
+as páginas recebem só o resultado agregado, com filtros e colunas aplicados na leitura.
+Totais e agrupamentos sobre o recorte já filtrado pela página (query_frame)
+também rodam no DuckDB, só com as colunas que usam; sem DuckDB, em pandas
+"""
+import logging
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+    duckdb = None
+
+from src.snapshots import (
+    SNAPSHOTS, SNAPSHOT_DIR, PYARROW_AVAILABLE, latest_snapshot_path, load_snapshot_table, load_delta, to_arrow
+)
+
+logger = logging.getLogger(__name__)
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+def _literal(value) -> str:
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _conform(delta: pd.DataFrame, schema):
+    """Delta em Arrow com os tipos do snapshot (texto quando não converte)"""
+    import pyarrow as pa
+
+    table = to_arrow(delta)
+    arrays, names = [], []
+    for column, array in zip(table.column_names, table.columns):
+        if column in schema.names:
+            target = schema.field(column).type
+            try:
+                array = array.cast(target)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                array = array.cast(pa.string()) if not pa.types.is_null(array.type) else array
+        arrays.append(array)
+        names.append(column)
+    return pa.Table.from_arrays(arrays, names=names)
+
+class AnalyticsEngine:
+    """Conexão DuckDB em memória com as views dos snapshots.
+
+    Não é thread-safe: crie um motor por consulta (abrir custa milissegundos;
+    os snapshots não são copiados).
+    """
+
+    def __init__(self, collections=None, directory: str = SNAPSHOT_DIR):
+        if not DUCKDB_AVAILABLE:
+            raise ImportError("duckdb não instalado. Execute: pip install duckdb")
+        self.connection = duckdb.connect()
+        self.collections = collections
+        self.directory = directory
+
+    def register(self, name: str) -> bool:
+        """Cria a view `name`; False se o conjunto ainda não tem snapshot"""
+        loaded = load_snapshot_table(name, self.directory)
+        if loaded is None:
+            return False
+        table, watermark = loaded
+        spec = SNAPSHOTS[name]
+
+        snapshot_view = f"{name}_snapshot"
+        self.connection.register(snapshot_view, table)
+        columns = set(table.column_names)
+        source = f"SELECT * FROM {snapshot_view}"
+
+        # Documentos alterados depois do snapshot substituem as linhas antigas
+        delta = load_delta(name, self.collections, watermark) if self.collections is not None else pd.DataFrame()
+        if not delta.empty:
+            delta_view = f"{name}_delta"
+            self.connection.register(delta_view, _conform(delta, table.schema))
+            columns |= set(delta.columns)
+            group = _quote(spec.group)
+            source = (
+                f"SELECT * FROM {snapshot_view} WHERE {group} NOT IN (SELECT {group} FROM {delta_view}) "
+                f"UNION ALL BY NAME SELECT * FROM {delta_view}"
+            )
+
+        conditions = [
+            f"{_quote(column)} IS DISTINCT FROM {_literal(value)}"
+            for column, value in spec.exclude.items() if column in columns
+        ]
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        self.connection.execute(f"CREATE OR REPLACE VIEW {name} AS SELECT * FROM ({source}){where}")
+        return True
+
+    def columns(self, name: str) -> List[str]:
+        return [row[0] for row in self.connection.execute(f"DESCRIBE {name}").fetchall()]
+
+    def select(self, name: str, columns: List[str]) -> pd.DataFrame:
+        """Só as colunas pedidas (as que existirem no conjunto)"""
+        available = set(self.columns(name))
+        projection = ", ".join(_quote(column) for column in columns if column in available)
+        return self.query(f"SELECT {projection or '*'} FROM {name}")
+
+    def register_frame(self, name: str, df: pd.DataFrame):
+        """DataFrame em memória como view `name` (lido sem cópia)"""
+        self.connection.register(name, df)
+
+    def query(self, sql: str, params: Optional[list] = None) -> pd.DataFrame:
+        return self.connection.execute(sql, params or []).df()
+
+    def close(self):
+        self.connection.close()
+
+def engine_available(datasets: List[str], directory: str = SNAPSHOT_DIR) -> bool:
+    """Há motor e snapshot para os conjuntos (só verifica os arquivos, sem abrir o motor)"""
+    return (DUCKDB_AVAILABLE and PYARROW_AVAILABLE
+            and all(latest_snapshot_path(name, directory) is not None for name in datasets))
+
+def open_engine(collections, datasets: List[str], directory: str = SNAPSHOT_DIR) -> Optional[AnalyticsEngine]:
+    """Motor com as views pedidas, ou None (sem DuckDB/pyarrow ou sem snapshot)"""
+    if not (DUCKDB_AVAILABLE and PYARROW_AVAILABLE):
+        return None
+    try:
+        engine = AnalyticsEngine(collections, directory)
+        if all(engine.register(name) for name in datasets):
+            return engine
+        engine.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Motor analítico indisponível: {str(e)}")
+    return None
+
+# Lançamentos financeiros: data inteira AAAAMMDD -> timestamp (NULL se inválida)
+_FINANCE_ROWS_SQL = """
+    SELECT TRY_STRPTIME(CAST(TRY_CAST("date" AS BIGINT) AS VARCHAR), '%Y%m%d') AS ts,
+           TRY_CAST("value" AS DOUBLE) AS value,
+           category_name,
+           category_item
+    FROM finances
+"""
+
+def finance_years(engine: AnalyticsEngine) -> List[int]:
+    """Anos com lançamentos, do mais recente ao mais antigo"""
+    df = engine.query(f"SELECT DISTINCT year(ts) AS year FROM ({_FINANCE_ROWS_SQL}) WHERE ts IS NOT NULL ORDER BY 1 DESC")
+    return [int(year) for year in df['year']]
+
+def finance_monthly(engine: AnalyticsEngine, year: Optional[int] = None) -> pd.DataFrame:
+    """Soma por mês, categoria e item, separando entradas e saídas.
+
+    Mesmas colunas que a página usa (date, category_name, category_item, value),
+    com `date` no primeiro dia do mês; lançamentos sem data válida ficam com
+    date nulo (entram no DRE, não nos fluxos mensais), como na versão em pandas.
+    """
+    where, params = "", []
+    if year is not None:
+        where, params = "WHERE year(ts) = ?", [int(year)]
+    return engine.query(f"""
+        SELECT date_trunc('month', ts) AS date, category_name, category_item, SUM(value) AS value
+        FROM ({_FINANCE_ROWS_SQL})
+        {where}
+        GROUP BY date_trunc('month', ts), category_name, category_item, value > 0
+    """, params)
+
+def query_frame(df: pd.DataFrame, sql: str, params: Optional[list] = None) -> pd.DataFrame:
+    """Executa `sql` sobre o DataFrame, visível na consulta como `frame`"""
+    engine = AnalyticsEngine()
+    try:
+        engine.register_frame('frame', df)
+        return engine.query(sql, params)
+    finally:
+        engine.close()
+
+def _numeric_columns(df: pd.DataFrame, columns: List[str], keys: List[str] = ()) -> pd.DataFrame:
+    """Só as colunas usadas: medidas como número (nulo se não converte), chaves como estão"""
+    frame = df[list(keys)].copy()
+    for column in columns:
+        frame[column] = pd.to_numeric(df[column], errors='coerce')
+    return frame
+
+def frame_totals(df: pd.DataFrame, columns: Dict[str, str]) -> Dict[str, float]:
+    """Somas das colunas do recorte ({nome: coluna}); colunas ausentes somam 0"""
+    totals = {name: 0.0 for name in columns}
+    present = {name: column for name, column in columns.items() if column in df.columns}
+    if df.empty or not present:
+        return totals
+    if not DUCKDB_AVAILABLE:
+        totals.update({name: float(pd.to_numeric(df[column], errors='coerce').sum()) for name, column in present.items()})
+        return totals
+    sums = ", ".join(f"COALESCE(SUM({_quote(column)}), 0) AS {_quote(name)}" for name, column in present.items())
+    row = query_frame(_numeric_columns(df, sorted(set(present.values()))), f"SELECT {sums} FROM frame").iloc[0]
+    totals.update({name: float(row[name]) for name in present})
+    return totals
+
+def contract_totals(df: pd.DataFrame) -> Dict[str, float]:
+    """Cards dos contratos: sacas, valor total, clientes distintos e PIS/COFINS"""
+    if df.empty:
+        return {'bags': 0.0, 'value': 0.0, 'clients': 0, 'pis_cofins': 0.0}
+    if not DUCKDB_AVAILABLE:
+        return {
+            'bags': float(df['amount'].sum()), 'value': float(df['total'].sum()),
+            'clients': int(df['cliente'].nunique()), 'pis_cofins': float(df['pis_cofins_value'].sum())
+        }
+    row = query_frame(_numeric_columns(df, ['amount', 'total', 'pis_cofins_value'], ['cliente']), """
+        SELECT COALESCE(SUM(amount), 0) AS bags, COALESCE(SUM(total), 0) AS value,
+               COUNT(DISTINCT cliente) AS clients, COALESCE(SUM(pis_cofins_value), 0) AS pis_cofins
+        FROM frame
+    """).iloc[0]
+    return {'bags': float(row['bags']), 'value': float(row['value']),
+            'clients': int(row['clients']), 'pis_cofins': float(row['pis_cofins'])}
+
+def contract_client_volumes(df: pd.DataFrame) -> pd.DataFrame:
+    """Volume, valor total e nº de contratos por cliente (índice), do maior volume ao menor"""
+    columns = ['Volume (Sacas)', 'Valor Total (R$)', 'Nº Contratos']
+    if not DUCKDB_AVAILABLE:
+        volumes = df.groupby('cliente').agg({'amount': 'sum', 'total': 'sum', '_id': 'count'}).round(2)
+        volumes.columns = columns
+        return volumes.sort_values('Volume (Sacas)', ascending=False)
+    volumes = query_frame(_numeric_columns(df, ['amount', 'total'], ['cliente']), """
+        SELECT cliente,
+               ROUND(COALESCE(SUM(amount), 0), 2) AS "Volume (Sacas)",
+               ROUND(COALESCE(SUM(total), 0), 2) AS "Valor Total (R$)",
+               COUNT(*) AS "Nº Contratos"
+        FROM frame
+        WHERE cliente IS NOT NULL
+        GROUP BY cliente
+        ORDER BY 2 DESC, cliente
+    """)
+    return volumes.set_index('cliente')
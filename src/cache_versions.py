@@ -0,0 +1,199 @@
+"""
+Versões dos conjuntos de dados das páginas
+Uma sonda barata (contagem estimada + maior updatedAt) observa as coleções de
+cada conjunto; quando algo muda, a versão do namespace no cache compartilhado
+é incrementada. Os loaders ficam em cache até a versão mudar, sem TTL fixo
+"""
+import functools
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+import streamlit as st
+
+from config.database import get_database_connection
+from src.query_cache import QueryCache, KEY_PREFIX, fingerprint, get_query_cache, track_stale
+
+logger = logging.getLogger(__name__)
+
+# Coleções lidas por cada namespace de cache (origem + lookups)
+DATASET_COLLECTIONS = {
+    'cargas': ['ticketv2', 'ticketv2_transactions', 'provisionings', 'orderv2', 'users', 'grains'],
+    'contratos': ['orderv2', 'contract_delivery_summary', 'users', 'grains'],
+    'financeiro': ['finances', 'finances_categories', 'users'],
+    'provisionamento': ['provisionings', 'orderv2', 'users', 'grains'],
+    'mapa': ['addresses', 'cities']
+}
+
+# Intervalo mínimo entre duas sondagens do mesmo conjunto (entre todos os pods)
+PROBE_INTERVAL = int(os.getenv('FOX_VERSION_PROBE_INTERVAL', 10))
+# Validade máxima de um resultado mesmo sem mudança detectada: cobre alterações
+# que a sonda não enxerga (documentos gravados sem atualizar updatedAt)
+BACKSTOP_TTL = int(os.getenv('FOX_CACHE_BACKSTOP_TTL', 3600))
+
+def collection_signature(collection) -> tuple:
+    """(documentos, maior updatedAt): metadados + um documento pelo índice"""
+    count = collection.estimated_document_count()
+    latest = collection.find_one(
+        {"updatedAt": {"$ne": None}}, {"updatedAt": 1}, sort=[("updatedAt", -1)]
+    )
+    return count, str(latest.get('updatedAt')) if latest else None
+
+def ensure_probe_indexes(collections: Dict):
+    """Índice em updatedAt nas coleções sondadas (idempotente).
+
+    Sem ele o find_one ordenado da sonda varre a coleção inteira a cada
+    PROBE_INTERVAL segundos.
+    """
+    for name in sorted({name for names in DATASET_COLLECTIONS.values() for name in names}):
+        collections[name].create_index("updatedAt")
+
+class CacheVersionService:
+    """Sonda as coleções e incrementa a versão dos namespaces que mudaram.
+
+    A versão é a geração do namespace no cache compartilhado: a invalidação
+    feita pelo job de sincronização também conta como nova versão.
+    """
+
+    def __init__(self, collections: Optional[Dict] = None, cache: Optional[QueryCache] = None,
+                 interval: int = PROBE_INTERVAL):
+        self._collections = collections
+        self._db_config = None
+        self._cache = cache
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self) -> QueryCache:
+        return self._cache or get_query_cache()
+
+    def _get_collections(self) -> Optional[Dict]:
+        if self._collections is None:
+            # Conexão própria e duradoura: a sonda roda a cada poucos segundos
+            db_config = get_database_connection()
+            if db_config:
+                self._db_config = db_config
+                self._collections = db_config.get_collections()
+                try:
+                    ensure_probe_indexes(self._collections)
+                except Exception as e:
+                    # Usuário sem permissão de escrita: o job de sincronização cria os índices
+                    logger.warning(f"⚠️ Não foi possível criar os índices da sonda: {str(e)}")
+        return self._collections
+
+    def signature(self, namespace: str) -> Optional[str]:
+        collections = self._get_collections()
+        if collections is None:
+            return None
+        return fingerprint(*(collection_signature(collections[name]) for name in DATASET_COLLECTIONS[namespace]))
+
+    def check(self, namespace: str) -> bool:
+        """Sonda o conjunto agora; True se mudou (e a versão foi incrementada)"""
+        try:
+            signature = self.signature(namespace)
+            if signature is None:
+                return False
+            key = f"{KEY_PREFIX}:{namespace}:signature"
+            previous = self.cache.backend.get(key)
+            if previous is not None and previous.decode() == signature:
+                return False
+            self.cache.backend.set(key, signature.encode())
+            # A primeira sondagem só registra a assinatura
+            if previous is None:
+                return False
+            self.cache.invalidate(namespace)
+            logger.info(f"🔁 {namespace}: dados alterados, nova versão do cache")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao sondar {namespace}: {str(e)}")
+            return False
+
+    def check_all(self) -> List[str]:
+        """Sonda todos os conjuntos; namespaces que mudaram"""
+        return [namespace for namespace in DATASET_COLLECTIONS if self.check(namespace)]
+
+    def poll_once(self):
+        """Sonda os conjuntos cujo intervalo já passou.
+
+        Só um pod sonda cada conjunto por intervalo (trava no cache
+        compartilhado); os demais apenas leem a versão.
+        """
+        for namespace in DATASET_COLLECTIONS:
+            if self.cache.try_lease(namespace, 'version-probe', self.interval):
+                self.check(namespace)
+
+    def start(self):
+        """Inicia a sondagem periódica numa thread daemon (uma por processo)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="cache-versions", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(self.interval)
+
+    def version(self, namespace: str) -> int:
+        """Versão atual do namespace; a sondagem roda em segundo plano e nunca bloqueia a página"""
+        self.start()
+        return self.cache.version(namespace)
+
+    def close(self):
+        self._stop.set()
+        if self._db_config:
+            self._db_config.close_connection()
+            self._db_config = None
+            self._collections = None
+
+_service = None
+
+def get_version_service() -> CacheVersionService:
+    """Serviço único do processo"""
+    global _service
+    if _service is None:
+        _service = CacheVersionService()
+    return _service
+
+def dataset_version(namespace: str) -> int:
+    return get_version_service().version(namespace)
+
+class _StaleResult(Exception):
+    """Valor servido vencido pelo SWR: devolvido à página, mas fora do st.cache_data"""
+
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+def versioned_cache(namespace: str, max_entries: int = 16):
+    """Decorator: cache do processo (st.cache_data) reaproveitado até a versão do conjunto mudar.
+
+    Resultado que o stale_while_revalidate serviu vencido (geração anterior)
+    não fica guardado sob a versão nova: o próximo rerun pega o recalculado.
+    """
+    def decorator(func):
+        def cached(version, *args, **kwargs):
+            with track_stale() as tracked:
+                value = func(*args, **kwargs)
+            # st.cache_data não guarda exceções
+            if tracked['stale']:
+                raise _StaleResult(value)
+            return value
+        # Chave do st.cache_data distinta por loader (o código de `cached` é o mesmo)
+        cached.__module__ = func.__module__
+        cached.__qualname__ = f"{func.__qualname__}.versioned"
+        cached = st.cache_data(ttl=BACKSTOP_TTL, max_entries=max_entries, show_spinner=False)(cached)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return cached(dataset_version(namespace), *args, **kwargs)
+            except _StaleResult as stale:
+                return stale.value
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorator
@@ -0,0 +1,176 @@
+"""
+Consulta de cargas no PostgreSQL a partir dos filtros da página de Cargas
+Gera SQL parametrizado, paginação por chave (keyset) e agregados no servidor
+"""
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, List, Optional, Tuple
+
+from src.sync_pipeline import SYNC_START_DATE
+from src.search_index import parse_ticket_query
+
+# Mesmo formato "[últimos 6 do contrato] Nome" montado pela página a partir do MongoDB
+SELLER_DISPLAY_SQL = (
+    "CASE WHEN COALESCE(origin_order, '') <> '' "
+    "THEN '[' || RIGHT(origin_order, 6) || '] ' || COALESCE(seller_name, 'N/A') "
+    "ELSE COALESCE(seller_name, 'N/A') END"
+)
+BUYER_DISPLAY_SQL = (
+    "CASE WHEN COALESCE(destination_order, '') <> '' "
+    "THEN '[' || RIGHT(destination_order, 6) || '] ' || COALESCE(buyer_name, 'N/A') "
+    "ELSE COALESCE(buyer_name, 'N/A') END"
+)
+
+# Colunas com os nomes usados pela página (mesmos do pipeline do MongoDB)
+CARGAS_PAGE_COLUMNS = f"""
+    ticket_id,
+    ticket_number AS ticket,
+    loading_date AS "loadingDate",
+    {BUYER_DISPLAY_SQL} AS buyer_display,
+    {SELLER_DISPLAY_SQL} AS seller_display,
+    COALESCE(driver_name, '') AS driver_name,
+    COALESCE(grain_name, '') AS grain_name,
+    COALESCE(contract_type, '') AS contract_type,
+    COALESCE(status, '') AS status,
+    COALESCE(provisioning_status, '') AS provisioning_status,
+    CASE WHEN paid THEN '✅' ELSE '⏰' END AS paid_status,
+    COALESCE(amount, 0) AS amount,
+    COALESCE(receita, 0) AS revenue_value,
+    COALESCE(custo, 0) AS cost_value,
+    COALESCE(frete, 0) AS total_freight_value,
+    COALESCE(lucro_bruto, 0) AS gross_profit
+"""
+
+# Colunas ordenáveis da página -> expressão SQL (sem NULL, para a comparação por chave)
+CARGAS_SORT_COLUMNS = {
+    'loadingDate': "loading_date",
+    'ticket': "COALESCE(ticket_number, 0)",
+    'buyer_display': BUYER_DISPLAY_SQL,
+    'seller_display': SELLER_DISPLAY_SQL,
+    'grain_name': "COALESCE(grain_name, '')",
+    'status': "COALESCE(status, '')",
+    'amount': "COALESCE(amount, 0)",
+    'revenue_value': "COALESCE(receita, 0)",
+    'cost_value': "COALESCE(custo, 0)",
+    'total_freight_value': "COALESCE(frete, 0)",
+    'gross_profit': "COALESCE(lucro_bruto, 0)"
+}
+DEFAULT_SORT = 'loadingDate'
+
+# Página: (valor da coluna de ordenação, ticket_id) da última linha exibida
+Keyset = Tuple[Any, str]
+
+@dataclass
+class CargasFilters:
+    """Filtros da página de Cargas; None/vazio significa 'Todos'"""
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    status: Optional[str] = None
+    grain: Optional[str] = None
+    contract_type: Optional[str] = None
+    paid: Optional[bool] = None
+    provisioning_status: Optional[str] = None
+    buyer: Optional[str] = None
+    sellers: List[str] = field(default_factory=list)
+    ticket_search: str = ''
+
+    @property
+    def rollup_compatible(self) -> bool:
+        """Filtros que a view cargas_daily_rollup consegue atender sozinha"""
+        return not (self.provisioning_status or self.buyer or self.sellers or self.ticket_search.strip())
+
+def build_cargas_where(filters: CargasFilters, rollup: bool = False) -> Tuple[str, list]:
+    """Monta o WHERE parametrizado para a tabela cargas (ou para o agregado diário)"""
+    clauses, params = [], []
+
+    # Sempre limitado por data: poda partições e exclui cargas sem data (keyset)
+    start = filters.start_date or SYNC_START_DATE.date()
+    if rollup:
+        clauses.append("day >= %s")
+        params.append(start)
+        if filters.end_date:
+            clauses.append("day <= %s")
+            params.append(filters.end_date)
+    else:
+        clauses.append("loading_date >= %s")
+        params.append(start)
+        if filters.end_date:
+            clauses.append("loading_date < %s")
+            params.append(filters.end_date + timedelta(days=1))
+
+    for column, value in (('status', filters.status), ('grain_name', filters.grain),
+                          ('contract_type', filters.contract_type)):
+        if value:
+            clauses.append(f"{column} = %s")
+            params.append(value)
+
+    if filters.paid is not None:
+        clauses.append("paid = %s")
+        params.append(filters.paid)
+
+    if not rollup:
+        if filters.provisioning_status:
+            clauses.append("provisioning_status = %s")
+            params.append(filters.provisioning_status)
+        if filters.buyer:
+            clauses.append(f"{BUYER_DISPLAY_SQL} = %s")
+            params.append(filters.buyer)
+        if filters.sellers:
+            clauses.append(f"{SELLER_DISPLAY_SQL} = ANY(%s)")
+            params.append(list(filters.sellers))
+        if filters.ticket_search.strip():
+            # Mesma busca do índice em memória: prefixo ancorado (índice text_pattern_ops) ou faixa
+            query = parse_ticket_query(filters.ticket_search)
+            if query is None:
+                clauses.append("FALSE")
+            elif query[0] == 'range':
+                clauses.append("ticket_number BETWEEN %s AND %s")
+                params += [query[1], query[2]]
+            else:
+                clauses.append("CAST(ticket_number AS TEXT) LIKE %s")
+                params.append(f"{query[1]}%")
+
+    return " AND ".join(clauses), params
+
+def build_page_query(filters: CargasFilters, page_size: int, after: Optional[Keyset] = None,
+                     sort: str = DEFAULT_SORT, descending: bool = True) -> Tuple[str, list]:
+    """Próxima página ordenada por `sort` (desempate por ticket_id); continua depois da chave `after`"""
+    if sort not in CARGAS_SORT_COLUMNS:
+        raise ValueError(f"Coluna de ordenação inválida: {sort}")
+    expression = CARGAS_SORT_COLUMNS[sort]
+    direction, comparison = ("DESC", "<") if descending else ("ASC", ">")
+
+    where, params = build_cargas_where(filters)
+    if after is not None:
+        where += f" AND ({expression}, ticket_id) {comparison} (%s, %s)"
+        params += [after[0], after[1]]
+
+    # Uma linha a mais indica se existe página seguinte
+    sql = f"""
+        SELECT {CARGAS_PAGE_COLUMNS}, {expression} AS sort_key
+        FROM cargas
+        WHERE {where}
+        ORDER BY {expression} {direction}, ticket_id {direction}
+        LIMIT %s
+    """
+    return sql, params + [page_size + 1]
+
+def build_aggregate_queries(filters: CargasFilters) -> Tuple[Tuple[str, list], Tuple[str, list], Tuple[str, list]]:
+    """Totais, contagem por status e por dia; usa o agregado diário quando possível"""
+    if filters.rollup_compatible:
+        where, params = build_cargas_where(filters, rollup=True)
+        source, day, loads = "cargas_daily_rollup", "day", "SUM(loads)"
+        bags, revenue, cost, freight, profit = "bags", "revenue", "cost", "freight", "gross_profit"
+    else:
+        where, params = build_cargas_where(filters)
+        source, day, loads = "cargas", "loading_date::date", "COUNT(*)"
+        bags, revenue, cost, freight, profit = "amount", "receita", "custo", "frete", "lucro_bruto"
+
+    totals = (f"""
+        SELECT COALESCE({loads}, 0), COALESCE(SUM({bags}), 0), COALESCE(SUM({revenue}), 0),
+               COALESCE(SUM({cost}), 0), COALESCE(SUM({freight}), 0), COALESCE(SUM({profit}), 0)
+        FROM {source} WHERE {where}
+    """, params)
+    by_status = (f"SELECT status, {loads} FROM {source} WHERE {where} GROUP BY 1 ORDER BY 2 DESC", params)
+    by_day = (f"SELECT {day}, {loads} FROM {source} WHERE {where} GROUP BY 1 ORDER BY 1", params)
+    return totals, by_status, by_day
@@ -1,12 +1,13 @@
 """
 Serviço de acesso ao banco de dados - Versão atualizada com driver
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import pandas as pd
 from datetime import datetime, timedelta
 from bson import ObjectId
 
 from .data_models import Ticket, TicketTransaction, Order, DataProcessor
+from .delivery_summary import SUMMARY_COLLECTION, delivery_stages, ensure_delivery_summary
 
 class DatabaseService:
     """Serviço para acesso aos dados do MongoDB"""
@@ -20,17 +21,29 @@ class DatabaseService:
         self.grains = collections.get('grains')
         self.finances = collections.get('finances')
         self.finances_categories = collections.get('finances_categories')
+        self.collections = collections
         
     def get_tickets_with_users(self, limit: int = 100) -> List[Dict]:
         """Busca tickets com lookup de users para seller, buyer e driver"""
+        # Filtrar apenas cargas de 2025+ e excluir cancelados
+        pipeline = self.build_tickets_pipeline({
+            "loadingDate": {"$gte": datetime(2025, 1, 1)},
+            "status": {"$ne": "Cancelado"}
+        }, limit=limit)
+        
+        try:
+            results = list(self.ticketv2.aggregate(pipeline))
+            return results
+        except Exception as e:
+            print(f"Erro ao buscar tickets com users: {e}")
+            return []
+    
+    def build_tickets_pipeline(self, match: Dict, limit: Optional[int] = None) -> List[Dict]:
+        """Monta o pipeline de tickets por transação (uma linha por transação)"""
         pipeline = [
-            # Filtrar apenas cargas de 2025+ e excluir cancelados
-            {"$match": {
-                "loadingDate": {"$gte": datetime(2025, 1, 1)},
-                "status": {"$ne": "Cancelado"}
-            }},
+            {"$match": match},
             # Unwind das transactions para processar cada transação individualmente
-            {"$unwind": "$transactions"},
+            {"$unwind": {"path": "$transactions", "includeArrayIndex": "transaction_index"}},
             # Lookup com orderv2 para destinationOrder das transactions
             {
                 "$lookup": {
@@ -233,16 +246,14 @@ class DatabaseService:
                     }
                 }
             },
-            {"$sort": {"ticket": -1}},
-            {"$limit": limit}
         ]
         
-        try:
-            results = list(self.ticketv2.aggregate(pipeline))
-            return results
-        except Exception as e:
-            print(f"Erro ao buscar tickets com users: {e}")
-            return []
+        # Ordenação só faz sentido quando há limite (páginas); a sincronização lê tudo
+        if limit:
+            pipeline.append({"$sort": {"ticket": -1}})
+            pipeline.append({"$limit": limit})
+        
+        return pipeline
     
     def get_tickets(self, limit: int = 100) -> List[Ticket]:
         """Busca tickets básicos"""
@@ -342,30 +353,44 @@ class DatabaseService:
             print("Coleção finances não disponível")
             return []
         
-        # Definir filtro de data baseado no ano
+        # Ano filtrado no próprio $match pelo campo date (inteiro AAAAMMDD); sem ano, todos
+        match = {"isFuturo": {"$ne": True}, "isIgnored": {"$ne": True}}
         if year_filter and year_filter != "Todos":
-            # Filtrar pelo ano específico
-            filter_year = int(year_filter)
-            start_of_year = datetime(filter_year, 1, 1)
-            end_of_year = datetime(filter_year, 12, 31, 23, 59, 59)
-        else:
-            # Filtrar pelo ano em exercício (ano atual)
-            current_year = datetime.now().year
-            start_of_year = datetime(current_year, 1, 1)
-            end_of_year = datetime(current_year, 12, 31, 23, 59, 59)
-            
+            match["date"] = self.finance_year_range(year_filter)
+        pipeline = self.build_finances_pipeline(match)
+        
+        try:
+            results = list(self.finances.aggregate(pipeline))
+            return results
+        except Exception as e:
+            print(f"Erro ao buscar dados financeiros: {e}")
+            return []
+    
+    @staticmethod
+    def finance_year_range(year) -> Dict:
+        """Filtro do campo date (inteiro AAAAMMDD) para um ano inteiro"""
+        year = int(year)
+        return {"$gte": year * 10000 + 101, "$lte": year * 10000 + 1231}
+    
+    def get_finance_years(self) -> List[int]:
+        """Anos com lançamentos, agrupados no servidor (sem trazer os lançamentos)"""
+        if self.finances is None:
+            return []
         pipeline = [
-            # Filtro apenas por isIgnored (removendo filtro de ano temporariamente)
-            {
-                "$match": {
-                    "isFuturo": {
-                        "$ne": True,
-                    },
-                    "isIgnored": {
-                        "$ne": True
-                    }
-                }
-            },
+            {"$match": {"isFuturo": {"$ne": True}, "isIgnored": {"$ne": True},
+                        "date": {"$type": "number", "$gte": 19000101}}},
+            {"$group": {"_id": {"$trunc": {"$divide": ["$date", 10000]}}}}
+        ]
+        try:
+            return sorted((int(doc['_id']) for doc in self.finances.aggregate(pipeline)), reverse=True)
+        except Exception as e:
+            print(f"Erro ao buscar anos dos lançamentos: {e}")
+            return []
+    
+    def build_finances_pipeline(self, match: Dict) -> List[Dict]:
+        """Monta o pipeline de lançamentos financeiros com categorias e users resolvidos"""
+        return [
+            {"$match": match},
             # Lookup com finances_categories
             {
                 "$lookup": {
@@ -416,17 +441,84 @@ class DatabaseService:
                     "userVinculated": 1,
                     "category": 1,
                     "description": 1,
-                    "isIgnored": 1
+                    "isIgnored": 1,
+                    "isFuturo": 1,
+                    "updatedAt": 1
                 }
             },
             {"$sort": {"date": -1}}
         ]
-    
+
+
+    def get_contracts_data(self, limit: Optional[int] = 1000) -> List[Dict]:
+        """Busca contratos (orderv2) com tickets, users e grains resolvidos (limit=None: todos)"""
+        # O pipeline lê as entregas do resumo; antes do primeiro job ele está vazio
+        ensure_delivery_summary(self.collections)
+        pipeline = self.build_contracts_pipeline(limit=limit)
         
         try:
-            results = list(self.finances.aggregate(pipeline))
+            results = list(self.orderv2.aggregate(pipeline))
             return results
         except Exception as e:
-            print(f"Erro ao buscar dados financeiros: {e}")
+            print(f"Erro ao buscar contratos: {e}")
             return []
-
+    
+    def build_contracts_pipeline(self, match: Optional[Dict] = None, limit: Optional[int] = None,
+                                 include_canceled: bool = False) -> List[Dict]:
+        """Monta o pipeline de contratos usado pela página e pela sincronização"""
+        pipeline = []
+        if match:
+            pipeline.append({"$match": match})
+        
+        pipeline += [
+            # Resumo de entregas mantido pelo job de sincronização (src/delivery_summary.py)
+            {"$lookup": {"from": SUMMARY_COLLECTION, "localField": "_id", "foreignField": "_id", "as": "tickets"}},
+            {"$lookup": {"from": "users", "localField": "buyer", "foreignField": "_id", "as": "buyer_info"}},
+            {"$lookup": {"from": "users", "localField": "seller", "foreignField": "_id", "as": "seller_info"}},
+            {"$lookup": {"from": "grains", "localField": "grain", "foreignField": "_id", "as": "grain_info"}},
+            {"$addFields": {
+                "buyer_name": {"$ifNull": [{"$arrayElemAt": ["$buyer_info.name", 0]}, {"$arrayElemAt": ["$buyer_info.companyName", 0]}]},
+                "seller_name": {"$ifNull": [{"$arrayElemAt": ["$seller_info.name", 0]}, {"$arrayElemAt": ["$seller_info.companyName", 0]}]},
+                "grain_name": {"$arrayElemAt": ["$grain_info.name", 0]},
+                "contract_type": {"$switch": {"branches": [
+                    {"case": {"$eq": ["$isGrain", True]}, "then": "🌾 Grão"},
+                    {"case": {"$eq": ["$isFreight", True]}, "then": "🚛 Frete"},
+                    {"case": {"$eq": ["$isService", True]}, "then": "⭐ Clube FX"}],
+                "default": "❓ Indefinido"}},
+                "direction_type": {"$cond": {"if": {"$eq": ["$isBuying", True]}, "then": "Originação", "else": "Supply"}},
+                "status_display": {"$switch": {"branches": [
+                    {"case": {"$eq": ["$isDone", True]}, "then": "✅ Concluído"},
+                    {"case": {"$eq": ["$isCanceled", True]}, "then": "❌ Cancelado"},
+                    {"case": {"$eq": ["$isInProgress", True]}, "then": "🔄 Em Progresso"}],
+                "default": "⏳ Pendente"}},
+                "loadingDate": {"$arrayElemAt": ["$tickets.loadingDate", 0]},
+                "deliveryDate": {"$arrayElemAt": ["$tickets.deliveryDate", 0]},
+                "amountOrderedSafe": {"$ifNull": ["$amountOrdered", 0]},
+                "paymentDaysSafe": {"$ifNull": ["$paymentDaysAfterDelivery", 0]},
+                "destOrderList": {"$map": {"input": {"$arrayElemAt": ["$tickets.transactions", 0]}, "as": "tr", "in": "$$tr.destinationOrder"}},
+                "origOrderList": {"$map": {"input": {"$arrayElemAt": ["$tickets.transactions", 0]}, "as": "tr", "in": "$$tr.originOrder"}},
+                "Ordem": {"$cond": [
+                    {"$eq": ["$direction_type", "Supply"]},
+                    {"$arrayElemAt": ["$destOrderList", -1]},
+                    {"$arrayElemAt": ["$origOrderList", -1]}
+                ]},
+                "pis_status": {"$cond": {"if": {"$eq": ["$hasPIS", True]}, "then": "✅ Com PIS", "else": "❌ Sem PIS"}},
+                "pis_cofins_value": {"$cond": {
+                    "if": {"$eq": ["$hasPIS", True]}, 
+                    "then": {"$multiply": [{"$multiply": ["$amount", "$bagPrice"]}, 0.0925]}, 
+                    "else": 0
+                }}
+            }},
+            # Entregue pelas transações dos tickets (resumo), restante e divergência com amountOrdered
+            *delivery_stages()
+        ]
+        
+        # A sincronização precisa dos cancelados para refletir cancelamentos na réplica
+        if not include_canceled:
+            pipeline.append({"$match": {"$expr": {"$ne": ["$isCanceled", True]}}})
+        
+        if limit:
+            pipeline.append({"$sort": {"createdAt": -1}})
+            pipeline.append({"$limit": limit})
+        
+        return pipeline
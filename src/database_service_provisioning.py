@@ -429,7 +429,21 @@ class ProvisioningService:
     
     def get_simple_provisionings_table(self) -> pd.DataFrame:
         """Retorna DataFrame com lookups de grains e orderv2 incluindo bagPrice de origem e destino"""
-        pipeline = [
+        try:
+            results = list(self.provisionings.aggregate(self.build_simple_provisionings_pipeline()))
+            return self.simple_provisionings_frame(results)
+            
+        except Exception as e:
+            print(f"Erro ao buscar provisionamentos com lookups: {e}")
+            return pd.DataFrame()
+    
+    def build_simple_provisionings_pipeline(self, match: Dict = None) -> List[Dict]:
+        """Monta o pipeline da tabela simples (uma linha por sellersOrder)"""
+        pipeline = []
+        if match:
+            pipeline.append({"$match": match})
+        
+        pipeline += [
             # Unwind das sellersOrders
             {"$unwind": "$sellersOrders"},
             
@@ -479,34 +493,88 @@ class ProvisioningService:
                 }
             }
         ]
-        
-        try:
-            results = list(self.provisionings.aggregate(pipeline))
-            
-            if not results:
-                return pd.DataFrame()
-            
-            # Converter para DataFrame
-            data = []
-            for result in results:
-                data.append({
-                    'comprador': str(result.get('comprador', 'N/A')),
-                    'vendedor': str(result.get('vendedor', 'N/A')),
-                    'destinationOrder': str(result.get('destinationOrder', 'N/A')),
-                    'originOrder': str(result.get('originOrder', 'N/A')),
-                    'amount': result.get('amount', 0),
-                    'grain': str(result.get('grain', 'N/A')),
-                    'grain_name': result.get('grain_name', 'N/A'),
-                    'destination_bagPrice': result.get('destination_bagPrice', 0),
-                    'origin_bagPrice': result.get('origin_bagPrice', 0),
-                    'provisioning_bagPrice': result.get('provisioning_bagPrice', 0)
-                })
-            
-            return pd.DataFrame(data)
-            
-        except Exception as e:
-            print(f"Erro ao buscar provisionamentos com lookups: {e}")
+        return pipeline
+    
+    @staticmethod
+    def simple_provisionings_frame(results: List[Dict]) -> pd.DataFrame:
+        """Converte o resultado do pipeline na tabela exibida pela página"""
+        if not results:
             return pd.DataFrame()
+        
+        data = []
+        for result in results:
+            data.append({
+                'comprador': str(result.get('comprador', 'N/A')),
+                'vendedor': str(result.get('vendedor', 'N/A')),
+                'destinationOrder': str(result.get('destinationOrder', 'N/A')),
+                'originOrder': str(result.get('originOrder', 'N/A')),
+                'amount': result.get('amount', 0),
+                'grain': str(result.get('grain', 'N/A')),
+                'grain_name': result.get('grain_name', 'N/A'),
+                'destination_bagPrice': result.get('destination_bagPrice', 0),
+                'origin_bagPrice': result.get('origin_bagPrice', 0),
+                'provisioning_bagPrice': result.get('provisioning_bagPrice', 0)
+            })
+        
+        return pd.DataFrame(data)
+    
+    def build_sellers_orders_pipeline(self, match: Dict = None) -> List[Dict]:
+        """Monta pipeline com uma linha por sellersOrder, com nomes, grão e preços resolvidos"""
+        pipeline = []
+        if match:
+            pipeline.append({"$match": match})
+        
+        pipeline += [
+            # Unwind das sellersOrders
+            {"$unwind": "$sellersOrders"},
+            {"$lookup": {"from": "users", "localField": "user", "foreignField": "_id", "as": "buyer_info"}},
+            {"$lookup": {"from": "users", "localField": "sellersOrders.user", "foreignField": "_id", "as": "seller_info"}},
+            {"$lookup": {"from": "grains", "localField": "grain", "foreignField": "_id", "as": "grain_info"}},
+            {"$lookup": {"from": "orderv2", "localField": "_id", "foreignField": "_id", "as": "destination_order_info"}},
+            {"$lookup": {"from": "orderv2", "localField": "sellersOrders._id", "foreignField": "_id", "as": "origin_order_info"}},
+            {
+                "$project": {
+                    "provisioning_id": "$_id",
+                    "originOrder": "$sellersOrders._id",
+                    "buyer_name": {
+                        "$ifNull": [
+                            {"$arrayElemAt": ["$buyer_info.name", 0]},
+                            {"$arrayElemAt": ["$buyer_info.companyName", 0]}
+                        ]
+                    },
+                    "seller_name": {
+                        "$ifNull": [
+                            {"$arrayElemAt": ["$seller_info.name", 0]},
+                            {"$arrayElemAt": ["$seller_info.companyName", 0]}
+                        ]
+                    },
+                    "grain_name": {"$arrayElemAt": ["$grain_info.name", 0]},
+                    "provisioning_type": {
+                        "$cond": {
+                            "if": {"$eq": ["$isGrain", True]},
+                            "then": "🌾 Grão",
+                            "else": {
+                                "$cond": {
+                                    "if": {"$eq": ["$isFreight", True]},
+                                    "then": "🚛 Frete",
+                                    "else": "❓ Outro"
+                                }
+                            }
+                        }
+                    },
+                    "amount": "$sellersOrders.amount",
+                    "amountRemaining": "$sellersOrders.amountRemaining",
+                    "bagPrice": "$bagPrice",
+                    "destination_bagPrice": {"$arrayElemAt": ["$destination_order_info.bagPrice", 0]},
+                    "origin_bagPrice": {"$arrayElemAt": ["$origin_order_info.bagPrice", 0]},
+                    "deliveryDeadline": 1,
+                    "createdAt": 1,
+                    "updatedAt": 1
+                }
+            }
+        ]
+        
+        return pipeline
     
     def get_alertas_provisionamento(self) -> Dict[str, List]:
         """Gera alertas para provisionamentos"""
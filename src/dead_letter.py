@@ -0,0 +1,194 @@
+"""
+Fila de mensagens mortas (dead-letter) da sincronização
+Linhas que falham são gravadas em lote na tabela sync_dead_letter com a
+classe do erro e o payload, e um worker as reprocessa com backoff exponencial
+"""
+import json
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from src.pg_schema import SYNC_DEAD_LETTER_DDL, SYNC_DEAD_LETTER_INDEX_DDL
+
+logger = logging.getLogger(__name__)
+
+# Backoff: 60s, 120s, 240s, ... até MAX_ATTEMPTS; depois a linha fica estacionada
+RETRY_BASE_SECONDS = 60
+MAX_ATTEMPTS = 8
+RETRY_BATCH_LIMIT = 500
+
+@dataclass
+class DeadLetter:
+    """Linha que falhou na sincronização"""
+    entity: str
+    source_id: str
+    row_key: str
+    error_class: str
+    error_message: str
+    payload: str
+
+def _to_json(payload) -> str:
+    return json.dumps(payload, default=str, ensure_ascii=False)
+
+def from_row_failures(entity, failures: List[Tuple[tuple, Exception]]) -> List[DeadLetter]:
+    """Converte falhas de gravação (linha já transformada)"""
+    letters = []
+    for row, error in failures:
+        row_key = str(row[0])
+        letters.append(DeadLetter(
+            entity=entity.name,
+            source_id=entity.source_id(row_key),
+            row_key=row_key,
+            error_class=type(error).__name__,
+            error_message=str(error),
+            payload=_to_json(dict(zip(entity.columns, row)))
+        ))
+    return letters
+
+def from_transform_failures(entity, failures: List[Tuple[Dict, Exception]]) -> List[DeadLetter]:
+    """Converte falhas de transformação (documento bruto do MongoDB)"""
+    letters = []
+    for doc, error in failures:
+        source_id = str(doc.get('_id'))
+        letters.append(DeadLetter(
+            entity=entity.name,
+            source_id=source_id,
+            row_key=source_id,
+            error_class=type(error).__name__,
+            error_message=str(error),
+            payload=_to_json(doc)
+        ))
+    return letters
+
+class DeadLetterQueue:
+    """Registro em lote e reprocessamento das linhas com falha"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def ensure_table(self):
+        cursor = self.connection.cursor()
+        cursor.execute(SYNC_DEAD_LETTER_DDL)
+        cursor.execute(SYNC_DEAD_LETTER_INDEX_DDL)
+        cursor.close()
+
+    def record(self, letters: List[DeadLetter], cursor=None) -> int:
+        """Grava as falhas com um único INSERT (na transação do chamador)"""
+        if not letters:
+            return 0
+
+        # O mesmo INSERT não pode atualizar duas vezes a mesma pendência
+        letters = list({(letter.entity, letter.row_key): letter for letter in letters}.values())
+
+        own_cursor = cursor is None
+        cursor = cursor or self.connection.cursor()
+        placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s::jsonb)"] * len(letters))
+        params = []
+        for letter in letters:
+            params += [letter.entity, letter.source_id, letter.row_key,
+                       letter.error_class, letter.error_message, letter.payload]
+        cursor.execute(f"""
+            INSERT INTO sync_dead_letter (entity, source_id, row_key, error_class, error_message, payload)
+            VALUES {placeholders}
+            ON CONFLICT (entity, row_key) WHERE resolved_at IS NULL DO UPDATE SET
+                error_class = EXCLUDED.error_class,
+                error_message = EXCLUDED.error_message,
+                payload = EXCLUDED.payload
+        """, params)
+        if own_cursor:
+            cursor.close()
+
+        logger.warning(f"⚠️ {len(letters)} linhas enviadas para sync_dead_letter")
+        return len(letters)
+
+    def pending_count(self) -> Dict[str, int]:
+        """Quantidade de linhas pendentes por entidade"""
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT entity, COUNT(*) FROM sync_dead_letter
+            WHERE resolved_at IS NULL GROUP BY entity
+        """)
+        counts = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.close()
+        return counts
+
+    def retry_due(self, collections: Dict, limit: int = RETRY_BATCH_LIMIT) -> Dict[str, int]:
+        """Reprocessa as linhas vencidas relendo os documentos de origem.
+
+        Relê do MongoDB em vez de reaproveitar o payload para que correções
+        feitas na origem depois da falha sejam aplicadas.
+        """
+        # Import local: o pipeline grava nesta fila e a fila reusa o pipeline
+        from src.sync_pipeline import ENTITIES_BY_NAME, BatchStream, upsert_batch_with_fallback, run_after_sync
+
+        cursor = self.connection.cursor()
+        stats = {'resolved': 0, 'failed': 0}
+
+        try:
+            cursor.execute("""
+                SELECT id, entity, source_id FROM sync_dead_letter
+                WHERE resolved_at IS NULL AND next_retry_at <= CURRENT_TIMESTAMP
+                ORDER BY next_retry_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (limit,))
+
+            by_entity = defaultdict(lambda: defaultdict(list))
+            for letter_id, entity_name, source_id in cursor.fetchall():
+                by_entity[entity_name][source_id].append(letter_id)
+
+            for entity_name, letters_by_source in by_entity.items():
+                entity = ENTITIES_BY_NAME.get(entity_name)
+                if entity is None:
+                    continue
+
+                failed = {}
+                stream = BatchStream(entity.extract(collections, None, list(letters_by_source)), entity.to_row)
+                for batch in stream:
+                    _, row_failures = upsert_batch_with_fallback(cursor, entity, batch)
+                    for row, error in row_failures:
+                        failed[entity.source_id(str(row[0]))] = error
+                for doc, error in stream.transform_failures:
+                    failed[str(doc.get('_id'))] = error
+
+                # Documentos que sumiram da origem também saem da fila
+                resolved_ids = [letter_id for source_id, ids in letters_by_source.items()
+                                if source_id not in failed for letter_id in ids]
+                if resolved_ids:
+                    cursor.execute("""
+                        UPDATE sync_dead_letter SET resolved_at = CURRENT_TIMESTAMP
+                        WHERE id = ANY(%s)
+                    """, (resolved_ids,))
+
+                for source_id, error in failed.items():
+                    cursor.execute("""
+                        UPDATE sync_dead_letter SET
+                            attempts = attempts + 1,
+                            error_class = %s,
+                            error_message = %s,
+                            next_retry_at = CASE
+                                WHEN attempts + 1 >= %s THEN 'infinity'::timestamp
+                                ELSE CURRENT_TIMESTAMP + %s * POWER(2, attempts) * INTERVAL '1 second'
+                            END
+                        WHERE id = ANY(%s)
+                    """, (type(error).__name__, str(error), MAX_ATTEMPTS, RETRY_BASE_SECONDS,
+                          letters_by_source[source_id]))
+
+                stats['resolved'] += len(resolved_ids)
+                stats['failed'] += sum(len(letters_by_source[source_id]) for source_id in failed)
+
+            self.connection.commit()
+            for entity_name in by_entity:
+                if entity_name in ENTITIES_BY_NAME:
+                    run_after_sync(self.connection, ENTITIES_BY_NAME[entity_name])
+            if stats['resolved'] or stats['failed']:
+                logger.info(f"🔁 Dead-letter: {stats['resolved']} resolvidas, {stats['failed']} reagendadas")
+            return stats
+
+        except Exception:
+            self.connection.rollback()
+            raise
+
+        finally:
+            cursor.close()
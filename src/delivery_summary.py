@@ -0,0 +1,178 @@
+"""
+Resumo de entregas por contrato (coleção contract_delivery_summary)
+Um documento por ordem de destino (_id = id da ordem) com última data de
+carregamento, última data de entrega, sacas entregues e as transações dos
+tickets. Mantido pelo job de sincronização: só as ordens tocadas por tickets
+alterados desde a última execução são recalculadas. O pipeline de contratos
+junta o resumo por _id em vez de percorrer ticketv2 para cada ordem.
+Ordens que ficam sem tickets não são apagadas: viram lápides (resumo vazio,
+tombstone=True) com refreshedAt novo, para que a réplica e o snapshot dos
+contratos também zerem as entregas delas
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_COLLECTION = 'contract_delivery_summary'
+# Ordens recalculadas por agregação no modo incremental
+REFRESH_CHUNK = 500
+# Diferença (em sacas) entre o entregue nas transações e o amountOrdered da
+# ordem a partir da qual o contrato é marcado como divergente
+DIVERGENCE_TOLERANCE = float(os.getenv('FOX_DELIVERY_DIVERGENCE_TOLERANCE', 1))
+
+def build_summary_pipeline(order_ids: Optional[Iterable] = None, run_id: Optional[ObjectId] = None) -> List[Dict]:
+    """Agrega as transações de ticketv2 por ordem de destino e grava no resumo ($merge).
+
+    Sem `order_ids` recalcula todas as ordens. `run_id` marca os documentos
+    gravados nesta execução (os não marcados ficaram sem tickets).
+    """
+    if order_ids is None:
+        order_match = {"$ne": None}
+    else:
+        order_match = {"$in": list(order_ids)}
+    return [
+        # Filtro no documento usa o índice multikey; o segundo descarta as
+        # demais transações do mesmo ticket
+        {"$match": {"transactions.destinationOrder": order_match}},
+        {"$unwind": {"path": "$transactions", "includeArrayIndex": "transaction_index"}},
+        {"$match": {"transactions.destinationOrder": order_match}},
+        {"$sort": {"loadingDate": 1, "_id": 1, "transaction_index": 1}},
+        {"$group": {
+            "_id": "$transactions.destinationOrder",
+            "loadingDate": {"$max": "$loadingDate"},
+            "deliveryDate": {"$max": "$deliveredIn"},
+            # Tickets cancelados continuam na lista, mas não contam como entregues
+            "deliveredBags": {"$sum": {"$cond": [
+                {"$eq": ["$status", "Cancelado"]}, 0, {"$ifNull": ["$transactions.amount", 0]}
+            ]}},
+            "transactions": {"$push": "$transactions"},
+            "ticketIds": {"$addToSet": "$_id"},
+            "updatedAt": {"$max": "$updatedAt"}
+        }},
+        {"$addFields": {"refreshRun": run_id, "refreshedAt": "$$NOW"}},
+        {"$merge": {"into": SUMMARY_COLLECTION, "on": "_id",
+                    "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+def delivery_stages() -> List[Dict]:
+    """Estágios que derivam entregue, restante e divergência do resumo juntado em `tickets`"""
+    return [
+        {"$addFields": {
+            "deliveredBags": {"$ifNull": [{"$arrayElemAt": ["$tickets.deliveredBags", 0]}, 0]}
+        }},
+        {"$addFields": {
+            "remainingBags": {"$max": [{"$subtract": [{"$ifNull": ["$amount", 0]}, "$deliveredBags"]}, 0]},
+            "deliveryDivergence": {"$gt": [
+                {"$abs": {"$subtract": ["$amountOrderedSafe", "$deliveredBags"]}}, DIVERGENCE_TOLERANCE
+            ]}
+        }}
+    ]
+
+def changed_orders(collections: Dict, since: datetime) -> List:
+    """Ordens cujo resumo (ou lápide) foi recalculado a partir de `since`.
+
+    Usa refreshedAt e não updatedAt: a ordem que perde um ticket mantém o
+    updatedAt mais antigo dos tickets que restaram.
+    """
+    return [doc['_id'] for doc in collections[SUMMARY_COLLECTION].find({"refreshedAt": {"$gte": since}}, {"_id": 1})]
+
+def ensure_summary_indexes(collections: Dict):
+    """Índices usados pela atualização incremental (idempotente)"""
+    collections['ticketv2'].create_index("transactions.destinationOrder")
+    collections['ticketv2'].create_index("updatedAt")
+    collections[SUMMARY_COLLECTION].create_index("ticketIds")
+    collections[SUMMARY_COLLECTION].create_index("updatedAt")
+    collections[SUMMARY_COLLECTION].create_index("refreshedAt")
+
+def summary_watermark(collections: Dict):
+    """Maior updatedAt de ticket já refletido no resumo (None se vazio)"""
+    latest = collections[SUMMARY_COLLECTION].find_one(
+        {"updatedAt": {"$ne": None}}, {"updatedAt": 1}, sort=[("updatedAt", -1)]
+    )
+    return latest.get('updatedAt') if latest else None
+
+def affected_orders(collections: Dict, since) -> Tuple[List, Set]:
+    """Tickets alterados desde `since` e as ordens que eles tocam (atuais e anteriores)"""
+    ticket_ids, order_ids = [], set()
+    # $gte: tickets com o mesmo updatedAt da marca podem ter chegado depois dela
+    changed = collections['ticketv2'].find(
+        {"updatedAt": {"$gte": since}}, {"transactions.destinationOrder": 1}
+    )
+    for ticket in changed:
+        ticket_ids.append(ticket['_id'])
+        for transaction in ticket.get('transactions') or []:
+            if transaction.get('destinationOrder') is not None:
+                order_ids.add(transaction['destinationOrder'])
+    # Ordens que o ticket deixou de atender ainda listam o ticket no resumo
+    for start in range(0, len(ticket_ids), REFRESH_CHUNK):
+        previous = collections[SUMMARY_COLLECTION].find(
+            {"ticketIds": {"$in": ticket_ids[start:start + REFRESH_CHUNK]}}, {"_id": 1}
+        )
+        order_ids.update(doc['_id'] for doc in previous)
+    return ticket_ids, order_ids
+
+def _refresh_orders(collections: Dict, order_ids: Optional[List], prune: bool = True) -> None:
+    run_id = ObjectId()
+    collections['ticketv2'].aggregate(build_summary_pipeline(order_ids, run_id), allowDiskUse=True)
+    if not prune:
+        return
+    # Ordens sem nenhum ticket restante não foram regravadas nesta execução:
+    # viram lápides (o $merge seguinte com tickets substitui a lápide inteira)
+    stale = {"refreshRun": {"$ne": run_id}, "tombstone": {"$ne": True}}
+    if order_ids is not None:
+        stale["_id"] = {"$in": order_ids}
+    collections[SUMMARY_COLLECTION].update_many(stale, [{"$set": {
+        "loadingDate": None, "deliveryDate": None, "deliveredBags": 0,
+        "transactions": [], "ticketIds": [], "tombstone": True,
+        "refreshRun": run_id, "refreshedAt": "$$NOW"
+    }}])
+
+def rebuild_delivery_summary(collections: Dict) -> int:
+    """Recalcula o resumo de todas as ordens"""
+    _refresh_orders(collections, None)
+    return collections[SUMMARY_COLLECTION].estimated_document_count()
+
+def summary_ready(collections: Dict) -> bool:
+    """Resumo já calculado (ao menos uma ordem)"""
+    summary = collections.get(SUMMARY_COLLECTION)
+    return summary is not None and summary.find_one({}, {"_id": 1}) is not None
+
+def ensure_delivery_summary(collections: Dict) -> bool:
+    """Calcula o resumo se ainda estiver vazio (antes da primeira execução do job).
+
+    Sem remoção de ordens: pods que chegam juntos gravam os mesmos documentos
+    e nenhum apaga o que o outro acabou de gravar. Retorna se o resumo está
+    disponível; sem permissão de escrita fica vazio até o job rodar.
+    """
+    if summary_ready(collections):
+        return True
+    try:
+        ensure_summary_indexes(collections)
+        _refresh_orders(collections, None, prune=False)
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível calcular o resumo de entregas: {str(e)}")
+        return False
+    logger.info("📦 Resumo de entregas calculado na primeira leitura dos contratos")
+    return summary_ready(collections)
+
+def refresh_delivery_summary(collections: Dict, full: bool = False) -> int:
+    """Atualiza o resumo a partir dos tickets alterados; retorna quantas ordens foram recalculadas"""
+    ensure_summary_indexes(collections)
+    since = None if full else summary_watermark(collections)
+    if since is None:
+        rows = rebuild_delivery_summary(collections)
+        logger.info(f"📦 Resumo de entregas reconstruído: {rows} ordens")
+        return rows
+
+    _, order_ids = affected_orders(collections, since)
+    order_ids = sorted(order_ids, key=str)
+    for start in range(0, len(order_ids), REFRESH_CHUNK):
+        _refresh_orders(collections, order_ids[start:start + REFRESH_CHUNK])
+    if order_ids:
+        logger.info(f"📦 Resumo de entregas: {len(order_ids)} ordens recalculadas")
+    return len(order_ids)
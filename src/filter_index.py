@@ -0,0 +1,149 @@
+"""
+Índice de filtros das páginas (montado uma vez por versão dos dados)
+Cada dimensão vira um código categórico com a lista de linhas de cada valor;
+datas ficam ordenadas para busca binária. Qualquer combinação de filtros é
+resolvida com AND de bitmaps e um único take no DataFrame
+"""
+import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Valores com mais linhas que n / DENSE_RATIO guardam o bitmap pronto; os
+# demais guardam só as linhas (menos memória que o bitmap)
+DENSE_RATIO = 32
+
+class FilterIndex:
+    """Bitmaps por valor de cada dimensão e datas ordenadas de um DataFrame.
+
+    Os bitmaps são empacotados (np.packbits, 1 bit por linha): o AND entre
+    dimensões percorre n/8 bytes.
+    """
+
+    def __init__(self, df: pd.DataFrame, dimensions: Iterable[str] = (), dates: Iterable[str] = ()):
+        self.df = df
+        self.size = len(df)
+        self._codes: Dict[str, np.ndarray] = {}
+        self._values: Dict[str, list] = {}
+        self._lookup: Dict[str, Dict[Any, int]] = {}
+        self._postings: Dict[str, List[Tuple[bool, np.ndarray]]] = {}
+        self._dates: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+        for column in dimensions:
+            if column in df.columns:
+                self._index_dimension(column)
+        for column in dates:
+            if column in df.columns:
+                self._index_dates(column)
+
+    def _index_dimension(self, column: str):
+        # Código por linha (-1 = nulo) e valores distintos em ordem
+        codes, uniques = pd.factorize(self.df[column], sort=True)
+        self._codes[column] = codes
+        self._values[column] = list(uniques)
+        self._lookup[column] = {value: code for code, value in enumerate(self._values[column])}
+
+        # Linhas de cada valor numa única ordenação estável dos códigos
+        order = np.argsort(codes, kind='stable').astype(np.int64)
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        postings = []
+        for code in range(len(uniques)):
+            rows = order[bounds[code]:bounds[code + 1]]
+            if len(rows) * DENSE_RATIO > self.size:
+                postings.append((True, self._pack(rows)))
+            else:
+                postings.append((False, rows))
+        self._postings[column] = postings
+
+    def _index_dates(self, column: str):
+        dates = pd.to_datetime(self.df[column], errors='coerce')
+        # Mesmo dia de calendário que `.dt.date` (horário local, sem fuso)
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        values = dates.to_numpy(dtype='datetime64[ns]')
+        rows = np.flatnonzero(~np.isnat(values))
+        order = rows[np.argsort(values[rows], kind='stable')]
+        self._dates[column] = (values[order], order)
+
+    def _pack(self, rows: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask)
+
+    def codes(self, column: str) -> np.ndarray:
+        """Código categórico de cada linha na dimensão (-1 = nulo)"""
+        return self._codes[column]
+
+    def values(self, column: str) -> list:
+        """Valores distintos da dimensão, ordenados (opções dos seletores)"""
+        return list(self._values.get(column, []))
+
+    def _value_bitmap(self, column: str, selected) -> np.ndarray:
+        """OR dos bitmaps dos valores escolhidos"""
+        if isinstance(selected, (list, tuple, set, frozenset)):
+            selected = list(selected)
+        else:
+            selected = [selected]
+        bitmap = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        sparse = []
+        lookup, postings = self._lookup[column], self._postings[column]
+        for value in selected:
+            code = lookup.get(value)
+            if code is None:
+                continue
+            dense, data = postings[code]
+            if dense:
+                bitmap |= data
+            else:
+                sparse.append(data)
+        if sparse:
+            rows = np.concatenate(sparse)
+            np.bitwise_or.at(bitmap, rows >> 3, (128 >> (rows & 7)).astype(np.uint8))
+        return bitmap
+
+    def _date_bitmap(self, column: str, start: Optional[datetime.date], end: Optional[datetime.date]) -> np.ndarray:
+        """Linhas com data (dia) entre start e end, inclusive, por busca binária"""
+        values, order = self._dates[column]
+        lo = 0 if start is None else np.searchsorted(values, np.datetime64(pd.Timestamp(start).normalize()), 'left')
+        hi = len(values) if end is None else np.searchsorted(
+            values, np.datetime64(pd.Timestamp(end).normalize() + pd.Timedelta(days=1)), 'left'
+        )
+        return self._pack(order[lo:hi])
+
+    def rows(self, equals: Optional[Dict[str, Any]] = None,
+             date_ranges: Optional[Dict[str, Tuple[Any, Any]]] = None,
+             mask: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Posições das linhas que atendem a todos os filtros; None se nenhum filtro foi aplicado.
+
+        `equals` mapeia coluna -> valor ou lista de valores (lista vazia ou
+        None ignora o filtro); `date_ranges` mapeia coluna -> (início, fim);
+        `mask` é um filtro booleano extra já calculado por linha.
+        """
+        bitmaps = []
+        for column, selected in (equals or {}).items():
+            if selected is None or column not in self._postings:
+                continue
+            if isinstance(selected, (list, tuple, set, frozenset)) and not selected:
+                continue
+            bitmaps.append(self._value_bitmap(column, selected))
+        for column, bounds in (date_ranges or {}).items():
+            if bounds is not None and column in self._dates:
+                bitmaps.append(self._date_bitmap(column, *bounds))
+        if mask is not None:
+            bitmaps.append(np.packbits(np.asarray(mask, dtype=bool)))
+        if not bitmaps:
+            return None
+
+        # Bitmaps são sempre novos aqui: o AND pode ser feito no lugar
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result &= bitmap
+        return np.flatnonzero(np.unpackbits(result, count=self.size))
+
+    def filter(self, equals: Optional[Dict[str, Any]] = None,
+               date_ranges: Optional[Dict[str, Tuple[Any, Any]]] = None,
+               mask: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """DataFrame filtrado com um único take (sem filtros, o próprio DataFrame)"""
+        rows = self.rows(equals, date_ranges, mask)
+        return self.df if rows is None else self.df.take(rows)
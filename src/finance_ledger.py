@@ -0,0 +1,184 @@
+"""
+Motor do relatório Financeiro (DRE, EBITDA e fluxo de caixa)
+Parte do razão mensal (mês × categoria × item, com entradas e saídas) vindo do
+agregado incremental no PostgreSQL, do snapshot ou dos próprios lançamentos, e
+calcula todas as linhas do DRE por mês e item num único agrupamento
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.pg_rollups import UNDATED_DAY
+
+# Linhas do DRE simplificado, na ordem de exibição
+DRE_ORDER = [
+    'RECEITA OPERACIONAL',
+    'CUSTO OPERACIONAL',
+    'DESPESAS ADMINISTRATIVAS',
+    'DESPESAS NAO OPERACIONAL',
+    'NAO OPERACIONAL',
+    'IMPOSTOS',
+    'FINANCIAMENTO',
+    'INVESTIMENTOS',
+    'OUTROS',
+    'CAIXA TOTAL'
+]
+
+# Trechos procurados no nome da categoria (seções e linhas do DRE por categoria)
+CATEGORY_TOKENS = ['OPERACIONAL'] + [
+    line for line in DRE_ORDER if line not in ('RECEITA OPERACIONAL', 'CUSTO OPERACIONAL', 'CAIXA TOTAL')
+]
+
+# Colunas do razão mensal (as mesmas do agregado finances_monthly_ledger)
+LEDGER_KEYS = ['month', 'category_name', 'category_item']
+LEDGER_MEASURES = ['inflow', 'outflow', 'inflow_entries', 'outflow_entries']
+
+def classify_categories(categories: pd.Series) -> pd.DataFrame:
+    """Uma coluna booleana por trecho de CATEGORY_TOKENS.
+
+    A busca roda uma vez por nome distinto de categoria; cada linha só
+    consulta o código do seu nome.
+    """
+    codes, names = pd.factorize(categories)
+    upper = pd.Series(names, dtype=object).astype(str).str.upper()
+    flags = {}
+    for token in CATEGORY_TOKENS:
+        # Posição extra (nome nulo, código -1) sempre falsa
+        by_name = np.append(upper.str.contains(token, regex=False).to_numpy(dtype=bool), False)
+        flags[token] = by_name[codes]
+    return pd.DataFrame(flags, index=categories.index)
+
+def empty_ledger() -> pd.DataFrame:
+    """Razão sem linhas, com os mesmos tipos de um razão preenchido (month datetime64)"""
+    ledger = pd.DataFrame(columns=LEDGER_KEYS + LEDGER_MEASURES)
+    return ledger.astype({'month': 'datetime64[ns]', **{measure: float for measure in LEDGER_MEASURES}})
+
+def build_ledger(df: pd.DataFrame) -> pd.DataFrame:
+    """Razão mensal a partir de lançamentos (date, category_name, category_item, value).
+
+    Também aceita linhas já somadas por mês e sinal (motor analítico): cada
+    linha conta como um lançamento do seu sinal.
+    """
+    if df.empty:
+        return empty_ledger()
+    value = pd.to_numeric(df['value'], errors='coerce')
+    positive = (value > 0).to_numpy()
+    ledger = pd.DataFrame({
+        'month': pd.to_datetime(df['date'], errors='coerce').dt.to_period('M').dt.to_timestamp(),
+        'category_name': df['category_name'],
+        'category_item': df['category_item'],
+        'inflow': value.where(positive, 0.0),
+        'outflow': value.where(~positive, 0.0).fillna(0.0),
+        'inflow_entries': positive.astype(np.int64),
+        'outflow_entries': (~positive).astype(np.int64)
+    })
+    # Mês, categoria ou item nulos continuam no razão (contam no DRE)
+    return ledger.groupby(LEDGER_KEYS, dropna=False, sort=False, as_index=False).sum()
+
+def ledger_from_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    """Razão a partir das linhas do agregado no PostgreSQL (coluna day = primeiro dia do mês).
+
+    Lançamentos sem data (UNDATED_DAY) voltam a ter mês nulo, como em build_ledger.
+    """
+    if df.empty:
+        return empty_ledger()
+    ledger = df.rename(columns={'day': 'month'})
+    month = pd.to_datetime(ledger['month'])
+    ledger['month'] = month.mask(month == pd.Timestamp(UNDATED_DAY))
+    ledger[LEDGER_MEASURES] = ledger[LEDGER_MEASURES].astype(float)
+    return ledger[LEDGER_KEYS + LEDGER_MEASURES]
+
+def _line_cube(ledger: pd.DataFrame) -> pd.Series:
+    """Valor por (linha, mês, item) de todas as linhas do DRE e do caixa num único agrupamento"""
+    flags = classify_categories(ledger['category_name'])
+    inflow = ledger['inflow'].to_numpy(dtype=float)
+    outflow = ledger['outflow'].to_numpy(dtype=float)
+    net = inflow + outflow
+    every = np.ones(len(ledger), dtype=bool)
+    oper = flags['OPERACIONAL'].to_numpy()
+
+    # Pertinência e valor de cada linha do razão em cada linha do relatório
+    lines = {
+        # Operacional: lançamentos positivos são receita, os demais custo
+        'RECEITA OPERACIONAL': (oper & (ledger['inflow_entries'].to_numpy() > 0), inflow),
+        'CUSTO OPERACIONAL': (oper & (ledger['outflow_entries'].to_numpy() > 0), outflow),
+        'CAIXA TOTAL': (every, net),
+        # Só para o fluxo de caixa
+        'ENTRADAS': (every, inflow),
+        'SAIDAS': (every, outflow)
+    }
+    for line in CATEGORY_TOKENS[1:]:
+        lines[line] = (flags[line].to_numpy(), net)
+
+    names = np.array(list(lines), dtype=object)
+    member = np.column_stack([mask for mask, _ in lines.values()])
+    amount = np.column_stack([values for _, values in lines.values()])
+    rows, columns = np.nonzero(member)
+    long = pd.DataFrame({
+        'line': names[columns],
+        'month': ledger['month'].to_numpy()[rows],
+        'category_item': ledger['category_item'].to_numpy()[rows],
+        'value': amount[rows, columns]
+    })
+    return long.groupby(['line', 'month', 'category_item'], dropna=False, sort=True)['value'].sum()
+
+def _line_frame(cube: pd.Series, line: str) -> pd.Series:
+    if line not in cube.index.get_level_values('line'):
+        return cube.iloc[:0].droplevel('line')
+    return cube.xs(line, level='line')
+
+def _monthly(values: pd.Series) -> pd.Series:
+    """Soma por mês (meses nulos ficam fora), indexada por período mensal"""
+    values = values[values.index.get_level_values('month').notna()]
+    by_month = values.groupby(level='month').sum()
+    by_month.index = pd.PeriodIndex(by_month.index, freq='M', name='month_year')
+    return by_month
+
+def _pivot(cube: pd.Series, line: str) -> pd.DataFrame:
+    """Item × mês de uma linha (itens e meses nulos ficam fora, como no pivot_table)"""
+    values = _line_frame(cube, line)
+    index = values.index
+    values = values[index.get_level_values('month').notna() & index.get_level_values('category_item').notna()]
+    if values.empty:
+        return pd.DataFrame()
+    pivot = values.unstack('month', fill_value=0)
+    pivot.columns = pd.PeriodIndex(pivot.columns, freq='M', name='month_year')
+    return pivot
+
+def ebitda(dre: Dict[str, float]) -> Tuple[float, float]:
+    """EBITDA (receitas e custos/despesas, negativos) e seu percentual sobre a receita operacional"""
+    value = (
+        dre.get('RECEITA OPERACIONAL', 0)
+        + dre.get('CUSTO OPERACIONAL', 0)
+        + dre.get('DESPESAS ADMINISTRATIVAS', 0)
+        + dre.get('DESPESAS NAO OPERACIONAL', 0)
+    )
+    revenue = dre.get('RECEITA OPERACIONAL', 1)
+    return value, (value / revenue * 100) if revenue != 0 else 0
+
+def compute_report(ledger: pd.DataFrame) -> dict:
+    """Fluxos mensais por categoria, DRE, EBITDA e fluxo de caixa a partir do razão mensal"""
+    cube = _line_cube(ledger)
+    totals = cube.groupby(level='line').sum()
+    dre = {line: totals.get(line, 0) for line in DRE_ORDER}
+
+    cash = pd.DataFrame({
+        'Entradas': _monthly(_line_frame(cube, 'ENTRADAS')),
+        'Saídas': _monthly(_line_frame(cube, 'SAIDAS'))
+    }).fillna(0.0)
+    cash['Saldo'] = cash['Entradas'] + cash['Saídas']
+    cash['Saldo Acumulado'] = cash['Saldo'].cumsum()
+
+    return {
+        'sections': [
+            ('RECEITA OPERACIONAL', _pivot(cube, 'RECEITA OPERACIONAL')),
+            ('CUSTO OPERACIONAL', _pivot(cube, 'CUSTO OPERACIONAL')),
+            ('FINANCIAMENTO', _pivot(cube, 'FINANCIAMENTO')),
+            ('IMPOSTOS', _pivot(cube, 'IMPOSTOS')),
+            ('CAIXA TOTAL', _monthly(_line_frame(cube, 'CAIXA TOTAL')).to_frame('value').T)
+        ],
+        'dre': dre,
+        'ebitda': ebitda(dre),
+        'cash_flow': cash
+    }
@@ -0,0 +1,149 @@
+"""
+Particionamento mensal da tabela cargas por loading_date
+Cria as partições sob demanda, migra a tabela antiga não particionada
+e destaca (arquiva ou remove) os meses que saíram da retenção
+"""
+import logging
+from datetime import date, datetime
+from typing import Iterable, List, Optional
+
+from src.pg_schema import (
+    CARGAS_TABLE_DDL, CARGAS_MIGRATIONS, CARGAS_DEFAULT_PARTITION_DDL,
+    CARGAS_INDEXES, CARGAS_COPY_COLUMNS, CARGAS_LEGACY_KEYS_SQL
+)
+
+logger = logging.getLogger(__name__)
+
+# Meses futuros criados antecipadamente (cargas agendadas)
+PARTITION_MONTHS_AHEAD = 3
+
+# Partições destacadas e mantidas para consulta ficam neste schema
+ARCHIVE_SCHEMA = 'archive'
+
+def month_start(value) -> Optional[date]:
+    """Primeiro dia do mês de uma data (None quando ausente)"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.replace(day=1)
+
+def add_months(month: date, months: int) -> date:
+    """Soma meses a um primeiro dia de mês"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def months_between(start, end) -> List[date]:
+    """Meses de start até end, inclusive"""
+    month, last = month_start(start), month_start(end)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+def partition_name(table: str, month: Optional[date]) -> str:
+    """Nome da partição do mês (ou a partição default para datas nulas)"""
+    if month is None:
+        return f"{table}_default"
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+def partition_for(table: str, value) -> str:
+    """Partição que recebe uma linha com este loading_date"""
+    return partition_name(table, month_start(value))
+
+def table_kind(cursor, table: str) -> Optional[str]:
+    """'p' para particionada, 'r' para tabela comum, None se não existir"""
+    cursor.execute("""
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema() AND c.relname = %s
+    """, (table,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def ensure_month_partitions(cursor, table: str, months: Iterable[date]):
+    """Cria as partições mensais que ainda não existem"""
+    for month in sorted(set(months)):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+
+def list_partitions(cursor, table: str) -> List[str]:
+    """Partições anexadas à tabela, em ordem de nome (cronológica)"""
+    cursor.execute("""
+        SELECT child.relname FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        JOIN pg_namespace n ON n.oid = parent.relnamespace
+        WHERE n.nspname = current_schema() AND parent.relname = %s
+        ORDER BY child.relname
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+def _migrate_legacy_cargas(cursor, start_date):
+    """Converte a tabela cargas comum em particionada, copiando as linhas"""
+    logger.info("📋 Migrando tabela 'cargas' para particionamento mensal...")
+    for migration in CARGAS_MIGRATIONS:
+        cursor.execute(migration)
+    cursor.execute("ALTER TABLE cargas RENAME TO cargas_legacy")
+
+    cursor.execute(CARGAS_TABLE_DDL)
+    cursor.execute(CARGAS_DEFAULT_PARTITION_DDL)
+
+    cursor.execute("SELECT MIN(loading_date), MAX(loading_date) FROM cargas_legacy")
+    first, last = cursor.fetchone()
+    if first and last:
+        ensure_month_partitions(cursor, 'cargas', months_between(min(first, start_date), last))
+
+    # Chaves antigas (só o _id) convivendo com as compostas duplicariam os
+    # totais: se o pipeline já gravou na tabela, as antigas ficam para trás
+    columns = ", ".join(CARGAS_COPY_COLUMNS)
+    cursor.execute(f"""
+        INSERT INTO cargas ({columns}) SELECT {columns} FROM cargas_legacy
+        WHERE NOT ({CARGAS_LEGACY_KEYS_SQL})
+           OR NOT EXISTS (SELECT 1 FROM cargas_legacy WHERE NOT ({CARGAS_LEGACY_KEYS_SQL}))
+    """)
+    cursor.execute("DROP TABLE cargas_legacy")
+
+def ensure_cargas_partitioned(cursor, start_date, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """Garante a tabela cargas particionada, com índices e os meses do período"""
+    if table_kind(cursor, 'cargas') == 'r':
+        _migrate_legacy_cargas(cursor, start_date)
+    else:
+        cursor.execute(CARGAS_TABLE_DDL)
+        cursor.execute(CARGAS_DEFAULT_PARTITION_DDL)
+
+    for migration in CARGAS_MIGRATIONS:
+        cursor.execute(migration)
+    for index in CARGAS_INDEXES:
+        cursor.execute(index)
+
+    last_month = add_months(month_start(date.today()), months_ahead)
+    ensure_month_partitions(cursor, 'cargas', months_between(start_date, last_month))
+
+def detach_partitions_before(cursor, table: str, cutoff, archive: bool = True) -> List[str]:
+    """Destaca os meses anteriores a cutoff.
+
+    Com archive=True a partição vai para o schema de arquivo e continua
+    consultável; com archive=False é removida. Retorna as partições afetadas.
+    """
+    cutoff_name = partition_name(table, month_start(cutoff))
+    monthly_prefix = f"{table}_y"
+    old = [name for name in list_partitions(cursor, table)
+           if name.startswith(monthly_prefix) and name < cutoff_name]
+
+    if archive and old:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+    for name in old:
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        if archive:
+            cursor.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+        else:
+            cursor.execute(f"DROP TABLE {name}")
+
+    if old:
+        action = "arquivadas" if archive else "removidas"
+        logger.info(f"🗄️ {len(old)} partições de {table} {action}: {', '.join(old)}")
+    return old
@@ -0,0 +1,270 @@
+"""
+Agregados pré-calculados (cubo de KPIs) no PostgreSQL
+Uma tabela por fato com medidas aditivas por dia (ou mês) e dimensões (grão,
+contraparte, categoria). Gatilhos nas tabelas de fatos marcam os dias alterados
+e só esses dias (ou os meses que os contêm) são recalculados após cada
+sincronização.
+Cobre os totais da página de Cargas (réplica PostgreSQL) e o razão mensal do
+Financeiro. Os cards dos Contratos saem do recorte filtrado na própria página
+(busca por trecho do cliente, intervalos de datas) e são agregados no motor
+analítico; get_metricas_provisionamento (um único $group no MongoDB) só é
+usado pelos apps legados (app_old.py, app_completo.py)
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from src.pg_partitions import table_kind
+from src.pg_schema import ROLLUP_DIRTY_DAYS_DDL
+
+@dataclass
+class RollupSpec:
+    """Agregado diário de uma tabela de fatos.
+
+    dimensions: coluna -> (expressão sem nulos, tipo)
+    measures: coluna -> (expressão agregada, reagregação, tipo)
+    period: 'day' ou 'month' (a coluna day guarda o primeiro dia do mês)
+    undated_day: dia que recebe as linhas sem data (None: ficam fora do agregado)
+    """
+    name: str
+    source: str
+    day_column: str
+    dimensions: Dict[str, Tuple[str, str]]
+    measures: Dict[str, Tuple[str, str, str]]
+    where: str = ''
+    period: str = 'day'
+    undated_day: Optional[date] = None
+
+TEXT = "VARCHAR(255) NOT NULL DEFAULT ''"
+AMOUNT = "NUMERIC(18,2) NOT NULL DEFAULT 0"
+COUNT = "BIGINT NOT NULL DEFAULT 0"
+
+# Dia fictício das linhas sem data nos agregados que as mantêm (ex.: lançamentos
+# com data inválida continuam nos totais do DRE, como nos lançamentos do MongoDB)
+UNDATED_DAY = date(1900, 1, 1)
+
+ROLLUPS = {
+    'cargas': RollupSpec(
+        name='cargas_daily_rollup',
+        source='cargas',
+        day_column='loading_date',
+        dimensions={
+            'grain_name': ("COALESCE(grain_name, '')", TEXT),
+            'buyer_name': ("COALESCE(buyer_name, '')", TEXT),
+            'seller_name': ("COALESCE(seller_name, '')", TEXT),
+            'contract_type': ("COALESCE(contract_type, '')", TEXT),
+            'status': ("COALESCE(status, '')", TEXT),
+            'paid': ("COALESCE(paid, FALSE)", "BOOLEAN NOT NULL DEFAULT FALSE")
+        },
+        measures={
+            'loads': ("COUNT(*)", 'SUM', COUNT),
+            'bags': ("COALESCE(SUM(amount), 0)", 'SUM', AMOUNT),
+            'revenue': ("COALESCE(SUM(receita), 0)", 'SUM', AMOUNT),
+            'cost': ("COALESCE(SUM(custo), 0)", 'SUM', AMOUNT),
+            'freight': ("COALESCE(SUM(frete), 0)", 'SUM', AMOUNT),
+            'gross_profit': ("COALESCE(SUM(lucro_bruto), 0)", 'SUM', AMOUNT)
+        }
+    ),
+    # Razão mensal do Financeiro: entradas e saídas separadas por categoria e item
+    'finances_monthly': RollupSpec(
+        name='finances_monthly_ledger',
+        source='finances',
+        day_column='entry_date',
+        period='month',
+        dimensions={
+            'category_name': ("COALESCE(category_name, '')", TEXT),
+            'category_item': ("COALESCE(category_item, '')", TEXT)
+        },
+        measures={
+            'inflow': ("COALESCE(SUM(value) FILTER (WHERE value > 0), 0)", 'SUM', AMOUNT),
+            'outflow': ("COALESCE(SUM(value) FILTER (WHERE NOT value > 0), 0)", 'SUM', AMOUNT),
+            'inflow_entries': ("COUNT(*) FILTER (WHERE value > 0)", 'SUM', COUNT),
+            'outflow_entries': ("COUNT(*) FILTER (WHERE value IS NULL OR value <= 0)", 'SUM', COUNT)
+        },
+        where="NOT COALESCE(is_ignored, FALSE) AND NOT COALESCE(is_futuro, FALSE)",
+        undated_day=UNDATED_DAY
+    )
+}
+
+ROLLUP_MEASURES = list(ROLLUPS['cargas'].measures)
+
+# Agregados de versões anteriores que nenhuma página lia (contratos,
+# provisionamentos e financeiro diário); removidos por drop_retired_rollups
+RETIRED_ROLLUPS = ['contratos_daily_rollup', 'provisionings_daily_rollup', 'finances_daily_rollup']
+
+def _table_ddl(spec: RollupSpec) -> str:
+    columns = ["day DATE NOT NULL"]
+    columns += [f"{name} {column_type}" for name, (_, column_type) in spec.dimensions.items()]
+    columns += [f"{name} {column_type}" for name, (_, _, column_type) in spec.measures.items()]
+    key = ", ".join(["day"] + list(spec.dimensions))
+    return f"CREATE TABLE IF NOT EXISTS {spec.name} ({', '.join(columns)}, PRIMARY KEY ({key}))"
+
+def _undated_sql(spec: RollupSpec, expression: str) -> str:
+    """Expressão de dia com as linhas sem data no dia fictício do agregado"""
+    if spec.undated_day is None:
+        return expression
+    return f"COALESCE({expression}, DATE '{spec.undated_day.isoformat()}')"
+
+def _trigger_function_ddl(spec: RollupSpec) -> str:
+    """Marca o dia antigo e o novo de cada linha alterada na tabela de fatos"""
+    def mark(row):
+        day = _undated_sql(spec, f"{row}.{spec.day_column}::date")
+        insert = f"INSERT INTO rollup_dirty_days (rollup, day) VALUES ('{spec.name}', {day}) ON CONFLICT DO NOTHING;"
+        if spec.undated_day is None:
+            return f"IF {row}.{spec.day_column} IS NOT NULL THEN {insert} END IF;"
+        return insert
+
+    return f"""
+        CREATE OR REPLACE FUNCTION {spec.name}_mark_days() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                {mark('OLD')}
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                {mark('NEW')}
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """
+
+def _period_sql(spec: RollupSpec) -> str:
+    """Dia (ou primeiro dia do mês) de uma linha com data da tabela de fatos"""
+    if spec.period == 'month':
+        return f"date_trunc('month', {spec.day_column})::date"
+    return f"{spec.day_column}::date"
+
+def _bucket_sql(spec: RollupSpec) -> str:
+    """Dia do agregado de uma linha da tabela de fatos (inclusive sem data)"""
+    return _undated_sql(spec, _period_sql(spec))
+
+def _bucket(spec: RollupSpec, day):
+    return day.replace(day=1) if spec.period == 'month' else day
+
+def _bucket_end(spec: RollupSpec, bucket):
+    """Primeiro dia depois do período que começa em `bucket`"""
+    if spec.period == 'month':
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return bucket + timedelta(days=1)
+
+def _select_sql(spec: RollupSpec, extra_where: str = '') -> str:
+    expressions = [_bucket_sql(spec)]
+    expressions += [expression for expression, _ in spec.dimensions.values()]
+    expressions += [expression for expression, _, _ in spec.measures.values()]
+    conditions = [f"{spec.day_column} IS NOT NULL"] if spec.undated_day is None else []
+    conditions += [c for c in (spec.where, extra_where) if c]
+    group_by = ", ".join(str(i) for i in range(1, len(spec.dimensions) + 2))
+    columns = ", ".join(["day"] + list(spec.dimensions) + list(spec.measures))
+    return (
+        f"INSERT INTO {spec.name} ({columns}) "
+        f"SELECT {', '.join(expressions)} FROM {spec.source}"
+        f"{' WHERE ' + ' AND '.join(conditions) if conditions else ''} GROUP BY {group_by}"
+    )
+
+def ensure_rollup(cursor, key: str):
+    """Cria o agregado, a tabela de dias pendentes e o gatilho na tabela de fatos"""
+    spec = ROLLUPS[key]
+    cursor.execute(ROLLUP_DIRTY_DAYS_DDL)
+
+    # Versão anterior do agregado de cargas era uma view materializada
+    kind = table_kind(cursor, spec.name)
+    if kind == 'm':
+        cursor.execute(f"DROP MATERIALIZED VIEW {spec.name}")
+        kind = None
+    cursor.execute(_table_ddl(spec))
+
+    cursor.execute(
+        "SELECT 1 FROM pg_trigger WHERE tgname = %s AND tgrelid = to_regclass(%s)",
+        (f"{spec.name}_mark_days", spec.source)
+    )
+    missing_trigger = cursor.fetchone() is None
+    # Sempre: bancos existentes recebem a versão atual da função
+    cursor.execute(_trigger_function_ddl(spec))
+    if missing_trigger:
+        cursor.execute(
+            f"CREATE TRIGGER {spec.name}_mark_days AFTER INSERT OR UPDATE OR DELETE ON {spec.source} "
+            f"FOR EACH ROW EXECUTE FUNCTION {spec.name}_mark_days()"
+        )
+
+    if kind is None:
+        rebuild_rollup(cursor, key)
+    elif spec.undated_day is not None:
+        # Agregados criados antes do dia fictício: a próxima atualização o preenche
+        cursor.execute(
+            "INSERT INTO rollup_dirty_days (rollup, day) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+            (spec.name, spec.undated_day)
+        )
+
+def drop_retired_rollups(cursor):
+    """Remove tabelas, gatilhos e dias pendentes dos agregados aposentados (idempotente)"""
+    for name in RETIRED_ROLLUPS:
+        # CASCADE leva junto o gatilho da tabela de fatos
+        cursor.execute(f"DROP FUNCTION IF EXISTS {name}_mark_days() CASCADE")
+        cursor.execute(f"DROP TABLE IF EXISTS {name}")
+    cursor.execute("DELETE FROM rollup_dirty_days WHERE rollup = ANY(%s)", (RETIRED_ROLLUPS,))
+
+def rebuild_rollup(cursor, key: str):
+    """Recalcula o agregado inteiro (criação ou correção manual)"""
+    spec = ROLLUPS[key]
+    cursor.execute(f"DELETE FROM {spec.name}")
+    cursor.execute(_select_sql(spec))
+    cursor.execute("DELETE FROM rollup_dirty_days WHERE rollup = %s", (spec.name,))
+
+def refresh_rollup(cursor, key: str) -> int:
+    """Recalcula só os dias (ou meses) marcados desde a última atualização; retorna quantos"""
+    spec = ROLLUPS[key]
+    cursor.execute("DELETE FROM rollup_dirty_days WHERE rollup = %s RETURNING day", (spec.name,))
+    days = sorted({_bucket(spec, row[0]) for row in cursor.fetchall()})
+    if not days:
+        return 0
+
+    cursor.execute(f"DELETE FROM {spec.name} WHERE day = ANY(%s)", (days,))
+    # Intervalo explícito permite podar partições; a lista escolhe os dias
+    dated = [day for day in days if day != spec.undated_day]
+    clauses, params = [], []
+    if dated:
+        clauses.append(f"{spec.day_column} >= %s AND {spec.day_column} < %s AND {_period_sql(spec)} = ANY(%s)")
+        params += [dated[0], _bucket_end(spec, dated[-1]), dated]
+    if len(dated) < len(days):
+        clauses.append(f"{spec.day_column} IS NULL")
+    where = clauses[0] if len(clauses) == 1 else "(" + " OR ".join(f"({clause})" for clause in clauses) + ")"
+    cursor.execute(_select_sql(spec, where), tuple(params))
+    return len(days)
+
+def discard_rollup_before(cursor, key: str, cutoff):
+    """Remove dias anteriores ao corte (partições destacadas não disparam gatilhos)"""
+    spec = ROLLUPS[key]
+    cursor.execute(f"DELETE FROM {spec.name} WHERE day < %s", (cutoff,))
+
+def _slice_where(filters: Optional[Dict], start, end) -> Tuple[str, list]:
+    clauses, params = [], []
+    if start:
+        clauses.append("day >= %s")
+        params.append(start)
+    if end:
+        clauses.append("day <= %s")
+        params.append(end)
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            clauses.append(f"{column} = ANY(%s)")
+            params.append(list(value))
+        else:
+            clauses.append(f"{column} = %s")
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def build_slice_query(key: str, group_by: List[str] = (), filters: Optional[Dict] = None,
+                      start=None, end=None) -> Tuple[str, list]:
+    """Reagrega as medidas do cubo numa fatia (filtros por dimensão e período)"""
+    spec = ROLLUPS[key]
+    for column in list(group_by) + list(filters or {}):
+        if column != 'day' and column not in spec.dimensions:
+            raise ValueError(f"Dimensão desconhecida em {spec.name}: {column}")
+
+    where, params = _slice_where(filters, start, end)
+    measures = [f"{aggregate}({name}) AS {name}" for name, (_, aggregate, _) in spec.measures.items()]
+    select = ", ".join(list(group_by) + measures)
+    sql = f"SELECT {select} FROM {spec.name}{where}"
+    if group_by:
+        sql += f" GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}"
+    return sql, params
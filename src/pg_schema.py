@@ -0,0 +1,191 @@
+"""
+Esquema das tabelas da réplica PostgreSQL
+Usado pelo PostgreSQLService e pelo pipeline de sincronização
+"""
+
+# Particionada por mês de loading_date (partições criadas por src.pg_partitions).
+# Chaves únicas em tabela particionada precisam incluir a coluna de partição,
+# por isso a unicidade é (ticket_id, loading_date) e não ticket_id sozinho.
+CARGAS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS cargas (
+        id SERIAL,
+        ticket_id VARCHAR(255) NOT NULL,
+        ticket_number BIGINT,
+        amount DECIMAL(15,2) DEFAULT 0,
+        loading_date TIMESTAMP,
+        status VARCHAR(100) DEFAULT '',
+        paid BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        buyer_name VARCHAR(255) DEFAULT '',
+        seller_name VARCHAR(255) DEFAULT '',
+        driver_name VARCHAR(255) DEFAULT '',
+        grain_name VARCHAR(255) DEFAULT '',
+        contract_type VARCHAR(100) DEFAULT '',
+        provisioning_status VARCHAR(100) DEFAULT '',
+        origin_order VARCHAR(64),
+        destination_order VARCHAR(64),
+        receita DECIMAL(15,2) DEFAULT 0,
+        custo DECIMAL(15,2) DEFAULT 0,
+        frete DECIMAL(15,2) DEFAULT 0,
+        lucro_bruto DECIMAL(15,2) DEFAULT 0,
+        source_updated_at TIMESTAMP,
+        synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT cargas_ticket_loading_key UNIQUE (ticket_id, loading_date)
+    ) PARTITION BY RANGE (loading_date)
+"""
+
+# Recebe apenas cargas sem loading_date: os meses são criados antes de cada carga
+CARGAS_DEFAULT_PARTITION_DDL = """
+    CREATE TABLE IF NOT EXISTS cargas_default PARTITION OF cargas DEFAULT
+"""
+
+# Criados na tabela mãe e replicados em cada partição (índices locais)
+CARGAS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS cargas_loading_date_idx ON cargas (loading_date)",
+    "CREATE INDEX IF NOT EXISTS cargas_ticket_id_idx ON cargas (ticket_id)",
+    "CREATE INDEX IF NOT EXISTS cargas_buyer_name_idx ON cargas (buyer_name)",
+    "CREATE INDEX IF NOT EXISTS cargas_seller_name_idx ON cargas (seller_name)",
+    "CREATE INDEX IF NOT EXISTS cargas_grain_name_idx ON cargas (grain_name)",
+    "CREATE INDEX IF NOT EXISTS cargas_status_paid_idx ON cargas (status, paid)",
+    # Busca de ticket: faixa pelo número, prefixo pelo texto
+    "CREATE INDEX IF NOT EXISTS cargas_ticket_number_idx ON cargas (ticket_number)",
+    "CREATE INDEX IF NOT EXISTS cargas_ticket_text_idx ON cargas ((CAST(ticket_number AS TEXT)) text_pattern_ops)"
+]
+
+# Colunas copiadas da tabela não particionada na migração
+CARGAS_COPY_COLUMNS = [
+    'ticket_id', 'ticket_number', 'amount', 'loading_date', 'status', 'paid', 'created_at',
+    'buyer_name', 'seller_name', 'driver_name', 'grain_name', 'contract_type',
+    'provisioning_status', 'origin_order', 'destination_order',
+    'receita', 'custo', 'frete', 'lucro_bruto', 'source_updated_at', 'synced_at'
+]
+
+# Linhas gravadas antes do pipeline por entidade: a chave era só o _id do
+# ticket, hoje é '<_id>:<índice da transação>'
+CARGAS_LEGACY_KEYS_SQL = "ticket_id NOT LIKE '%:%'"
+
+# Colunas acrescentadas depois da primeira versão da tabela cargas
+CARGAS_MIGRATIONS = [
+    "ALTER TABLE cargas ADD COLUMN IF NOT EXISTS ticket_number BIGINT",
+    "ALTER TABLE cargas ADD COLUMN IF NOT EXISTS driver_name VARCHAR(255) DEFAULT ''",
+    "ALTER TABLE cargas ADD COLUMN IF NOT EXISTS provisioning_status VARCHAR(100) DEFAULT ''",
+    "ALTER TABLE cargas ADD COLUMN IF NOT EXISTS origin_order VARCHAR(64)",
+    "ALTER TABLE cargas ADD COLUMN IF NOT EXISTS destination_order VARCHAR(64)",
+    "ALTER TABLE cargas ADD COLUMN IF NOT EXISTS source_updated_at TIMESTAMP"
+]
+
+PROVISIONINGS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS provisionings (
+        id VARCHAR(64) PRIMARY KEY,
+        provisioning_id VARCHAR(64) NOT NULL,
+        origin_order VARCHAR(64),
+        buyer_name VARCHAR(255) DEFAULT '',
+        seller_name VARCHAR(255) DEFAULT '',
+        grain_name VARCHAR(255) DEFAULT '',
+        provisioning_type VARCHAR(100) DEFAULT '',
+        amount DECIMAL(15,2) DEFAULT 0,
+        amount_remaining DECIMAL(15,2) DEFAULT 0,
+        bag_price DECIMAL(15,2) DEFAULT 0,
+        destination_bag_price DECIMAL(15,2),
+        origin_bag_price DECIMAL(15,2),
+        delivery_deadline TIMESTAMP,
+        created_at TIMESTAMP,
+        source_updated_at TIMESTAMP,
+        synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+FINANCES_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS finances (
+        id VARCHAR(64) PRIMARY KEY,
+        entry_date DATE,
+        value DECIMAL(15,2) DEFAULT 0,
+        category_name VARCHAR(255) DEFAULT '',
+        category_item VARCHAR(255) DEFAULT '',
+        category_type VARCHAR(100) DEFAULT '',
+        category_dfc VARCHAR(100) DEFAULT '',
+        user_name VARCHAR(255) DEFAULT '',
+        description TEXT DEFAULT '',
+        is_ignored BOOLEAN DEFAULT FALSE,
+        is_futuro BOOLEAN DEFAULT FALSE,
+        source_updated_at TIMESTAMP,
+        synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+CONTRATOS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS contratos (
+        id VARCHAR(64) PRIMARY KEY,
+        created_at TIMESTAMP,
+        buyer_name VARCHAR(255) DEFAULT '',
+        seller_name VARCHAR(255) DEFAULT '',
+        grain_name VARCHAR(255) DEFAULT '',
+        contract_type VARCHAR(100) DEFAULT '',
+        direction_type VARCHAR(100) DEFAULT '',
+        status_display VARCHAR(100) DEFAULT '',
+        amount DECIMAL(15,2) DEFAULT 0,
+        amount_ordered DECIMAL(15,2) DEFAULT 0,
+        bag_price DECIMAL(15,2) DEFAULT 0,
+        payment_days INTEGER DEFAULT 0,
+        loading_date TIMESTAMP,
+        delivery_date TIMESTAMP,
+        pis_status VARCHAR(50) DEFAULT '',
+        pis_cofins_value DECIMAL(15,2) DEFAULT 0,
+        delivered_bags DECIMAL(15,2) DEFAULT 0,
+        remaining_bags DECIMAL(15,2) DEFAULT 0,
+        delivery_divergence BOOLEAN DEFAULT FALSE,
+        source_updated_at TIMESTAMP,
+        synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Colunas acrescentadas depois da primeira versão da tabela contratos
+CONTRATOS_MIGRATIONS = [
+    "ALTER TABLE contratos ADD COLUMN IF NOT EXISTS delivered_bags DECIMAL(15,2) DEFAULT 0",
+    "ALTER TABLE contratos ADD COLUMN IF NOT EXISTS remaining_bags DECIMAL(15,2) DEFAULT 0",
+    "ALTER TABLE contratos ADD COLUMN IF NOT EXISTS delivery_divergence BOOLEAN DEFAULT FALSE"
+]
+
+# Marca d'água por entidade: maior updatedAt já gravado na réplica
+SYNC_WATERMARKS_DDL = """
+    CREATE TABLE IF NOT EXISTS sync_watermarks (
+        entity VARCHAR(100) PRIMARY KEY,
+        last_updated_at TIMESTAMP,
+        last_run_at TIMESTAMP,
+        rows_synced INTEGER DEFAULT 0
+    )
+"""
+
+# Linhas que falharam na sincronização, com payload para auditoria e reprocessamento
+SYNC_DEAD_LETTER_DDL = """
+    CREATE TABLE IF NOT EXISTS sync_dead_letter (
+        id SERIAL PRIMARY KEY,
+        entity VARCHAR(100) NOT NULL,
+        source_id VARCHAR(64) NOT NULL,
+        row_key VARCHAR(255) NOT NULL,
+        error_class VARCHAR(255) NOT NULL,
+        error_message TEXT DEFAULT '',
+        payload JSONB,
+        attempts INTEGER DEFAULT 0,
+        next_retry_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        resolved_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Uma pendência por linha: falhas repetidas atualizam o registro existente
+SYNC_DEAD_LETTER_INDEX_DDL = """
+    CREATE UNIQUE INDEX IF NOT EXISTS sync_dead_letter_pending_idx
+    ON sync_dead_letter (entity, row_key) WHERE resolved_at IS NULL
+"""
+
+# Dias com alterações nas tabelas de fatos, marcados por gatilho e consumidos
+# pela atualização incremental dos agregados (src.pg_rollups)
+ROLLUP_DIRTY_DAYS_DDL = """
+    CREATE TABLE IF NOT EXISTS rollup_dirty_days (
+        rollup VARCHAR(100) NOT NULL,
+        day DATE NOT NULL,
+        marked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (rollup, day)
+    )
+"""
@@ -1,304 +1,348 @@
 """
 Serviço PostgreSQL para Sistema de Auditoria FOX
 Usando pg8000 - biblioteca PostgreSQL pura em Python
-Versão corrigida com criação automática de tabelas
+Conexões emprestadas do pool do processo; tabelas verificadas uma vez por processo
 """
-try:
-    import pg8000
-    PG8000_AVAILABLE = True
-except ImportError:
-    PG8000_AVAILABLE = False
-    pg8000 = None
-
+import threading
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import streamlit as st
 
+from config.postgres import PG8000_AVAILABLE, get_postgres_pool
+from src.pg_partitions import ensure_cargas_partitioned, table_kind, detach_partitions_before, add_months, month_start
+from src.pg_schema import CARGAS_INDEXES
+from src.sync_pipeline import ENTITIES_BY_NAME, SYNC_START_DATE, upsert_batch_with_fallback, run_after_sync
+from src.pg_rollups import ensure_rollup, discard_rollup_before, build_slice_query, ROLLUP_MEASURES
+from src.cargas_query import (
+    CargasFilters, DEFAULT_SORT, build_page_query, build_aggregate_queries, build_cargas_where,
+    BUYER_DISPLAY_SQL, SELLER_DISPLAY_SQL
+)
+from src.dead_letter import DeadLetterQueue, from_row_failures, from_transform_failures
+
+# Verificação/criação das tabelas feita uma única vez por processo
+_tables_ready = False
+_tables_lock = threading.Lock()
+
 class PostgreSQLService:
     def __init__(self):
-        self.connection = None
+        self.pool = None
         if PG8000_AVAILABLE:
-            if self.connect():
-                self.ensure_tables_exist()  # Garantir que tabelas existam
+            self.connect()
         else:
             st.error("❌ pg8000 não instalado. Execute: pip install pg8000")
-    
+
     def connect(self):
-        """Conecta ao PostgreSQL usando pg8000"""
+        """Obtém o pool de conexões PostgreSQL do processo"""
         if not PG8000_AVAILABLE:
             return False
-            
+
         try:
-            self.connection = pg8000.connect(
-                host="24.199.75.66",
-                port=5432,
-                user="myuser",
-                password="mypassword",
-                database="mydb"
-            )
-            st.success("✅ Conectado ao PostgreSQL com sucesso")
+            self.pool = get_postgres_pool()
             return True
         except Exception as e:
             st.error(f"❌ Erro ao conectar PostgreSQL: {str(e)}")
             return False
-    
+
+    @property
+    def available(self):
+        return self.pool is not None
+
     def ensure_tables_exist(self):
-        """Garante que todas as tabelas necessárias existam"""
-        if not PG8000_AVAILABLE or not self.connection:
+        """Garante que todas as tabelas necessárias existam (uma vez por processo)"""
+        global _tables_ready
+        if not self.available:
             return False
-            
-        try:
-            cursor = self.connection.cursor()
-            
-            # Verificar se tabela cargas existe
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'cargas'
-                )
-            """)
-            table_exists = cursor.fetchone()[0]
-            
-            if not table_exists:
-                st.info("📋 Criando tabela 'cargas' no PostgreSQL...")
-                self.create_cargas_table()
-            else:
-                st.success("✅ Tabela 'cargas' já existe no PostgreSQL")
-            
-            cursor.close()
+        if _tables_ready:
             return True
-            
-        except Exception as e:
-            st.error(f"❌ Erro ao verificar tabelas: {str(e)}")
-            return False
-    
-    def create_cargas_table(self):
-        """Cria a tabela de cargas no PostgreSQL"""
-        if not PG8000_AVAILABLE or not self.connection:
-            return False
-            
-        try:
-            cursor = self.connection.cursor()
-            
-            # Criar tabela de cargas com todos os campos necessários
-            create_table_sql = """
-                CREATE TABLE cargas (
-                    id SERIAL PRIMARY KEY,
-                    ticket_id VARCHAR(255) UNIQUE NOT NULL,
-                    amount DECIMAL(15,2) DEFAULT 0,
-                    loading_date TIMESTAMP,
-                    status VARCHAR(100) DEFAULT '',
-                    paid BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    buyer_name VARCHAR(255) DEFAULT '',
-                    seller_name VARCHAR(255) DEFAULT '',
-                    grain_name VARCHAR(255) DEFAULT '',
-                    contract_type VARCHAR(100) DEFAULT '',
-                    receita DECIMAL(15,2) DEFAULT 0,
-                    custo DECIMAL(15,2) DEFAULT 0,
-                    frete DECIMAL(15,2) DEFAULT 0,
-                    lucro_bruto DECIMAL(15,2) DEFAULT 0,
-                    synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """
-            
-            cursor.execute(create_table_sql)
-            self.connection.commit()
-            cursor.close()
-            
-            st.success("✅ Tabela 'cargas' criada com sucesso no PostgreSQL")
-            return True
-            
-        except Exception as e:
-            st.error(f"❌ Erro ao criar tabela 'cargas': {str(e)}")
-            return False
-    
+
+        with _tables_lock:
+            if _tables_ready:
+                return True
+            try:
+                with self.pool.connection() as connection:
+                    cursor = connection.cursor()
+
+                    # Tabela ausente ou ainda não particionada: criar/migrar
+                    if table_kind(cursor, 'cargas') != 'p':
+                        st.info("📋 Preparando tabela 'cargas' no PostgreSQL...")
+                        self.create_cargas_table(cursor)
+                    else:
+                        # Índices adicionados depois da criação da tabela
+                        for index in CARGAS_INDEXES:
+                            cursor.execute(index)
+                        ensure_rollup(cursor, 'cargas')
+
+                    connection.commit()
+                    cursor.close()
+
+                _tables_ready = True
+                return True
+
+            except Exception as e:
+                st.error(f"❌ Erro ao verificar tabelas: {str(e)}")
+                return False
+
+    def create_cargas_table(self, cursor):
+        """Cria (ou migra) a tabela de cargas particionada por mês"""
+        # Índices, partições mensais e agregados são criados junto com a tabela
+        ensure_cargas_partitioned(cursor, SYNC_START_DATE)
+        ensure_rollup(cursor, 'cargas')
+
     def table_exists(self):
         """Verifica se a tabela cargas existe"""
-        if not PG8000_AVAILABLE or not self.connection:
+        if not self.available:
             return False
-            
+
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'cargas'
-                )
-            """)
-            exists = cursor.fetchone()[0]
-            cursor.close()
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                exists = table_kind(cursor, 'cargas') is not None
+                cursor.close()
             return exists
         except Exception as e:
             st.error(f"❌ Erro ao verificar existência da tabela: {str(e)}")
             return False
-    
-    def get_cargas_data(self):
-        """Busca dados de cargas do PostgreSQL"""
-        if not PG8000_AVAILABLE or not self.connection:
+
+    def get_cargas_data(self, start_date=None, end_date=None, limit=1000):
+        """Busca dados de cargas do PostgreSQL no período (lê só as partições dos meses pedidos)"""
+        if not self.ensure_tables_exist():
             st.warning("⚠️ PostgreSQL não disponível")
             return pd.DataFrame()
-            
+
         try:
-            # Garantir que tabela existe antes de consultar
-            if not self.table_exists():
-                st.warning("⚠️ Tabela 'cargas' não existe. Criando...")
-                if self.create_cargas_table():
-                    st.info("📋 Tabela criada. Execute sincronização para popular dados.")
-                return pd.DataFrame()  # Retorna vazio na primeira vez
-            
+            # Colunas da interface montadas no próprio SELECT
             query = """
-                SELECT 
+                SELECT
                     ticket_id,
                     loading_date,
                     buyer_name,
                     seller_name,
                     grain_name,
                     contract_type,
-                    amount,
+                    COALESCE(amount, 0) AS amount,
                     status,
                     paid,
-                    receita,
-                    custo,
-                    frete,
-                    lucro_bruto,
-                    synced_at
-                FROM cargas 
-                WHERE loading_date >= '2025-01-01'
+                    COALESCE(receita, 0) AS receita,
+                    COALESCE(custo, 0) AS custo,
+                    COALESCE(frete, 0) AS frete,
+                    COALESCE(lucro_bruto, 0) AS lucro_bruto,
+                    synced_at,
+                    to_char(loading_date, 'DD/MM/YYYY') AS data_carregamento,
+                    COALESCE(buyer_name, 'N/A') AS comprador,
+                    COALESCE(seller_name, 'N/A') AS vendedor,
+                    'N/A' AS caminhoneiro,
+                    COALESCE(grain_name, 'N/A') AS grao,
+                    COALESCE(contract_type, '❓ Indefinido') AS tipo_contrato,
+                    COALESCE(amount, 0) AS quantidade,
+                    CASE WHEN paid THEN '✅' ELSE '⏰' END AS paid_status,
+                    ticket_id AS nro_ticket
+                FROM cargas
+                WHERE {where}
                 ORDER BY loading_date DESC
-                LIMIT 1000
+                LIMIT %s
             """
-            
-            cursor = self.connection.cursor()
-            cursor.execute(query)
-            
-            # Buscar dados e colunas
+
+            # Intervalo sobre a coluna de partição permite a poda de partições;
+            # sem data final ficam incluídas as cargas agendadas (meses futuros)
+            clauses, params = ["loading_date >= %s"], [start_date or SYNC_START_DATE]
+            if end_date:
+                clauses.append("loading_date < %s")
+                params.append(end_date + timedelta(days=1))
+
+            return self._query_dataframe(query.format(where=" AND ".join(clauses)), (*params, limit))
+
+        except Exception as e:
+            st.error(f"❌ Erro ao buscar dados PostgreSQL: {str(e)}")
+            return pd.DataFrame()
+
+    def _query_dataframe(self, query, params=()):
+        """Executa a consulta numa conexão do pool e devolve um DataFrame"""
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(query, params)
             rows = cursor.fetchall()
             columns = [desc[0] for desc in cursor.description]
             cursor.close()
-            
-            # Criar DataFrame
-            df = pd.DataFrame(rows, columns=columns)
-            
-            if not df.empty:
-                # Processar dados para compatibilidade com interface
-                df['data_carregamento'] = pd.to_datetime(df['loading_date']).dt.strftime('%d/%m/%Y')
-                df['comprador'] = df['buyer_name'].fillna('N/A')
-                df['vendedor'] = df['seller_name'].fillna('N/A')
-                df['caminhoneiro'] = 'N/A'  # Placeholder
-                df['grao'] = df['grain_name'].fillna('N/A')
-                df['tipo_contrato'] = df['contract_type'].fillna('❓ Indefinido')
-                df['quantidade'] = df['amount'].fillna(0)
-                df['paid_status'] = df['paid'].apply(lambda x: '✅' if x else '⏰')
-                
-                # Adicionar colunas necessárias para interface
-                df['nro_ticket'] = df['ticket_id']
-                df['receita'] = df['receita'].fillna(0)
-                df['custo'] = df['custo'].fillna(0)
-                df['frete'] = df['frete'].fillna(0)
-                df['lucro_bruto'] = df['lucro_bruto'].fillna(0)
-            
-            st.success(f"✅ {len(df)} cargas carregadas do PostgreSQL")
-            return df
-            
+        return pd.DataFrame(rows, columns=columns)
+
+    def query_cargas_page(self, filters: CargasFilters, page_size=100, after=None,
+                          sort=DEFAULT_SORT, descending=True):
+        """Página de cargas filtrada e ordenada no servidor; retorna (DataFrame, chave da próxima página)"""
+        if not self.ensure_tables_exist():
+            return pd.DataFrame(), None
+
+        try:
+            query, params = build_page_query(filters, page_size, after, sort, descending)
+            df = self._query_dataframe(query, params)
+
+            next_key = None
+            if len(df) > page_size:
+                df = df.iloc[:page_size]
+                last = df.iloc[-1]
+                # Chave no mesmo tipo do parâmetro SQL (datetime/int/float/str)
+                value = last['sort_key']
+                if isinstance(value, pd.Timestamp):
+                    value = value.to_pydatetime()
+                elif hasattr(value, 'item'):
+                    value = value.item()
+                next_key = (value, last['ticket_id'])
+            return df.drop(columns=['sort_key']), next_key
+
         except Exception as e:
-            st.error(f"❌ Erro ao buscar dados PostgreSQL: {str(e)}")
-            return pd.DataFrame()
-    
-    def sync_from_mongodb(self, mongodb_data):
-        """Sincroniza dados do MongoDB para PostgreSQL"""
-        if not PG8000_AVAILABLE or not self.connection:
+            st.error(f"❌ Erro ao consultar cargas PostgreSQL: {str(e)}")
+            return pd.DataFrame(), None
+
+    def get_cargas_aggregates(self, filters: CargasFilters):
+        """Totais, distribuição por status e cargas por dia calculados no servidor"""
+        empty = {
+            'totals': {measure: 0.0 for measure in ROLLUP_MEASURES},
+            'status_counts': pd.Series(dtype=float),
+            'daily_counts': pd.Series(dtype=float)
+        }
+        if not self.ensure_tables_exist():
+            return empty
+
+        try:
+            (totals_sql, totals_params), (status_sql, status_params), (day_sql, day_params) = \
+                build_aggregate_queries(filters)
+
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(totals_sql, totals_params)
+                totals = dict(zip(ROLLUP_MEASURES, (float(v) for v in cursor.fetchone())))
+                cursor.execute(status_sql, status_params)
+                by_status = cursor.fetchall()
+                cursor.execute(day_sql, day_params)
+                by_day = cursor.fetchall()
+                cursor.close()
+
+            return {
+                'totals': totals,
+                'status_counts': pd.Series({row[0]: float(row[1]) for row in by_status}, dtype=float),
+                'daily_counts': pd.Series({row[0]: float(row[1]) for row in by_day}, dtype=float)
+            }
+
+        except Exception as e:
+            st.error(f"❌ Erro ao calcular totais PostgreSQL: {str(e)}")
+            return empty
+
+    def get_cargas_filter_options(self, start_date=None, end_date=None):
+        """Valores distintos para os seletores da página no período"""
+        options = {'status': [], 'grain_name': [], 'contract_type': [], 'buyer_display': [], 'seller_display': []}
+        if not self.ensure_tables_exist():
+            return options
+
+        try:
+            where, params = build_cargas_where(CargasFilters(start_date=start_date, end_date=end_date))
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                for name, expression in (('status', 'status'), ('grain_name', 'grain_name'),
+                                         ('contract_type', 'contract_type'),
+                                         ('buyer_display', BUYER_DISPLAY_SQL),
+                                         ('seller_display', SELLER_DISPLAY_SQL)):
+                    cursor.execute(f"""
+                        SELECT DISTINCT {expression} FROM cargas
+                        WHERE {where} AND COALESCE({expression}, '') <> ''
+                        ORDER BY 1
+                    """, params)
+                    options[name] = [row[0] for row in cursor.fetchall()]
+                cursor.close()
+            return options
+
+        except Exception as e:
+            st.error(f"❌ Erro ao buscar opções de filtro: {str(e)}")
+            return options
+
+    def sync_from_mongodb(self, batches):
+        """Sincroniza dados do MongoDB para PostgreSQL consumindo lotes à medida que chegam"""
+        if not self.ensure_tables_exist():
             st.error("❌ PostgreSQL não disponível para sincronização")
             return 0
-            
+
         try:
-            # Garantir que tabela existe
-            if not self.table_exists():
-                st.info("📋 Criando tabela antes da sincronização...")
-                if not self.create_cargas_table():
-                    return 0
-            
-            cursor = self.connection.cursor()
-            
-            # Limpar dados existentes
-            cursor.execute("DELETE FROM cargas")
-            st.info("🗑️ Dados antigos removidos do PostgreSQL")
-            
-            # Inserir dados do MongoDB
-            inserted_count = 0
-            for _, row in mongodb_data.iterrows():
-                try:
-                    cursor.execute("""
-                        INSERT INTO cargas (
-                            ticket_id, amount, loading_date, status, paid,
-                            buyer_name, seller_name, grain_name, contract_type,
-                            receita, custo, frete, lucro_bruto
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        str(row.get('_id', '')),
-                        float(row.get('amount', 0)),
-                        row.get('loadingDate'),
-                        str(row.get('status', '')),
-                        bool(row.get('paid', False)),
-                        str(row.get('buyer_name', '')),
-                        str(row.get('seller_name', '')),
-                        str(row.get('grain_name', '')),
-                        str(row.get('contract_type', '')),
-                        float(row.get('receita', 0)),
-                        float(row.get('custo', 0)),
-                        float(row.get('frete', 0)),
-                        float(row.get('lucro_bruto', 0))
-                    ))
-                    inserted_count += 1
-                except Exception as row_error:
-                    st.warning(f"⚠️ Erro ao inserir linha: {str(row_error)}")
-                    continue
-            
-            self.connection.commit()
-            cursor.close()
-            
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+
+                # Limpar dados existentes (na mesma transação da carga)
+                cursor.execute("DELETE FROM cargas")
+
+                # Inserir lotes do MongoDB sem materializar o conjunto inteiro;
+                # linhas com erro vão em lote para sync_dead_letter
+                entity = ENTITIES_BY_NAME['cargas']
+                dead_letters = DeadLetterQueue(connection)
+                dead_letters.ensure_table()
+                inserted_count = 0
+                failed_count = 0
+                for batch in batches:
+                    inserted, failures = upsert_batch_with_fallback(cursor, entity, batch)
+                    inserted_count += inserted
+                    failed_count += dead_letters.record(from_row_failures(entity, failures), cursor)
+                if hasattr(batches, 'transform_failures'):
+                    failed_count += dead_letters.record(from_transform_failures(entity, batches.transform_failures), cursor)
+
+                connection.commit()
+                cursor.close()
+
+                run_after_sync(connection, entity)
+
             st.success(f"✅ {inserted_count} cargas sincronizadas para PostgreSQL")
+            if failed_count:
+                st.warning(f"⚠️ {failed_count} linhas com erro registradas em sync_dead_letter para reprocessamento")
             return inserted_count
-            
+
         except Exception as e:
+            # A conexão devolvida ao pool já tem a transação desfeita
             st.error(f"❌ Erro na sincronização: {str(e)}")
             return 0
-    
+
     def get_sync_stats(self):
         """Retorna estatísticas de sincronização"""
-        if not PG8000_AVAILABLE or not self.connection:
+        if not self.ensure_tables_exist():
             return {'total_cargas': 0, 'last_sync': None}
-            
+
         try:
-            # Garantir que tabela existe
-            if not self.table_exists():
-                return {'total_cargas': 0, 'last_sync': None}
-            
-            cursor = self.connection.cursor()
-            
-            cursor.execute("SELECT COUNT(*) FROM cargas")
-            total_cargas = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT MAX(synced_at) FROM cargas")
-            last_sync_result = cursor.fetchone()
-            last_sync = last_sync_result[0] if last_sync_result and last_sync_result[0] else None
-            
-            cursor.close()
-            
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute("SELECT COUNT(*), MAX(synced_at) FROM cargas")
+                total_cargas, last_sync = cursor.fetchone()
+                cursor.close()
+
             return {
                 'total_cargas': total_cargas,
                 'last_sync': last_sync
             }
-            
+
         except Exception as e:
             st.error(f"❌ Erro ao buscar estatísticas: {str(e)}")
             return {'total_cargas': 0, 'last_sync': None}
-    
-    def close(self):
-        """Fecha conexão"""
-        if self.connection:
-            self.connection.close()
-            st.info("🔌 Conexão PostgreSQL fechada")
 
+    def get_rollup_slice(self, fact, group_by=(), filters=None, start_date=None, end_date=None):
+        """Medidas do cubo de KPIs numa fatia ('cargas' ou 'finances_monthly', ex.: group_by=['day'])"""
+        if not self.ensure_tables_exist():
+            return pd.DataFrame()
+
+        try:
+            return self._query_dataframe(*build_slice_query(fact, list(group_by), filters, start_date, end_date))
+
+        except Exception as e:
+            st.error(f"❌ Erro ao consultar agregados ({fact}): {str(e)}")
+            return pd.DataFrame()
+
+    def archive_old_partitions(self, months_to_keep, drop=False):
+        """Destaca as partições mensais de cargas fora da retenção (arquiva ou remove)"""
+        if not self.ensure_tables_exist():
+            return []
+
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cutoff = add_months(month_start(datetime.now()), -months_to_keep)
+                detached = detach_partitions_before(cursor, 'cargas', cutoff, archive=not drop)
+                discard_rollup_before(cursor, 'cargas', cutoff)
+                connection.commit()
+                cursor.close()
+            return detached
+
+        except Exception as e:
+            st.error(f"❌ Erro ao arquivar partições: {str(e)}")
+            return []
@@ -0,0 +1,458 @@
+"""
+Cache compartilhado de resultados de consultas
+Resultados ficam serializados e comprimidos num backend comum (Redis ou disco),
+identificados pela impressão digital da consulta, para que todos os pods
+aproveitem a mesma cópia aquecida
+"""
+import functools
+import hashlib
+import hmac
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Backend: Redis quando FOX_CACHE_REDIS_URL estiver definido, senão disco local
+CACHE_REDIS_URL = os.getenv('FOX_CACHE_REDIS_URL')
+CACHE_DIR = os.getenv('FOX_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'fox_query_cache'))
+# Chave HMAC das entradas: só valores assinados por quem a conhece são
+# desserializados. Obrigatória com Redis; no disco há uma chave local
+CACHE_SECRET = os.getenv('FOX_CACHE_SECRET')
+DEFAULT_TTL = 300
+KEY_PREFIX = 'fox:qc'
+
+# Stale-while-revalidate: por quanto tempo um valor antigo ainda pode ser
+# servido enquanto é recalculado, e validade da trava de recálculo entre pods
+STALE_TTL = 6 * 3600
+REFRESH_LEASE_TTL = 120
+
+# Trava de arquivo do incr em disco: espera máxima e idade a partir da qual
+# uma trava é considerada abandonada (processo morto no meio do incremento)
+DISK_LOCK_TIMEOUT = 5
+
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+class DiskCacheBackend:
+    """Backend em arquivos: um arquivo por chave com a validade no cabeçalho"""
+
+    def __init__(self, directory: str = CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at = float(f.readline())
+                if expires_at and expires_at < time.time():
+                    return None
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        expires_at = time.time() + ttl if ttl else 0
+        # Escrita atômica: leitores nunca veem arquivo pela metade
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(f"{expires_at}\n".encode())
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    @contextmanager
+    def _locked(self, key: str):
+        """Exclusão mútua entre processos por arquivo de trava criado com O_EXCL"""
+        lock_path = self._path(key) + '.lock'
+        deadline = time.monotonic() + DISK_LOCK_TIMEOUT
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > DISK_LOCK_TIMEOUT:
+                        os.remove(lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Trava do cache em disco ocupada: {lock_path}")
+                time.sleep(0.005)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    def incr(self, key: str) -> int:
+        # Leitura e gravação sob a trava: invalidações simultâneas não se perdem
+        with self._locked(key):
+            value = int(self.get(key) or 0) + 1
+            self.set(key, str(value).encode())
+        return value
+
+    def local_secret(self) -> bytes:
+        """Chave HMAC do diretório, criada uma vez e lida pelos demais processos"""
+        path = os.path.join(self.directory, '.secret')
+        if not os.path.exists(path):
+            # Arquivo completo (mkstemp: só o dono lê) ligado ao nome final;
+            # se outro processo chegou antes, vale a chave dele
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(os.urandom(32))
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def add(self, key: str, value: bytes, ttl: Optional[int] = None) -> bool:
+        """Grava só se a chave não existir (ou estiver expirada)"""
+        path = self._path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self.get(key) is not None:
+                    return False
+                self.delete(key)
+                continue
+            with os.fdopen(fd, 'wb') as f:
+                f.write(f"{time.time() + ttl if ttl else 0}\n".encode())
+                f.write(value)
+            return True
+        return False
+
+class RedisCacheBackend:
+    """Backend em servidor Redis (ou qualquer cliente com a mesma interface)"""
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str):
+        if not REDIS_AVAILABLE:
+            raise ImportError("redis não instalado. Execute: pip install redis")
+        return cls(redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+    def add(self, key: str, value: bytes, ttl: Optional[int] = None) -> bool:
+        return bool(self.client.set(key, value, ex=ttl, nx=True))
+
+    def local_secret(self) -> bytes:
+        # Servidor compartilhado: a chave precisa ser a mesma em todos os pods
+        raise ValueError("FOX_CACHE_SECRET é obrigatório para o cache em Redis")
+
+def fingerprint(*args, **kwargs) -> str:
+    """Impressão digital estável dos parâmetros de uma consulta"""
+    payload = repr((args, sorted(kwargs.items())))
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+def _is_empty(value) -> bool:
+    """Resultados vazios (em geral erro de conexão) não são compartilhados"""
+    if value is None:
+        return True
+    if isinstance(value, pd.DataFrame):
+        return value.empty
+    if isinstance(value, tuple):
+        return all(_is_empty(item) for item in value)
+    if isinstance(value, (list, dict)):
+        return len(value) == 0
+    return False
+
+class QueryCache:
+    """Cache de resultados por namespace, com TTL e invalidação explícita.
+
+    A invalidação incrementa a geração do namespace: as chaves antigas deixam
+    de ser lidas e expiram sozinhas, sem varrer o backend. Entradas levam um
+    HMAC: bytes gravados por quem não tem a chave nunca chegam ao pickle.
+    """
+
+    def __init__(self, backend, default_ttl: int = DEFAULT_TTL, secret: Optional[bytes] = None):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        if secret is None:
+            secret = CACHE_SECRET.encode() if CACHE_SECRET else backend.local_secret()
+        self.secret = secret
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()
+
+    def _dumps(self, entry) -> bytes:
+        payload = zlib.compress(pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL), 6)
+        return self._sign(payload) + payload
+
+    def _loads(self, raw: bytes):
+        signature, payload = raw[:SIGNATURE_SIZE], raw[SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise ValueError("assinatura inválida")
+        return pickle.loads(zlib.decompress(payload))
+
+    def _generation(self, namespace: str) -> int:
+        return int(self.backend.get(f"{KEY_PREFIX}:{namespace}:gen") or 0)
+
+    def _key(self, namespace: str, key: str, generation: Optional[int] = None) -> str:
+        if generation is None:
+            generation = self._generation(namespace)
+        return f"{KEY_PREFIX}:{namespace}:{generation}:{key}"
+
+    def get_entry(self, namespace: str, key: str,
+                  previous_generation: bool = False) -> Optional[Tuple[float, Any]]:
+        """(momento da gravação, valor) ou None.
+
+        Com previous_generation=True lê o valor anterior à última invalidação,
+        que o stale-while-revalidate ainda pode servir enquanto recalcula.
+        """
+        try:
+            generation = self._generation(namespace) - (1 if previous_generation else 0)
+            if generation < 0:
+                return None
+            raw = self.backend.get(self._key(namespace, key, generation))
+            if raw is None:
+                return None
+            return self._loads(raw)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache indisponível ({namespace}): {str(e)}")
+            return None
+
+    def get(self, namespace: str, key: str) -> Any:
+        entry = self.get_entry(namespace, key)
+        return entry[1] if entry else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None):
+        try:
+            raw = self._dumps((time.time(), value))
+            self.backend.set(self._key(namespace, key), raw, ttl or self.default_ttl)
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao gravar no cache ({namespace}): {str(e)}")
+
+    def version(self, namespace: str) -> int:
+        """Versão atual do namespace (incrementada a cada invalidação)"""
+        try:
+            return self._generation(namespace)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache indisponível ({namespace}): {str(e)}")
+            return 0
+
+    def invalidate(self, namespace: str):
+        """Descarta todos os resultados do namespace (em todos os pods)"""
+        try:
+            self.backend.incr(f"{KEY_PREFIX}:{namespace}:gen")
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao invalidar cache ({namespace}): {str(e)}")
+
+    def try_lease(self, namespace: str, key: str, ttl: int = REFRESH_LEASE_TTL) -> bool:
+        """Trava de recálculo compartilhada: só um processo recalcula cada chave"""
+        try:
+            return self.backend.add(f"{KEY_PREFIX}:lease:{namespace}:{key}", b"1", ttl)
+        except Exception:
+            return True
+
+    def release_lease(self, namespace: str, key: str):
+        try:
+            self.backend.delete(f"{KEY_PREFIX}:lease:{namespace}:{key}")
+        except Exception:
+            pass
+
+    def get_or_compute(self, namespace: str, key: str, compute: Callable[[], Any],
+                       ttl: Optional[int] = None) -> Any:
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+        value = compute()
+        if not _is_empty(value):
+            self.set(namespace, key, value, ttl)
+        return value
+
+# Namespaces de cache afetados pela sincronização de cada entidade
+ENTITY_CACHE_NAMESPACES = {
+    'cargas': ['cargas'],
+    'provisionings': ['cargas', 'provisionamento'],
+    'contratos': ['contratos', 'provisionamento'],
+    'finances': ['financeiro']
+}
+
+_cache = None
+
+def get_query_cache() -> QueryCache:
+    """Cache único do processo; Redis se configurado e acessível, senão disco"""
+    global _cache
+    if _cache is None:
+        backend = None
+        if not CACHE_REDIS_URL:
+            logger.warning("⚠️ FOX_CACHE_REDIS_URL não definido: cache em disco local, não compartilhado entre os pods")
+        elif not CACHE_SECRET:
+            logger.warning("⚠️ FOX_CACHE_SECRET não definido, usando cache em disco em vez do Redis")
+        else:
+            try:
+                backend = RedisCacheBackend.from_url(CACHE_REDIS_URL)
+                backend.client.ping()
+            except Exception as e:
+                logger.warning(f"⚠️ Redis indisponível, usando cache em disco: {str(e)}")
+                backend = None
+        _cache = QueryCache(backend or DiskCacheBackend())
+    return _cache
+
+def shared_cache(namespace: str, ttl: Optional[int] = None):
+    """Decorator: compartilha o resultado da função entre processos e pods"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = fingerprint(func.__qualname__, *args, **kwargs)
+            return get_query_cache().get_or_compute(namespace, key, lambda: func(*args, **kwargs), ttl)
+        return wrapper
+    return decorator
+
+class _Flight:
+    """Cálculo em andamento de uma chave, compartilhado pelas chamadas concorrentes"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def single_flight(key: str, compute: Callable[[], Any]) -> Any:
+    """Executa compute uma vez por chave; chamadas simultâneas esperam o mesmo resultado"""
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = compute()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight.done.set()
+
+# Blocos abertos por track_stale na thread atual (loaders aninhados)
+_stale_trackers = threading.local()
+
+@contextmanager
+def track_stale():
+    """Marca se algum loader com stale_while_revalidate serviu valor vencido dentro do bloco.
+
+    Caches por cima do SWR (st.cache_data) usam a marca para não guardar o
+    valor de antes da invalidação sob a versão nova.
+    """
+    stack = _stale_trackers.__dict__.setdefault('stack', [])
+    tracked = {'stale': False}
+    stack.append(tracked)
+    try:
+        yield tracked
+    finally:
+        stack.pop()
+
+def _mark_stale():
+    for tracked in getattr(_stale_trackers, 'stack', []):
+        tracked['stale'] = True
+
+def _refresh_in_background(cache: QueryCache, namespace: str, key: str, compute: Callable[[], Any]):
+    """Recalcula numa thread, se ninguém (neste ou em outro pod) já estiver recalculando"""
+    flight_key = f"{namespace}:{key}"
+    with _inflight_lock:
+        if flight_key in _inflight:
+            return
+    if not cache.try_lease(namespace, key):
+        return
+
+    def run():
+        try:
+            single_flight(flight_key, compute)
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao recalcular cache ({namespace}): {str(e)}")
+        finally:
+            cache.release_lease(namespace, key)
+
+    threading.Thread(target=run, name=f"swr-{namespace}", daemon=True).start()
+
+def stale_while_revalidate(namespace: str, fresh_ttl: Optional[int] = 60, stale_ttl: int = STALE_TTL):
+    """Decorator: serve o último resultado na hora e recalcula em segundo plano.
+
+    Valores mais novos que fresh_ttl são servidos direto; mais antigos (ou de
+    antes da última invalidação) são servidos enquanto uma única thread
+    recalcula. Só o primeiro acesso, com o cache vazio, espera o cálculo.
+    Com fresh_ttl=None o valor só vence quando o namespace é invalidado.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_query_cache()
+            key = fingerprint(func.__qualname__, *args, **kwargs)
+
+            def compute():
+                value = func(*args, **kwargs)
+                if not _is_empty(value):
+                    cache.set(namespace, key, value, stale_ttl)
+                return value
+
+            entry = cache.get_entry(namespace, key)
+            if entry is None:
+                previous = cache.get_entry(namespace, key, previous_generation=True)
+                if previous is None:
+                    return single_flight(f"{namespace}:{key}", compute)
+                _refresh_in_background(cache, namespace, key, compute)
+                _mark_stale()
+                return previous[1]
+
+            stored_at, value = entry
+            if fresh_ttl is not None and time.time() - stored_at > fresh_ttl:
+                _refresh_in_background(cache, namespace, key, compute)
+                _mark_stale()
+            return value
+        return wrapper
+    return decorator
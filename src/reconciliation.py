@@ -0,0 +1,284 @@
+"""
+Reconciliação MongoDB x PostgreSQL por digest de partição
+Compara resumos agregados por partição (dia) nos dois lados e só desce ao
+nível de linha nas partições divergentes, devolvendo as chaves a ressincronizar
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from src.sync_pipeline import (
+    ENTITIES_BY_NAME, SYNC_START_DATE, BatchStream, upsert_rows, run_after_sync
+)
+
+logger = logging.getLogger(__name__)
+
+# Digest de uma partição: (linhas, soma em centavos, soma de updatedAt em ms).
+# As três somas são aditivas e independentes da ordem, então cada lado calcula
+# o seu com uma única agregação no servidor.
+Digest = Tuple[int, int, int]
+
+@dataclass
+class PartitionSpec:
+    """Como particionar e resumir uma entidade nos dois bancos"""
+    entity: str
+    collection: str
+    mongo_digest_pipeline: Callable[[], List[Dict]]
+    mongo_rows_pipeline: Callable[[str], List[Dict]]
+    pg_digest_sql: str
+    pg_rows_sql: str
+    pg_digest_params: tuple = ()
+
+@dataclass
+class ReconciliationReport:
+    """Resultado da reconciliação de uma entidade"""
+    entity: str
+    partitions_checked: int = 0
+    divergent_partitions: List[str] = field(default_factory=list)
+    missing_keys: List[str] = field(default_factory=list)
+    changed_keys: List[str] = field(default_factory=list)
+    orphan_keys: List[str] = field(default_factory=list)
+
+    @property
+    def in_sync(self) -> bool:
+        return not self.divergent_partitions
+
+    @property
+    def resync_keys(self) -> List[str]:
+        """Chaves que precisam ser regravadas a partir do MongoDB"""
+        return sorted(set(self.missing_keys) | set(self.changed_keys))
+
+def diff_partitions(mongo: Dict[str, Digest], postgres: Dict[str, Digest]) -> List[str]:
+    """Partições cujo digest difere (inclusive as que só existem de um lado)"""
+    partitions = set(mongo) | set(postgres)
+    return sorted(p for p in partitions if tuple(mongo.get(p, (0, 0, 0))) != tuple(postgres.get(p, (0, 0, 0))))
+
+def diff_rows(mongo: Dict[str, Tuple], postgres: Dict[str, Tuple]) -> Tuple[List[str], List[str], List[str]]:
+    """Compara impressões por chave; retorna (faltantes, alteradas, órfãs)"""
+    missing = sorted(k for k in mongo if k not in postgres)
+    orphans = sorted(k for k in postgres if k not in mongo)
+    changed = sorted(k for k in mongo if k in postgres and tuple(mongo[k]) != tuple(postgres[k]))
+    return missing, changed, orphans
+
+# ---------------------------------------------------------------------------
+# Especificações por entidade
+# ---------------------------------------------------------------------------
+
+def _cents(expr) -> Dict:
+    return {"$toLong": {"$round": [{"$multiply": [{"$ifNull": [expr, 0]}, 100]}, 0]}}
+
+def _cargas_digest_pipeline() -> List[Dict]:
+    return [
+        {"$match": {"loadingDate": {"$gte": SYNC_START_DATE}}},
+        {"$unwind": "$transactions"},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$loadingDate"}},
+            "rows": {"$sum": 1},
+            "cents": {"$sum": _cents("$transactions.amount")},
+            "updated_ms": {"$sum": {"$toLong": "$updatedAt"}}
+        }}
+    ]
+
+def _cargas_rows_pipeline(day: str) -> List[Dict]:
+    start = datetime.strptime(day, "%Y-%m-%d")
+    return [
+        {"$match": {"loadingDate": {"$gte": start, "$lt": start + timedelta(days=1)}}},
+        {"$unwind": {"path": "$transactions", "includeArrayIndex": "transaction_index"}},
+        {"$project": {
+            "_id": 0,
+            "key": {"$concat": [{"$toString": "$_id"}, ":", {"$toString": "$transaction_index"}]},
+            "cents": _cents("$transactions.amount"),
+            "updated_ms": {"$toLong": "$updatedAt"}
+        }}
+    ]
+
+# Datas inteiras AAAAMMDD representáveis; fora disso o lançamento não tem dia
+FINANCE_DATE_RANGE = {"$gte": 10000101, "$lte": 99991231}
+
+def _finance_day() -> Dict:
+    """AAAAMMDD do lançamento, ou null quando não é uma data de calendário.
+
+    Mesma regra de _int_to_date na sincronização (que grava NULL em
+    entry_date): sem isso a partição de uma data inválida nunca converge.
+    """
+    parts = {
+        "year": {"$toInt": {"$floor": {"$divide": ["$$d", 10000]}}},
+        "month": {"$toInt": {"$mod": [{"$floor": {"$divide": ["$$d", 100]}}, 100]}},
+        "day": {"$toInt": {"$mod": ["$$d", 100]}}
+    }
+    return {"$let": {
+        "vars": {"d": {"$toLong": "$date"}},
+        "in": {"$let": {
+            # $dateFromParts leva 31/02 para 03/03: a data só vale se voltar igual
+            "vars": {"day": {"$dateToString": {"format": "%Y%m%d", "date": {"$dateFromParts": parts}}}},
+            "in": {"$cond": [{"$eq": ["$$day", {"$toString": "$$d"}]}, "$$day", None]}
+        }}
+    }}
+
+def _finances_digest_pipeline() -> List[Dict]:
+    return [
+        {"$match": {"date": FINANCE_DATE_RANGE}},
+        {"$group": {
+            "_id": _finance_day(),
+            "rows": {"$sum": 1},
+            "cents": {"$sum": _cents("$value")},
+            "updated_ms": {"$sum": {"$toLong": "$updatedAt"}}
+        }}
+    ]
+
+def _finances_rows_pipeline(day: str) -> List[Dict]:
+    # Faixa: datas gravadas como double também caem no dia (como no $toLong do digest)
+    return [
+        {"$match": {"date": {"$gte": int(day), "$lt": int(day) + 1}}},
+        {"$project": {
+            "_id": 0,
+            "key": {"$toString": "$_id"},
+            "cents": _cents("$value"),
+            "updated_ms": {"$toLong": "$updatedAt"}
+        }}
+    ]
+
+_PG_UPDATED_MS = "ROUND(EXTRACT(EPOCH FROM source_updated_at) * 1000)::bigint"
+
+PARTITION_SPECS = {
+    'cargas': PartitionSpec(
+        entity='cargas',
+        collection='ticketv2',
+        mongo_digest_pipeline=_cargas_digest_pipeline,
+        mongo_rows_pipeline=_cargas_rows_pipeline,
+        pg_digest_sql=f"""
+            SELECT to_char(loading_date, 'YYYY-MM-DD') AS partition,
+                   COUNT(*),
+                   COALESCE(SUM(ROUND(amount * 100)::bigint), 0),
+                   COALESCE(SUM({_PG_UPDATED_MS}), 0)
+            FROM cargas
+            WHERE loading_date >= %s
+            GROUP BY 1
+        """,
+        pg_rows_sql=f"""
+            SELECT ticket_id, ROUND(amount * 100)::bigint, {_PG_UPDATED_MS}
+            FROM cargas
+            WHERE loading_date >= %s::date AND loading_date < %s::date + 1
+        """,
+        pg_digest_params=(SYNC_START_DATE,)
+    ),
+    'finances': PartitionSpec(
+        entity='finances',
+        collection='finances',
+        mongo_digest_pipeline=_finances_digest_pipeline,
+        mongo_rows_pipeline=_finances_rows_pipeline,
+        pg_digest_sql=f"""
+            SELECT to_char(entry_date, 'YYYYMMDD') AS partition,
+                   COUNT(*),
+                   COALESCE(SUM(ROUND(value * 100)::bigint), 0),
+                   COALESCE(SUM({_PG_UPDATED_MS}), 0)
+            FROM finances
+            -- Datas inválidas na origem chegam como NULL e ficam fora dos dois lados
+            WHERE entry_date IS NOT NULL
+            GROUP BY 1
+        """,
+        pg_rows_sql=f"""
+            SELECT id, ROUND(value * 100)::bigint, {_PG_UPDATED_MS}
+            FROM finances
+            WHERE entry_date >= to_date(%s, 'YYYYMMDD') AND entry_date < to_date(%s, 'YYYYMMDD') + 1
+        """
+    )
+}
+
+# ---------------------------------------------------------------------------
+# Motor
+# ---------------------------------------------------------------------------
+
+class ReconciliationEngine:
+    """Reconcilia entidades replicadas comparando digests por partição"""
+
+    def __init__(self, collections: Dict, pg_connection):
+        self.collections = collections
+        self.pg_connection = pg_connection
+        self.last_mongo_digests: Dict[str, Digest] = {}
+
+    def _mongo_digests(self, spec: PartitionSpec) -> Dict[str, Digest]:
+        cursor = self.collections[spec.collection].aggregate(spec.mongo_digest_pipeline(), allowDiskUse=True)
+        return {
+            doc['_id']: (int(doc.get('rows') or 0), int(doc.get('cents') or 0), int(doc.get('updated_ms') or 0))
+            for doc in cursor if doc.get('_id') is not None
+        }
+
+    def _pg_digests(self, spec: PartitionSpec) -> Dict[str, Digest]:
+        cursor = self.pg_connection.cursor()
+        cursor.execute(spec.pg_digest_sql, spec.pg_digest_params)
+        digests = {
+            row[0]: (int(row[1] or 0), int(row[2] or 0), int(row[3] or 0))
+            for row in cursor.fetchall() if row[0] is not None
+        }
+        cursor.close()
+        return digests
+
+    def _mongo_rows(self, spec: PartitionSpec, partition: str) -> Dict[str, Tuple]:
+        cursor = self.collections[spec.collection].aggregate(spec.mongo_rows_pipeline(partition))
+        return {doc['key']: (doc.get('cents') or 0, doc.get('updated_ms') or 0) for doc in cursor}
+
+    def _pg_rows(self, spec: PartitionSpec, partition: str) -> Dict[str, Tuple]:
+        cursor = self.pg_connection.cursor()
+        cursor.execute(spec.pg_rows_sql, (partition, partition))
+        rows = {row[0]: (int(row[1] or 0), int(row[2] or 0)) for row in cursor.fetchall()}
+        cursor.close()
+        return rows
+
+    def reconcile(self, entity: str) -> ReconciliationReport:
+        """Compara digests e desce apenas nas partições divergentes"""
+        spec = PARTITION_SPECS[entity]
+        report = ReconciliationReport(entity=entity)
+
+        mongo_digests = self._mongo_digests(spec)
+        self.last_mongo_digests = mongo_digests
+        pg_digests = self._pg_digests(spec)
+        report.partitions_checked = len(set(mongo_digests) | set(pg_digests))
+        report.divergent_partitions = diff_partitions(mongo_digests, pg_digests)
+
+        for partition in report.divergent_partitions:
+            missing, changed, orphans = diff_rows(
+                self._mongo_rows(spec, partition),
+                self._pg_rows(spec, partition)
+            )
+            report.missing_keys += missing
+            report.changed_keys += changed
+            report.orphan_keys += orphans
+
+        logger.info(
+            f"🔍 [{entity}] {report.partitions_checked} partições, "
+            f"{len(report.divergent_partitions)} divergentes, "
+            f"{len(report.resync_keys)} chaves a ressincronizar, {len(report.orphan_keys)} órfãs"
+        )
+        return report
+
+    def resync(self, report: ReconciliationReport) -> int:
+        """Regrava as chaves divergentes a partir do MongoDB e remove as órfãs"""
+        entity = ENTITIES_BY_NAME[report.entity]
+        cursor = self.pg_connection.cursor()
+
+        try:
+            if report.orphan_keys:
+                cursor.execute(
+                    f"DELETE FROM {entity.table} WHERE {entity.key} = ANY(%s)",
+                    (list(report.orphan_keys),)
+                )
+
+            written = 0
+            ids = sorted({entity.source_id(key) for key in report.resync_keys})
+            if ids:
+                for batch in BatchStream(entity.extract(self.collections, None, ids), entity.to_row):
+                    written += upsert_rows(cursor, entity, batch)
+
+            self.pg_connection.commit()
+
+        except Exception:
+            self.pg_connection.rollback()
+            raise
+
+        finally:
+            cursor.close()
+
+        run_after_sync(self.pg_connection, entity)
+        return written
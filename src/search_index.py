@@ -0,0 +1,154 @@
+"""
+Índices de busca das páginas (montados uma vez por versão dos dados)
+Número do ticket: array ordenado, busca por prefixo ou faixa com busca binária.
+Nomes (comprador, vendedor, cliente): índice invertido de trigramas sobre o
+texto sem acentos e sem maiúsculas, verificado só nos nomes candidatos
+"""
+import re
+import unicodedata
+from functools import reduce
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Tamanho dos n-gramas do índice de nomes
+NGRAM = 3
+
+_RANGE_PATTERN = re.compile(r'^(\d+)\s*-\s*(\d+)$')
+
+def parse_ticket_query(text: str) -> Optional[Tuple[str, ...]]:
+    """'123' -> ('prefix', '123'); '100-200' -> ('range', 100, 200); None se não for número"""
+    text = (text or '').strip()
+    match = _RANGE_PATTERN.match(text)
+    if match:
+        low, high = sorted((int(match.group(1)), int(match.group(2))))
+        return 'range', low, high
+    if text.isdigit():
+        return 'prefix', text
+    return None
+
+def fold(text) -> str:
+    """Texto para comparação: sem acentos e sem diferença de maiúsculas"""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+class TicketIndex:
+    """Números de ticket ordenados com a posição da linha de cada um"""
+
+    def __init__(self, tickets: pd.Series):
+        self.size = len(tickets)
+        numbers = pd.to_numeric(pd.Series(tickets), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        rows = np.flatnonzero(np.isfinite(numbers) & (numbers >= 0) & (numbers == np.floor(numbers)))
+        numbers = numbers[rows].astype(np.int64)
+        order = np.argsort(numbers, kind='stable')
+        self.numbers = numbers[order]
+        self.rows = rows[order]
+
+    def _slice(self, low: int, high: int) -> np.ndarray:
+        start = np.searchsorted(self.numbers, low, 'left')
+        end = np.searchsorted(self.numbers, high, 'right')
+        return self.rows[start:end]
+
+    def range(self, low: int, high: int) -> np.ndarray:
+        """Linhas com número entre low e high (inclusive), na ordem do DataFrame"""
+        return np.sort(self._slice(low, high))
+
+    def prefix(self, digits: str) -> np.ndarray:
+        """Linhas cujo número começa com `digits` (uma faixa contígua por quantidade de dígitos)"""
+        if not len(self.numbers) or not digits.isdigit():
+            return np.empty(0, dtype=np.int64)
+        if digits.startswith('0'):
+            return self.range(0, 0) if digits == '0' else np.empty(0, dtype=np.int64)
+        value, max_digits = int(digits), len(str(int(self.numbers[-1])))
+        parts = [self._slice(value * 10 ** extra, (value + 1) * 10 ** extra - 1)
+                 for extra in range(max_digits - len(digits) + 1)]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def search(self, text: str) -> Optional[np.ndarray]:
+        """Linhas para o texto digitado (prefixo ou faixa); None sem busca"""
+        if not (text or '').strip():
+            return None
+        query = parse_ticket_query(text)
+        if query is None:
+            return np.empty(0, dtype=np.int64)
+        if query[0] == 'range':
+            return self.range(query[1], query[2])
+        return self.prefix(query[1])
+
+    def mask(self, text: str) -> Optional[np.ndarray]:
+        """Máscara booleana por linha (para o índice de filtros); None sem busca"""
+        return _rows_to_mask(self.search(text), self.size)
+
+class NameIndex:
+    """Índice invertido de trigramas sobre os nomes distintos de uma ou mais colunas.
+
+    A busca por trecho ('contém') sem acentos encontra os nomes candidatos
+    pela interseção das listas dos trigramas, confirma o trecho só neles e
+    devolve as linhas desses nomes.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: Iterable[str]):
+        self.size = len(df)
+        columns = [column for column in columns if column in df.columns]
+        # Vocabulário único para todas as colunas; a linha é a posição módulo n
+        values = pd.concat([df[column] for column in columns], ignore_index=True) if columns else pd.Series([], dtype=object)
+        codes, names = pd.factorize(values)
+        self.names = [fold(name) for name in names]
+        self._names = np.array(self.names, dtype=str)
+        # Código do nome por coluna e linha (-1 = nulo)
+        self._codes = codes.reshape(len(columns), self.size) if columns else np.empty((0, self.size), dtype=np.int64)
+
+        order = np.argsort(codes, kind='stable')
+        order = order[codes[order] >= 0]
+        self._order = order % max(self.size, 1)
+        self._bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+
+        grams = {}
+        for code, name in enumerate(self.names):
+            for gram in {name[i:i + NGRAM] for i in range(len(name) - NGRAM + 1)}:
+                grams.setdefault(gram, []).append(code)
+        self._grams = {gram: np.array(codes_, dtype=np.int64) for gram, codes_ in grams.items()}
+
+    def matching_names(self, text: str) -> np.ndarray:
+        """Códigos dos nomes que contêm o texto"""
+        query = fold(text).strip()
+        if len(query) >= NGRAM:
+            postings = []
+            for gram in {query[i:i + NGRAM] for i in range(len(query) - NGRAM + 1)}:
+                if gram not in self._grams:
+                    return np.empty(0, dtype=np.int64)
+                postings.append(self._grams[gram])
+            postings.sort(key=len)
+            candidates = reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), postings)
+            # Trigramas presentes não garantem o trecho contíguo: confirma nos candidatos
+            return candidates[np.char.find(self._names[candidates], query) >= 0]
+        # Texto curto: sem trigramas, compara com todos os nomes de uma vez
+        if not len(self._names):
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(np.char.find(self._names, query) >= 0)
+
+    def search(self, text: str) -> Optional[np.ndarray]:
+        """Linhas em que algum nome indexado contém o texto; None sem busca"""
+        if not fold(text or '').strip():
+            return None
+        codes = self.matching_names(text)
+        matched_rows = int((self._bounds[codes + 1] - self._bounds[codes]).sum())
+        if matched_rows * 8 > self.size:
+            # Muitos nomes: marca os nomes e consulta o código de cada linha
+            selected = np.zeros(len(self.names) + 1, dtype=bool)
+            selected[codes] = True
+            return np.flatnonzero(selected[self._codes].any(axis=0))
+        parts = [self._order[self._bounds[code]:self._bounds[code + 1]] for code in codes]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def mask(self, text: str) -> Optional[np.ndarray]:
+        """Máscara booleana por linha (para o índice de filtros); None sem busca"""
+        return _rows_to_mask(self.search(text), self.size)
+
+def _rows_to_mask(rows: Optional[np.ndarray], size: int) -> Optional[np.ndarray]:
+    if rows is None:
+        return None
+    mask = np.zeros(size, dtype=bool)
+    mask[rows] = True
+    return mask
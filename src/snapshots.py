@@ -0,0 +1,296 @@
+"""
+Snapshots colunares dos conjuntos desnormalizados usados pelas páginas
+O job de sincronização grava arquivos Arrow versionados; as páginas leem o mais
+recente por memory-map e buscam no MongoDB só o que mudou depois dele
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from bson import ObjectId, Decimal128
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    pa = None
+
+from src.database_service import DatabaseService
+from src.database_service_provisioning import ProvisioningService
+from src.delivery_summary import changed_orders
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv('FOX_SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'fox_snapshots'))
+# Versões mantidas por conjunto (leitores antigos ainda podem estar no arquivo anterior)
+SNAPSHOT_KEEP = 3
+# Idade a partir da qual o job reconstrói o snapshot; antes disso o delta cobre
+SNAPSHOT_MAX_AGE = int(os.getenv('FOX_SNAPSHOT_MAX_AGE', 3600))
+# Folga da marca d'água para documentos gravados durante a montagem
+WATERMARK_SKEW = timedelta(minutes=1)
+
+LATEST_FILE = 'LATEST'
+META_WATERMARK = b'fox.watermark'
+META_CREATED_AT = b'fox.created_at'
+
+@dataclass
+class SnapshotSpec:
+    """Como montar um conjunto: coleção de origem, pipeline e filtros.
+
+    `match` filtra o snapshot completo; o delta usa `delta_match` (sem os
+    filtros de exclusão, para que cancelamentos substituam as linhas antigas)
+    e `exclude` ({coluna: valor}) descarta as linhas depois da mescla. `group`
+    é a coluna com o id do documento de origem: linhas do snapshot cujo
+    documento mudou são trocadas pelas linhas do delta. `delta_ids` lista
+    documentos que também entram no delta sem updatedAt próprio novo.
+    """
+    collection: str
+    pipeline: Callable[[Dict, Dict], List[Dict]]
+    group: str
+    match: Dict = field(default_factory=dict)
+    delta_match: Dict = field(default_factory=dict)
+    exclude: Dict[str, Any] = field(default_factory=dict)
+    drop: List[str] = field(default_factory=list)
+    frame: Optional[Callable[[List[Dict]], pd.DataFrame]] = None
+    delta_ids: Optional[Callable[[Dict, datetime], List]] = None
+
+def _cargas_pipeline(collections, match):
+    return DatabaseService(collections).build_tickets_pipeline(match)
+
+def _contratos_pipeline(collections, match):
+    return DatabaseService(collections).build_contracts_pipeline(match, include_canceled=True)
+
+def _provisionamentos_pipeline(collections, match):
+    return ProvisioningService(collections).build_simple_provisionings_pipeline(match)
+
+def _finances_pipeline(collections, match):
+    return DatabaseService(collections).build_finances_pipeline(match)
+
+SNAPSHOTS = {
+    'cargas': SnapshotSpec(
+        collection='ticketv2',
+        pipeline=_cargas_pipeline,
+        group='_id',
+        match={"loadingDate": {"$gte": datetime(2025, 1, 1)}, "status": {"$ne": "Cancelado"}},
+        delta_match={"loadingDate": {"$gte": datetime(2025, 1, 1)}},
+        exclude={'status': 'Cancelado'},
+        drop=['buyer_info', 'seller_info', 'driver_info', 'grain_info',
+              'destination_order_info', 'origin_order_info', 'matching_provisionings']
+    ),
+    'contratos': SnapshotSpec(
+        collection='orderv2',
+        pipeline=_contratos_pipeline,
+        group='_id',
+        exclude={'isCanceled': True},
+        # Contratos com entregas recalculadas no resumo desde o snapshot
+        delta_ids=changed_orders,
+        drop=['tickets', 'buyer_info', 'seller_info', 'grain_info', 'destOrderList', 'origOrderList']
+    ),
+    'provisionamentos': SnapshotSpec(
+        collection='provisionings',
+        pipeline=_provisionamentos_pipeline,
+        group='destinationOrder',
+        frame=ProvisioningService.simple_provisionings_frame
+    ),
+    'finances': SnapshotSpec(
+        collection='finances',
+        pipeline=_finances_pipeline,
+        group='_id',
+        match={"isFuturo": {"$ne": True}, "isIgnored": {"$ne": True}},
+        exclude={'isFuturo': True, 'isIgnored': True}
+    )
+}
+
+def _normalize(value):
+    """Valores do BSON em tipos que o Arrow entende; aninhados viram JSON"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return value
+
+def documents_to_frame(name: str, documents: List[Dict]) -> pd.DataFrame:
+    """Resultados do pipeline no formato do snapshot (mesmo para o delta)"""
+    spec = SNAPSHOTS[name]
+    if spec.frame is not None:
+        return spec.frame(documents)
+    if not documents:
+        return pd.DataFrame()
+    rows = [
+        {key: _normalize(value) for key, value in doc.items() if key not in spec.drop}
+        for doc in documents
+    ]
+    return pd.DataFrame(rows)
+
+def to_arrow(df: pd.DataFrame):
+    """DataFrame -> tabela Arrow; colunas com tipos misturados viram texto"""
+    arrays, names = [], []
+    for column in df.columns:
+        series = df[column]
+        try:
+            array = pa.array(series, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            array = pa.array(series.map(lambda v: None if pd.isna(v) else str(v)), type=pa.string())
+        arrays.append(array)
+        names.append(str(column))
+    return pa.Table.from_arrays(arrays, names=names)
+
+def _dataset_dir(name: str, directory: str) -> str:
+    return os.path.join(directory, name)
+
+def latest_snapshot_path(name: str, directory: str = SNAPSHOT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(_dataset_dir(name, directory), LATEST_FILE)) as f:
+            path = os.path.join(_dataset_dir(name, directory), f.read().strip())
+        return path if os.path.exists(path) else None
+    except OSError:
+        return None
+
+def write_snapshot(name: str, df: pd.DataFrame, watermark: datetime,
+                   directory: str = SNAPSHOT_DIR) -> str:
+    """Grava uma nova versão e aponta LATEST para ela (troca atômica)"""
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow não instalado. Execute: pip install pyarrow")
+
+    dataset_dir = _dataset_dir(name, directory)
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    table = to_arrow(df).replace_schema_metadata({
+        META_WATERMARK: watermark.isoformat().encode(),
+        META_CREATED_AT: datetime.now().isoformat().encode()
+    })
+
+    # IPC sem compressão: o leitor mapeia o arquivo em memória sem decodificar
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d%H%M%S%f')}.arrow"
+    fd, tmp_path = tempfile.mkstemp(dir=dataset_dir, suffix='.tmp')
+    os.close(fd)
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, os.path.join(dataset_dir, filename))
+
+    fd, tmp_path = tempfile.mkstemp(dir=dataset_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(filename)
+    os.replace(tmp_path, os.path.join(dataset_dir, LATEST_FILE))
+
+    _prune(dataset_dir, name)
+    return os.path.join(dataset_dir, filename)
+
+def _prune(dataset_dir: str, name: str):
+    versions = sorted(f for f in os.listdir(dataset_dir) if f.startswith(f"{name}-") and f.endswith('.arrow'))
+    for old in versions[:-SNAPSHOT_KEEP]:
+        try:
+            os.remove(os.path.join(dataset_dir, old))
+        except OSError:
+            pass
+
+def build_snapshot(name: str, collections, directory: str = SNAPSHOT_DIR) -> int:
+    """Executa o pipeline completo do conjunto e grava um novo snapshot"""
+    spec = SNAPSHOTS[name]
+    watermark = datetime.utcnow() - WATERMARK_SKEW
+    pipeline = spec.pipeline(collections, dict(spec.match))
+    documents = list(collections[spec.collection].aggregate(pipeline, allowDiskUse=True))
+    df = documents_to_frame(name, documents)
+    write_snapshot(name, df, watermark, directory)
+    return len(df)
+
+def load_snapshot_table(name: str, directory: str = SNAPSHOT_DIR):
+    """(tabela Arrow, marca d'água) do snapshot mais recente.
+
+    A tabela aponta direto para o arquivo mapeado em memória (sem cópia);
+    o mapeamento vive enquanto a tabela for referenciada.
+    """
+    if not PYARROW_AVAILABLE:
+        return None
+    path = latest_snapshot_path(name, directory)
+    if path is None:
+        return None
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        metadata = table.schema.metadata or {}
+        watermark = datetime.fromisoformat(metadata[META_WATERMARK].decode())
+        return table, watermark
+    except Exception as e:
+        logger.warning(f"⚠️ Snapshot {name} ilegível: {str(e)}")
+        return None
+
+def load_snapshot(name: str, directory: str = SNAPSHOT_DIR) -> Optional[Tuple[pd.DataFrame, datetime]]:
+    """(dados, marca d'água) do snapshot mais recente, lido por memory-map"""
+    loaded = load_snapshot_table(name, directory)
+    if loaded is None:
+        return None
+    table, watermark = loaded
+    return table.to_pandas(), watermark
+
+def snapshot_age(name: str, directory: str = SNAPSHOT_DIR) -> Optional[float]:
+    """Segundos desde a gravação do snapshot mais recente (None se não houver)"""
+    path = latest_snapshot_path(name, directory)
+    return time.time() - os.path.getmtime(path) if path else None
+
+def merge_delta(name: str, snapshot: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Troca as linhas dos documentos alterados pelas do delta e aplica a exclusão"""
+    spec = SNAPSHOTS[name]
+    df = snapshot
+    if not delta.empty:
+        if spec.group in df.columns and spec.group in delta.columns:
+            df = df[~df[spec.group].isin(delta[spec.group])]
+        df = pd.concat([df, delta], ignore_index=True)
+    for column, value in spec.exclude.items():
+        if column in df.columns:
+            df = df[df[column].ne(value)]
+    return df.reset_index(drop=True)
+
+def load_delta(name: str, collections, watermark: datetime) -> pd.DataFrame:
+    """Linhas dos documentos alterados a partir da marca d'água"""
+    spec = SNAPSHOTS[name]
+    match = dict(spec.delta_match or spec.match)
+    match["updatedAt"] = {"$gte": watermark}
+    ids = spec.delta_ids(collections, watermark) if spec.delta_ids else []
+    if ids:
+        changed = match.pop("updatedAt")
+        match["$or"] = [{"updatedAt": changed}, {"_id": {"$in": ids}}]
+    documents = list(collections[spec.collection].aggregate(spec.pipeline(collections, match)))
+    return documents_to_frame(name, documents)
+
+def load_dataset(name: str, collections, directory: str = SNAPSHOT_DIR) -> Optional[pd.DataFrame]:
+    """Snapshot mais recente + documentos alterados depois dele.
+
+    Retorna None quando não há snapshot; a página usa a consulta completa.
+    Alterações só em coleções de lookup (nomes, preços) e exclusões físicas
+    aparecem a partir do próximo snapshot.
+    """
+    loaded = load_snapshot(name, directory)
+    if loaded is None:
+        return None
+    snapshot, watermark = loaded
+    return merge_delta(name, snapshot, load_delta(name, collections, watermark))
+
+def build_stale_snapshots(collections, max_age: int = SNAPSHOT_MAX_AGE,
+                          directory: str = SNAPSHOT_DIR) -> Dict[str, int]:
+    """Reconstrói os snapshots ausentes ou mais velhos que max_age; {nome: linhas}"""
+    if directory == SNAPSHOT_DIR and not os.getenv('FOX_SNAPSHOT_DIR'):
+        logger.warning("⚠️ FOX_SNAPSHOT_DIR não definido: snapshots no diretório temporário do pod, "
+                       "invisíveis para os pods do app (monte o volume compartilhado)")
+    built = {}
+    for name in SNAPSHOTS:
+        age = snapshot_age(name, directory)
+        if age is not None and age < max_age:
+            continue
+        try:
+            built[name] = build_snapshot(name, collections, directory)
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao gerar snapshot {name}: {str(e)}")
+    return built
@@ -0,0 +1,608 @@
+"""
+Pipeline de sincronização MongoDB -> PostgreSQL por entidade
+Cada entidade tem seu extrator, sua tabela e sua marca d'água (updatedAt),
+e as entidades rodam em paralelo para que uma lenta não atrase as outras
+"""
+import functools
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, date
+from typing import Callable, Dict, List, Optional, Any, Iterable
+
+from bson import ObjectId
+
+from config.postgres import get_postgres_connection
+from src.dead_letter import DeadLetterQueue, from_row_failures, from_transform_failures
+from src.database_service import DatabaseService
+from src.database_service_provisioning import ProvisioningService
+from src.delivery_summary import changed_orders
+from src.pg_partitions import ensure_cargas_partitioned, ensure_month_partitions, month_start, partition_for
+from src.pg_rollups import ensure_rollup, refresh_rollup, drop_retired_rollups
+from src.pg_schema import (
+    PROVISIONINGS_TABLE_DDL, FINANCES_TABLE_DDL, CONTRATOS_TABLE_DDL, CONTRATOS_MIGRATIONS,
+    SYNC_WATERMARKS_DDL, ROLLUP_DIRTY_DAYS_DDL, CARGAS_LEGACY_KEYS_SQL
+)
+
+logger = logging.getLogger(__name__)
+
+# Cargas anteriores a esta data não são replicadas (mesmo corte das páginas)
+SYNC_START_DATE = datetime(2025, 1, 1)
+
+# Linhas por INSERT multi-valores (limite de parâmetros do protocolo é 32767)
+UPSERT_CHUNK_SIZE = 500
+
+# Documentos por lote lido do cursor e lotes aguardando carga (backpressure)
+STREAM_BATCH_SIZE = 500
+STREAM_MAX_PENDING = 4
+
+@dataclass
+class EntitySync:
+    """Definição da sincronização de uma entidade"""
+    name: str
+    table: str
+    key: str
+    columns: List[str]
+    ddl: List[str]
+    extract: Callable[..., Iterable[Dict]]
+    to_row: Callable[[Dict], tuple]
+    # Chave da linha -> _id do documento de origem no MongoDB
+    source_id: Callable[[str], str] = str
+    # Tabelas particionadas por mês: coluna de partição
+    partition_column: Optional[str] = None
+    # Preparo do esquema após o DDL (partições, agregados e gatilhos)
+    prepare: Optional[Callable[[Any], None]] = None
+    # Executado após cada gravação confirmada (ex.: atualizar agregados)
+    after_sync: Optional[Callable[[Any], None]] = None
+    # Executado na transação da carga completa (sem marca d'água), antes das linhas
+    on_full_load: Optional[Callable[[Any], None]] = None
+
+@dataclass
+class SyncResult:
+    """Resultado da sincronização de uma entidade"""
+    entity: str
+    success: bool
+    rows: int = 0
+    dead_letters: int = 0
+    elapsed: float = 0.0
+    watermark: Optional[datetime] = None
+    error: Optional[str] = None
+
+def _num(value) -> float:
+    """Converte valor numérico do MongoDB para float (0 quando ausente)"""
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def _int(value) -> Optional[int]:
+    """Converte para inteiro quando possível"""
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _oid(value) -> Optional[str]:
+    """Converte ObjectId para string"""
+    return str(value) if value is not None else None
+
+def _int_to_date(value) -> Optional[date]:
+    """Converte o campo date inteiro (YYYYMMDD) dos lançamentos financeiros"""
+    try:
+        value = int(value)
+        return date(value // 10000, value // 100 % 100, value % 100)
+    except (TypeError, ValueError):
+        return None
+
+def _since_match(match: Dict, since: Optional[datetime], ids: Optional[List] = None) -> Dict:
+    """Acrescenta o filtro de marca d'água (ou de ids específicos) ao $match"""
+    match = dict(match)
+    if ids is not None:
+        match["_id"] = {"$in": [ObjectId(i) if ObjectId.is_valid(i) else i for i in ids]}
+    elif since:
+        # $gte: documentos com o mesmo updatedAt da marca podem não ter sido lidos ainda
+        match["updatedAt"] = {"$gte": since}
+    return match
+
+# ---------------------------------------------------------------------------
+# Extratores
+# ---------------------------------------------------------------------------
+
+def _extract_cargas(collections: Dict, since: Optional[datetime],
+                    ids: Optional[List] = None) -> Iterable[Dict]:
+    """Tickets por transação, sem filtro de status para propagar cancelamentos"""
+    service = DatabaseService(collections)
+    match = _since_match({"loadingDate": {"$gte": SYNC_START_DATE}}, since, ids)
+    return collections['ticketv2'].aggregate(service.build_tickets_pipeline(match),
+                                             allowDiskUse=True, batchSize=STREAM_BATCH_SIZE)
+
+def _row_key_source_id(key: str) -> str:
+    """Chaves compostas '<_id>:<índice>' apontam para o documento <_id>"""
+    return key.split(':')[0]
+
+def _prepare_cargas(cursor):
+    ensure_cargas_partitioned(cursor, SYNC_START_DATE)
+    ensure_rollup(cursor, 'cargas')
+
+def _drop_legacy_cargas(cursor):
+    """Remove linhas com a chave antiga (só o _id); a carga completa as regrava por transação"""
+    cursor.execute(f"DELETE FROM cargas WHERE {CARGAS_LEGACY_KEYS_SQL}")
+
+def _carga_row(doc: Dict) -> tuple:
+    return (
+        f"{doc['_id']}:{doc.get('transaction_index', 0)}",
+        _int(doc.get('ticket')),
+        _num(doc.get('amount')),
+        doc.get('loadingDate'),
+        doc.get('status') or '',
+        bool(doc.get('paid', False)),
+        doc.get('buyer_name') or '',
+        doc.get('seller_name') or '',
+        doc.get('driver_name') or '',
+        doc.get('grain_name') or '',
+        doc.get('contract_type') or '',
+        doc.get('provisioning_status') or '',
+        _oid(doc.get('originOrder')),
+        _oid(doc.get('destinationOrder')),
+        _num(doc.get('revenue_value')),
+        _num(doc.get('cost_value')),
+        _num(doc.get('total_freight_value')),
+        _num(doc.get('gross_profit')),
+        doc.get('updatedAt')
+    )
+
+def _extract_provisionings(collections: Dict, since: Optional[datetime],
+                           ids: Optional[List] = None) -> Iterable[Dict]:
+    """Provisionamentos com sellersOrders desdobradas"""
+    service = ProvisioningService(collections)
+    pipeline = service.build_sellers_orders_pipeline(_since_match({}, since, ids))
+    return collections['provisionings'].aggregate(pipeline, allowDiskUse=True, batchSize=STREAM_BATCH_SIZE)
+
+def _provisioning_row(doc: Dict) -> tuple:
+    return (
+        f"{doc.get('provisioning_id')}:{doc.get('originOrder')}",
+        _oid(doc.get('provisioning_id')),
+        _oid(doc.get('originOrder')),
+        doc.get('buyer_name') or '',
+        doc.get('seller_name') or '',
+        doc.get('grain_name') or '',
+        doc.get('provisioning_type') or '',
+        _num(doc.get('amount')),
+        _num(doc.get('amountRemaining')),
+        _num(doc.get('bagPrice')),
+        doc.get('destination_bagPrice'),
+        doc.get('origin_bagPrice'),
+        doc.get('deliveryDeadline'),
+        doc.get('createdAt'),
+        doc.get('updatedAt')
+    )
+
+def _extract_finances(collections: Dict, since: Optional[datetime],
+                      ids: Optional[List] = None) -> Iterable[Dict]:
+    """Lançamentos financeiros com categorias resolvidas"""
+    service = DatabaseService(collections)
+    pipeline = service.build_finances_pipeline(_since_match({}, since, ids))
+    return collections['finances'].aggregate(pipeline, allowDiskUse=True, batchSize=STREAM_BATCH_SIZE)
+
+
+def _finance_row(doc: Dict) -> tuple:
+    return (
+        _oid(doc.get('_id')),
+        _int_to_date(doc.get('date')),
+        _num(doc.get('value')),
+        doc.get('category_name') or '',
+        doc.get('category_item') or '',
+        doc.get('category_type') or '',
+        doc.get('category_dfc') or '',
+        doc.get('user_name') or '',
+        doc.get('description') or '',
+        bool(doc.get('isIgnored', False)),
+        bool(doc.get('isFuturo', False)),
+        doc.get('updatedAt')
+    )
+
+def _extract_contratos(collections: Dict, since: Optional[datetime],
+                       ids: Optional[List] = None) -> Iterable[Dict]:
+    """Contratos (orderv2), incluindo cancelados"""
+    service = DatabaseService(collections)
+    match = _since_match({}, since, ids)
+    if since and ids is None:
+        # Contratos sem alteração própria, mas com entregas recalculadas no resumo
+        match = {"$or": [match, {"_id": {"$in": changed_orders(collections, since)}}]}
+    pipeline = service.build_contracts_pipeline(match, include_canceled=True)
+    return collections['orderv2'].aggregate(pipeline, allowDiskUse=True, batchSize=STREAM_BATCH_SIZE)
+
+def _contrato_row(doc: Dict) -> tuple:
+    return (
+        _oid(doc.get('_id')),
+        doc.get('createdAt'),
+        doc.get('buyer_name') or '',
+        doc.get('seller_name') or '',
+        doc.get('grain_name') or '',
+        doc.get('contract_type') or '',
+        doc.get('direction_type') or '',
+        doc.get('status_display') or '',
+        _num(doc.get('amount')),
+        _num(doc.get('amountOrderedSafe')),
+        _num(doc.get('bagPrice')),
+        _int(doc.get('paymentDaysSafe')) or 0,
+        doc.get('loadingDate'),
+        doc.get('deliveryDate'),
+        doc.get('pis_status') or '',
+        _num(doc.get('pis_cofins_value')),
+        _num(doc.get('deliveredBags')),
+        _num(doc.get('remainingBags')),
+        bool(doc.get('deliveryDivergence', False)),
+        doc.get('updatedAt')
+    )
+
+ENTITIES = [
+    EntitySync(
+        name='cargas',
+        table='cargas',
+        key='ticket_id',
+        columns=[
+            'ticket_id', 'ticket_number', 'amount', 'loading_date', 'status', 'paid',
+            'buyer_name', 'seller_name', 'driver_name', 'grain_name', 'contract_type',
+            'provisioning_status', 'origin_order', 'destination_order',
+            'receita', 'custo', 'frete', 'lucro_bruto', 'source_updated_at'
+        ],
+        ddl=[],
+        extract=_extract_cargas,
+        to_row=_carga_row,
+        source_id=_row_key_source_id,
+        partition_column='loading_date',
+        prepare=_prepare_cargas,
+        after_sync=functools.partial(refresh_rollup, key='cargas'),
+        on_full_load=_drop_legacy_cargas
+    ),
+    EntitySync(
+        name='provisionings',
+        table='provisionings',
+        key='id',
+        columns=[
+            'id', 'provisioning_id', 'origin_order', 'buyer_name', 'seller_name', 'grain_name',
+            'provisioning_type', 'amount', 'amount_remaining', 'bag_price',
+            'destination_bag_price', 'origin_bag_price', 'delivery_deadline', 'created_at',
+            'source_updated_at'
+        ],
+        ddl=[PROVISIONINGS_TABLE_DDL],
+        extract=_extract_provisionings,
+        to_row=_provisioning_row,
+        source_id=_row_key_source_id
+    ),
+    EntitySync(
+        name='finances',
+        table='finances',
+        key='id',
+        columns=[
+            'id', 'entry_date', 'value', 'category_name', 'category_item', 'category_type',
+            'category_dfc', 'user_name', 'description', 'is_ignored', 'is_futuro',
+            'source_updated_at'
+        ],
+        ddl=[FINANCES_TABLE_DDL],
+        extract=_extract_finances,
+        to_row=_finance_row,
+        prepare=functools.partial(ensure_rollup, key='finances_monthly'),
+        after_sync=functools.partial(refresh_rollup, key='finances_monthly')
+    ),
+    EntitySync(
+        name='contratos',
+        table='contratos',
+        key='id',
+        columns=[
+            'id', 'created_at', 'buyer_name', 'seller_name', 'grain_name', 'contract_type',
+            'direction_type', 'status_display', 'amount', 'amount_ordered', 'bag_price',
+            'payment_days', 'loading_date', 'delivery_date', 'pis_status', 'pis_cofins_value',
+            'delivered_bags', 'remaining_bags', 'delivery_divergence', 'source_updated_at'
+        ],
+        ddl=[CONTRATOS_TABLE_DDL, *CONTRATOS_MIGRATIONS],
+        extract=_extract_contratos,
+        to_row=_contrato_row
+    )
+]
+
+ENTITIES_BY_NAME = {entity.name: entity for entity in ENTITIES}
+
+# ---------------------------------------------------------------------------
+# Carga no PostgreSQL
+# ---------------------------------------------------------------------------
+
+def _insert_chunks(cursor, table: str, columns: List[str], rows: List[tuple], suffix: str = ""):
+    """INSERT multi-valores em blocos de UPSERT_CHUNK_SIZE linhas"""
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES {', '.join([placeholders] * len(chunk))} {suffix}"
+        )
+        cursor.execute(sql, [value for row in chunk for value in row])
+
+def _replace_partitioned(cursor, entity: EntitySync, rows: List[tuple]) -> int:
+    """Regrava linhas de tabela particionada direto nas partições de destino.
+
+    As versões anteriores são apagadas pela chave em todas as partições, já que
+    a data pode ter mudado e levado a linha para outro mês.
+    """
+    key_index = entity.columns.index(entity.key)
+    date_index = entity.columns.index(entity.partition_column)
+
+    by_partition = defaultdict(list)
+    for row in rows:
+        by_partition[partition_for(entity.table, row[date_index])].append(row)
+    ensure_month_partitions(cursor, entity.table,
+                            [month_start(row[date_index]) for row in rows if row[date_index]])
+
+    cursor.execute(f"DELETE FROM {entity.table} WHERE {entity.key} = ANY(%s)",
+                   ([row[key_index] for row in rows],))
+    for partition, partition_rows in by_partition.items():
+        _insert_chunks(cursor, partition, entity.columns, partition_rows)
+
+    return len(rows)
+
+def upsert_rows(cursor, entity: EntitySync, rows: List[tuple]) -> int:
+    """Grava linhas com INSERT multi-valores ... ON CONFLICT DO UPDATE"""
+    if not rows:
+        return 0
+
+    if entity.partition_column:
+        return _replace_partitioned(cursor, entity, rows)
+
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in entity.columns if col != entity.key)
+    _insert_chunks(cursor, entity.table, entity.columns, rows,
+                   f"ON CONFLICT ({entity.key}) DO UPDATE SET {updates}, synced_at = CURRENT_TIMESTAMP")
+    return len(rows)
+
+def upsert_batch_with_fallback(cursor, entity: EntitySync, batch: List[tuple]):
+    """Grava o lote; se falhar, divide ao meio até isolar as linhas com erro.
+
+    Uma linha ruim custa O(log n) comandos extras em vez de regravar o lote
+    linha a linha. Retorna (linhas gravadas, [(linha, exceção), ...]).
+    """
+    failures = []
+    inserted = _upsert_isolating(cursor, entity, batch, failures)
+    return inserted, failures
+
+def _upsert_isolating(cursor, entity: EntitySync, batch: List[tuple], failures: List) -> int:
+    if not batch:
+        return 0
+
+    cursor.execute("SAVEPOINT sync_batch")
+    try:
+        count = upsert_rows(cursor, entity, batch)
+        cursor.execute("RELEASE SAVEPOINT sync_batch")
+        return count
+    except Exception as batch_error:
+        cursor.execute("ROLLBACK TO SAVEPOINT sync_batch")
+        if len(batch) == 1:
+            failures.append((batch[0], batch_error))
+            return 0
+
+    middle = len(batch) // 2
+    return (_upsert_isolating(cursor, entity, batch[:middle], failures)
+            + _upsert_isolating(cursor, entity, batch[middle:], failures))
+
+class BatchStream:
+    """Transforma documentos do cursor em lotes numa thread produtora.
+
+    Os lotes passam por uma fila limitada: quando a carga no PostgreSQL fica
+    para trás, o produtor bloqueia e deixa de ler o cursor, então a memória
+    fica limitada a ``max_pending`` lotes independentemente do volume.
+    """
+
+    _END = object()
+
+    def __init__(self, docs: Iterable[Dict], to_row: Callable[[Dict], Any],
+                 batch_size: int = STREAM_BATCH_SIZE, max_pending: int = STREAM_MAX_PENDING,
+                 watermark_field: str = 'updatedAt'):
+        self.docs = docs
+        self.to_row = to_row
+        self.batch_size = batch_size
+        self.watermark_field = watermark_field
+        self.watermark = None
+        self.error = None
+        # Documentos que falharam na conversão para linha: (documento, exceção)
+        self.transform_failures = []
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop = threading.Event()
+
+    def _put(self, item) -> bool:
+        """Enfileira respeitando o limite; desiste se o consumidor parou"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            batch = []
+            for doc in self.docs:
+                try:
+                    batch.append(self.to_row(doc))
+                except Exception as transform_error:
+                    self.transform_failures.append((doc, transform_error))
+                    continue
+                updated_at = doc.get(self.watermark_field)
+                if updated_at and (self.watermark is None or updated_at > self.watermark):
+                    self.watermark = updated_at
+                if len(batch) >= self.batch_size:
+                    if not self._put(batch):
+                        return
+                    batch = []
+            if batch:
+                self._put(batch)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self._END)
+
+    def __iter__(self):
+        producer = threading.Thread(target=self._produce, name="sync-extract", daemon=True)
+        producer.start()
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is self._END:
+                    break
+                yield batch
+        finally:
+            self._stop.set()
+            producer.join()
+
+        if self.error:
+            raise self.error
+
+def run_after_sync(connection, entity: EntitySync) -> bool:
+    """Executa o pós-processamento da entidade numa transação própria.
+
+    Falhas aqui não desfazem a carga já confirmada; ficam só no log.
+    """
+    if not entity.after_sync:
+        return True
+
+    cursor = connection.cursor()
+    try:
+        entity.after_sync(cursor)
+        connection.commit()
+        return True
+    except Exception as e:
+        connection.rollback()
+        logger.warning(f"⚠️ [{entity.name}] erro no pós-processamento: {str(e)}")
+        return False
+    finally:
+        cursor.close()
+
+def get_watermark(cursor, entity_name: str) -> Optional[datetime]:
+    """Retorna o maior updatedAt já sincronizado para a entidade"""
+    cursor.execute("SELECT last_updated_at FROM sync_watermarks WHERE entity = %s", (entity_name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def save_watermark(cursor, entity_name: str, watermark: Optional[datetime], rows: int):
+    """Avança a marca d'água da entidade (nunca retrocede)"""
+    cursor.execute("""
+        INSERT INTO sync_watermarks (entity, last_updated_at, last_run_at, rows_synced)
+        VALUES (%s, %s, CURRENT_TIMESTAMP, %s)
+        ON CONFLICT (entity) DO UPDATE SET
+            last_updated_at = GREATEST(sync_watermarks.last_updated_at, EXCLUDED.last_updated_at),
+            last_run_at = EXCLUDED.last_run_at,
+            rows_synced = EXCLUDED.rows_synced
+    """, (entity_name, watermark, rows))
+
+def prepare_entity(cursor, entity: EntitySync):
+    """DDL da tabela e preparo do esquema (partições, agregados e gatilhos)"""
+    for ddl in entity.ddl:
+        cursor.execute(ddl)
+    if entity.prepare:
+        entity.prepare(cursor)
+
+def sync_entity(entity: EntitySync, collections: Dict, full: bool = False,
+                prepared: bool = False) -> SyncResult:
+    """Extrai a entidade a partir da sua marca d'água e grava na sua tabela.
+
+    `prepared`: o esquema já foi preparado por run_parallel_sync antes dos workers.
+    """
+    start_time = time.time()
+    connection = None
+
+    try:
+        connection = get_postgres_connection()
+        cursor = connection.cursor()
+
+        if not prepared:
+            prepare_entity(cursor, entity)
+            connection.commit()
+
+        since = None if full else get_watermark(cursor, entity.name)
+        logger.info(f"🔄 [{entity.name}] extraindo a partir de {since or 'início'}")
+        if since is None and entity.on_full_load:
+            entity.on_full_load(cursor)
+
+        # Lotes são gravados à medida que chegam; o commit único no final mantém
+        # a marca d'água consistente com o que foi efetivamente gravado
+        # Linhas com erro vão para sync_dead_letter em vez de derrubar a entidade
+        stream = BatchStream(entity.extract(collections, since), entity.to_row)
+        dead_letters = DeadLetterQueue(connection)
+        rows = 0
+        failed = 0
+        for batch in stream:
+            inserted, row_failures = upsert_batch_with_fallback(cursor, entity, batch)
+            rows += inserted
+            failed += dead_letters.record(from_row_failures(entity, row_failures), cursor)
+        failed += dead_letters.record(from_transform_failures(entity, stream.transform_failures), cursor)
+
+        watermark = max(filter(None, [since, stream.watermark]), default=None)
+        save_watermark(cursor, entity.name, watermark, rows)
+        connection.commit()
+        cursor.close()
+
+        # Sempre: também recalcula dias pendentes de uma execução anterior que falhou
+        run_after_sync(connection, entity)
+
+        return SyncResult(entity.name, True, rows, failed, time.time() - start_time, watermark)
+
+    except Exception as e:
+        logger.error(f"❌ [{entity.name}] erro na sincronização: {str(e)}")
+        if connection:
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+        return SyncResult(entity.name, False, elapsed=time.time() - start_time, error=str(e))
+
+    finally:
+        if connection:
+            connection.close()
+
+def run_parallel_sync(collections: Dict, entities: Optional[List[EntitySync]] = None,
+                      max_workers: Optional[int] = None, full: bool = False) -> Dict[str, SyncResult]:
+    """Sincroniza as entidades em paralelo; cada uma confirma sua própria transação"""
+    entities = entities or ENTITIES
+    results = {}
+
+    # Todo o DDL (tabelas de controle, tabelas das entidades, agregados e
+    # gatilhos) roda em sequência antes de abrir os workers: DDL concorrente
+    # num banco novo conflita (CREATE ... IF NOT EXISTS não é atômico)
+    ready = []
+    connection = get_postgres_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(SYNC_WATERMARKS_DDL)
+        cursor.execute(ROLLUP_DIRTY_DAYS_DDL)
+        drop_retired_rollups(cursor)
+        DeadLetterQueue(connection).ensure_table()
+        connection.commit()
+        for entity in entities:
+            start_time = time.time()
+            try:
+                prepare_entity(cursor, entity)
+                connection.commit()
+                ready.append(entity)
+            except Exception as e:
+                connection.rollback()
+                logger.error(f"❌ [{entity.name}] erro ao preparar o esquema: {str(e)}")
+                results[entity.name] = SyncResult(entity.name, False, elapsed=time.time() - start_time, error=str(e))
+        cursor.close()
+    finally:
+        connection.close()
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(entities), thread_name_prefix="sync") as executor:
+        futures = [executor.submit(sync_entity, entity, collections, full, True) for entity in ready]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.entity] = result
+            if result.success:
+                logger.info(f"✅ [{result.entity}] {result.rows} linhas em {result.elapsed:.1f}s"
+                            f" ({result.dead_letters} na dead-letter)")
+            else:
+                logger.warning(f"⚠️ [{result.entity}] falhou em {result.elapsed:.1f}s: {result.error}")
+
+    return results
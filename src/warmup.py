@@ -0,0 +1,118 @@
+"""
+Aquecimento dos caches das páginas
+Na subida do pod scripts/warmup.py enche o cache compartilhado (Redis) antes
+do Streamlit; dentro do processo do servidor, a primeira sessão dispara
+warm_in_background() para encher o st.cache_data e o versioned_cache, que são
+por processo. Depois de cada página renderizada, as próximas prováveis são
+pré-carregadas numa thread em segundo plano
+"""
+import importlib
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Menu do app: rótulo -> módulo da página (cada módulo expõe prefetch())
+PAGES = {
+    "🚚 Cargas": "pages.cargas",
+    "📦 Provisionamento": "pages.provisionamento",
+    "💰 Financeiro": "pages.financeiro",
+    "📋 Contratos": "pages.contratos",
+    "🗺️ Mapa": "pages.mapa"
+}
+
+# Próximas páginas mais comuns enquanto não há navegação registrada
+NEXT_PAGES = {
+    "🚚 Cargas": ["📦 Provisionamento", "📋 Contratos"],
+    "📦 Provisionamento": ["🚚 Cargas", "📋 Contratos"],
+    "💰 Financeiro": ["📋 Contratos", "🚚 Cargas"],
+    "📋 Contratos": ["🚚 Cargas", "💰 Financeiro"],
+    "🗺️ Mapa": ["🚚 Cargas", "📋 Contratos"]
+}
+
+# Intervalo mínimo entre duas pré-cargas da mesma página (o cache já está quente)
+PREFETCH_COOLDOWN = 60
+
+_transitions: Dict[str, Counter] = defaultdict(Counter)
+_last_prefetch: Dict[str, float] = {}
+_running = set()
+_process_warmup: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+def warm_page(label: str) -> bool:
+    """Executa o prefetch() da página; False se falhar"""
+    try:
+        module = importlib.import_module(PAGES[label])
+        module.prefetch()
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao aquecer {label}: {str(e)}")
+        return False
+
+def warm_all() -> Dict[str, float]:
+    """Aquece todas as páginas em sequência; {rótulo: segundos} das que deram certo"""
+    timings = {}
+    for label in PAGES:
+        start = time.time()
+        if warm_page(label):
+            timings[label] = time.time() - start
+            logger.info(f"🔥 {label} aquecida em {timings[label]:.1f}s")
+    return timings
+
+def warm_in_background() -> threading.Thread:
+    """Aquece todas as páginas numa thread daemon, uma única vez por processo.
+
+    Chamadas seguintes devolvem a mesma thread (viva ou já concluída).
+    """
+    global _process_warmup
+    with _lock:
+        if _process_warmup is None:
+            _process_warmup = threading.Thread(target=warm_all, name="warmup-process", daemon=True)
+            _process_warmup.start()
+        return _process_warmup
+
+def record_visit(previous: Optional[str], current: str):
+    """Registra a navegação entre páginas (alimenta likely_next)"""
+    if previous and previous != current:
+        with _lock:
+            _transitions[previous][current] += 1
+
+def likely_next(current: str, k: int = 2) -> List[str]:
+    """Páginas mais prováveis depois de `current`: navegação observada, depois o padrão"""
+    with _lock:
+        observed = [label for label, _ in _transitions[current].most_common() if label in PAGES]
+    ranked = observed + [label for label in NEXT_PAGES.get(current, []) if label not in observed]
+    return [label for label in ranked if label != current][:k]
+
+def prefetch_async(labels: List[str]) -> Optional[threading.Thread]:
+    """Pré-carrega as páginas numa thread daemon.
+
+    Páginas já em pré-carga ou aquecidas há menos de PREFETCH_COOLDOWN
+    segundos são ignoradas; None quando não sobra nada para carregar.
+    """
+    now = time.time()
+    with _lock:
+        pending = [
+            label for label in labels
+            if label in PAGES and label not in _running
+            and now - _last_prefetch.get(label, 0) >= PREFETCH_COOLDOWN
+        ]
+        _running.update(pending)
+    if not pending:
+        return None
+
+    def run():
+        for label in pending:
+            try:
+                warm_page(label)
+            finally:
+                with _lock:
+                    _running.discard(label)
+                    _last_prefetch[label] = time.time()
+
+    thread = threading.Thread(target=run, name="prefetch-pages", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,147 @@
+"""
+Teste das versões de cache por conjunto de dados
+Coleções falsas e cache em diretório temporário, sem MongoDB
+"""
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+import src.cache_versions as cache_versions
+from src.cache_versions import CacheVersionService, DATASET_COLLECTIONS, versioned_cache, ensure_probe_indexes
+import src.query_cache as query_cache
+from src.query_cache import QueryCache, DiskCacheBackend, fingerprint, stale_while_revalidate
+
+class FakeCollection:
+    """Subconjunto da interface do pymongo usado pela sonda"""
+
+    def __init__(self):
+        self.docs = []
+        self.indexes = []
+
+    def create_index(self, keys):
+        self.indexes.append(keys)
+
+    def estimated_document_count(self):
+        return len(self.docs)
+
+    def find_one(self, filter, projection, sort):
+        docs = [doc for doc in self.docs if doc.get('updatedAt') is not None]
+        return max(docs, key=lambda doc: doc['updatedAt']) if docs else None
+
+def _collections():
+    names = {name for names in DATASET_COLLECTIONS.values() for name in names}
+    return {name: FakeCollection() for name in names}
+
+def test_version_changes_with_data():
+    """Versão só muda quando as coleções do conjunto mudam"""
+    print("🔄 Testando sonda de versões...")
+    collections = _collections()
+    cache = QueryCache(DiskCacheBackend(tempfile.mkdtemp()))
+    service = CacheVersionService(collections, cache)
+    now = datetime(2025, 6, 1)
+
+    # Primeira sondagem só registra a assinatura
+    assert service.check_all() == []
+    assert service.check('cargas') is False
+    assert cache.version('cargas') == 0
+
+    collections['ticketv2'].docs.append({'updatedAt': now})
+    assert service.check('cargas') is True
+    assert cache.version('cargas') == 1
+    assert service.check('cargas') is False
+
+    # Documento alterado (maior updatedAt) afeta só os conjuntos que leem a coleção
+    # (contratos lê o resumo de entregas, não ticketv2)
+    collections['ticketv2'].docs[0]['updatedAt'] = now + timedelta(seconds=1)
+    assert service.check_all() == ['cargas']
+    assert cache.version('cargas') == 2
+    assert cache.version('financeiro') == 0
+
+    # Outro pod (mesmo cache) enxerga a versão sem sondar
+    other = CacheVersionService(collections, cache)
+    assert other.cache.version('cargas') == 2
+
+    # Dentro do intervalo só um processo sonda cada conjunto
+    assert cache.try_lease('mapa', 'version-probe', 60)
+    collections['addresses'].docs.append({'updatedAt': now})
+    assert service.check('mapa') is True
+    collections['addresses'].docs.append({'updatedAt': now + timedelta(days=1)})
+    other.poll_once()
+    assert cache.version('mapa') == 1
+    print("✅ Sonda de versões")
+
+def test_versioned_cache():
+    """Loader reaproveitado até a versão do conjunto mudar"""
+    print("🔄 Testando cache por versão...")
+    cache = QueryCache(DiskCacheBackend(tempfile.mkdtemp()))
+    service = CacheVersionService(_collections(), cache)
+    service.start = lambda: None
+    cache_versions._service = service
+    calls = []
+
+    @versioned_cache('contratos')
+    def load(limit=10):
+        calls.append(limit)
+        return list(range(limit))
+
+    assert load() == list(range(10))
+    assert load() == list(range(10))
+    assert load(limit=3) == [0, 1, 2]
+    assert calls == [10, 3]
+
+    cache.invalidate('contratos')
+    load()
+    assert calls == [10, 3, 10]
+    load.clear()
+    print("✅ Cache por versão")
+
+def test_version_bump_skips_stale_value():
+    """Após a invalidação, o valor antigo servido pelo SWR não fica preso na versão nova"""
+    print("🔄 Testando versão nova sobre valor vencido...")
+    cache = QueryCache(DiskCacheBackend(tempfile.mkdtemp()))
+    service = CacheVersionService(_collections(), cache)
+    service.start = lambda: None
+    cache_versions._service = service
+    original = query_cache.get_query_cache
+    query_cache.get_query_cache = lambda: cache
+    data = {'value': 'antigo'}
+    try:
+        @versioned_cache('financeiro')
+        @stale_while_revalidate('financeiro', fresh_ttl=None)
+        def load():
+            return data['value']
+
+        assert load() == 'antigo'
+        data['value'] = 'novo'
+        cache.invalidate('financeiro')
+        # Primeira leitura após a invalidação: antigo na hora, recálculo em segundo plano
+        assert load() == 'antigo'
+        deadline = time.time() + 5
+        while cache.get_entry('financeiro', fingerprint(load.__wrapped__.__qualname__)) is None:
+            assert time.time() < deadline, "recálculo não terminou"
+            time.sleep(0.01)
+        assert load() == 'novo'
+        load.clear()
+    finally:
+        query_cache.get_query_cache = original
+    print("✅ Versão nova sobre valor vencido")
+
+def test_probe_indexes():
+    """Toda coleção sondada ganha o índice em updatedAt usado pelo find_one ordenado"""
+    print("🔄 Testando índices da sonda...")
+    collections = _collections()
+    ensure_probe_indexes(collections)
+    assert all(collection.indexes == ["updatedAt"] for collection in collections.values())
+    print("✅ Índices da sonda")
+
+if __name__ == "__main__":
+    test_version_changes_with_data()
+    test_versioned_cache()
+    test_version_bump_skips_stale_value()
+    test_probe_indexes()
+    print("🎉 Testes de versões concluídos")
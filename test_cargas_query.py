@@ -0,0 +1,72 @@
+"""
+Teste do construtor de consultas de cargas (filtros -> SQL parametrizado)
+Não acessa o PostgreSQL: verifica apenas o SQL e os parâmetros gerados
+"""
+import sys
+import os
+from datetime import date, datetime
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from src.cargas_query import CargasFilters, build_cargas_where, build_page_query, build_aggregate_queries
+
+def test_where_from_filters():
+    """Cada filtro preenchido vira uma condição com parâmetro"""
+    print("🔄 Testando montagem do WHERE...")
+    where, params = build_cargas_where(CargasFilters(
+        start_date=date(2025, 3, 1), end_date=date(2025, 3, 31),
+        status='done', paid=False, sellers=['[abc123] Fulano'], ticket_search=' 12 '
+    ))
+    assert "loading_date >= %s" in where and "loading_date < %s" in where
+    assert params[:4] == [date(2025, 3, 1), date(2025, 4, 1), 'done', False]
+    assert params[4] == ['[abc123] Fulano']
+    assert params[5] == '12%'
+    assert where.count('%s') == len(params)
+
+    # Busca de ticket: faixa usa o número; texto que não é número não encontra nada
+    where, params = build_cargas_where(CargasFilters(ticket_search='300-100'))
+    assert "ticket_number BETWEEN %s AND %s" in where and params[-2:] == [100, 300]
+    where, params = build_cargas_where(CargasFilters(ticket_search='12%'))
+    assert where.endswith("FALSE")
+    print("✅ WHERE parametrizado")
+
+def test_keyset_page():
+    """Página seguinte parte da última chave e pede uma linha extra"""
+    print("🔄 Testando paginação por chave...")
+    sql, params = build_page_query(CargasFilters(), 50, after=(datetime(2025, 5, 2), 'x:0'))
+    assert "(loading_date, ticket_id) < (%s, %s)" in sql
+    assert "ORDER BY loading_date DESC, ticket_id DESC" in sql
+    assert params[-3:] == [datetime(2025, 5, 2), 'x:0', 51]
+    print("✅ Paginação por chave")
+
+def test_sorted_keyset_page():
+    """Ordenação pela coluna escolhida usa a mesma expressão na chave e no ORDER BY"""
+    print("🔄 Testando ordenação no servidor...")
+    sql, params = build_page_query(CargasFilters(), 20, after=(1500.0, 'x:9'), sort='revenue_value', descending=False)
+    assert "(COALESCE(receita, 0), ticket_id) > (%s, %s)" in sql
+    assert "ORDER BY COALESCE(receita, 0) ASC, ticket_id ASC" in sql
+    assert "COALESCE(receita, 0) AS sort_key" in sql
+    assert params[-3:] == [1500.0, 'x:9', 21]
+    try:
+        build_page_query(CargasFilters(), 20, sort='1; DROP TABLE cargas')
+        assert False, "coluna inválida deveria falhar"
+    except ValueError:
+        pass
+    print("✅ Ordenação no servidor")
+
+def test_aggregates_use_rollup_when_possible():
+    """Filtros de dimensões do agregado leem a view; os demais, a tabela"""
+    print("🔄 Testando escolha da fonte dos totais...")
+    (totals_sql, _), _, _ = build_aggregate_queries(CargasFilters(grain='soja'))
+    assert "FROM cargas_daily_rollup" in totals_sql
+    (totals_sql, _), _, _ = build_aggregate_queries(CargasFilters(grain='soja', ticket_search='9'))
+    assert "FROM cargas " in totals_sql
+    print("✅ Fonte dos totais escolhida pelos filtros")
+
+if __name__ == "__main__":
+    test_where_from_filters()
+    test_keyset_page()
+    test_sorted_keyset_page()
+    test_aggregates_use_rollup_when_possible()
+    print("🎉 Testes de consulta de cargas concluídos")
@@ -0,0 +1,76 @@
+"""
+Teste da fila de mensagens mortas (dead-letter) da sincronização
+O PostgreSQL é simulado por uma conexão que registra os comandos e devolve
+as pendências configuradas; o MongoDB por uma coleção de documentos fixos
+"""
+import sys
+import os
+import json
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from fakes import FakeCollection, RecordingConnection
+from src.dead_letter import DeadLetterQueue, MAX_ATTEMPTS, RETRY_BASE_SECONDS, from_row_failures, from_transform_failures
+from src.sync_pipeline import ENTITIES_BY_NAME
+
+def _updates(connection, marker):
+    return [params for sql, params in connection.commands if sql.startswith('UPDATE') and marker in sql]
+
+def _finance(doc_id, value):
+    return {'_id': doc_id, 'date': 20250110, 'value': value, 'category_name': 'Impostos'}
+
+def test_record_batches_failures():
+    """Falhas viram um único INSERT, sem repetir a mesma pendência"""
+    print("🔄 Testando registro na dead-letter...")
+    entity = ENTITIES_BY_NAME['cargas']
+    row = ('t1:0',) + (None,) * (len(entity.columns) - 1)
+    letters = from_row_failures(entity, [(row, ValueError('x')), (row, KeyError('y'))])
+    letters += from_transform_failures(entity, [({'_id': 't2', 'loadingDate': None}, TypeError('z'))])
+    assert [(l.source_id, l.row_key) for l in letters] == [('t1', 't1:0'), ('t1', 't1:0'), ('t2', 't2')]
+    assert json.loads(letters[0].payload)['ticket_id'] == 't1:0'
+
+    connection = RecordingConnection()
+    assert DeadLetterQueue(connection).record(letters) == 2
+    (sql, params), = connection.commands
+    assert sql.startswith('INSERT INTO sync_dead_letter') and 'ON CONFLICT (entity, row_key)' in sql
+    # Falha mais recente da mesma linha prevalece
+    assert params[3] == 'KeyError' and len(params) == 2 * 6
+    assert DeadLetterQueue(connection).record([]) == 0 and len(connection.commands) == 1
+    print("✅ Registro em lote")
+
+def test_retry_due_backoff():
+    """Vencidas são relidas da origem; as que falham de novo recebem backoff até MAX_ATTEMPTS"""
+    print("🔄 Testando reprocessamento...")
+    # INSERT da linha 'ruim' falha; SELECT devolve as pendências
+    connection = RecordingConnection(
+        results={'SELECT id, entity': [
+            (1, 'finances', 'ok'), (2, 'finances', 'ruim'), (3, 'finances', 'sumiu'), (4, 'removida', 'x')
+        ]},
+        fail_on={'INSERT INTO finances': 'ruim'}
+    )
+    finances = FakeCollection([_finance('ok', 10), _finance('ruim', 20)])
+    collections = {name: FakeCollection([]) for name in
+                   ['ticketv2', 'ticketv2_transactions', 'orderv2', 'users', 'provisionings']}
+    collections['finances'] = finances
+    stats = DeadLetterQueue(connection).retry_due(collections)
+
+    assert stats == {'resolved': 2, 'failed': 1}
+    # Releitura só dos _id pendentes da entidade
+    assert finances.pipelines[0][0] == {'$match': {'_id': {'$in': ['ok', 'ruim', 'sumiu']}}}
+    resolved, = _updates(connection, 'resolved_at = CURRENT_TIMESTAMP')
+    assert sorted(resolved[0]) == [1, 3]
+    failed, = _updates(connection, 'attempts = attempts + 1')
+    assert failed[0] == 'ValueError'
+    assert failed[2:] == (MAX_ATTEMPTS, RETRY_BASE_SECONDS, [2])
+    backoff = [sql for sql, _ in connection.commands if 'attempts = attempts + 1' in sql][0]
+    assert "WHEN attempts + 1 >= %s THEN 'infinity'::timestamp" in backoff
+    assert "POWER(2, attempts)" in backoff
+    assert "FOR UPDATE SKIP LOCKED" in connection.commands[0][0]
+    assert connection.commits >= 1
+    print("✅ Reprocessamento com backoff")
+
+if __name__ == "__main__":
+    test_record_batches_failures()
+    test_retry_due_backoff()
+    print("🎉 Testes da dead-letter concluídos")
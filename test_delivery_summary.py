@@ -0,0 +1,230 @@
+"""
+Teste do resumo de entregas por contrato
+O MongoDB é simulado por coleções em memória: find/find_one filtram os
+documentos e aggregate só registra o pipeline recebido
+"""
+import sys
+import os
+from datetime import datetime
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from src.database_service import DatabaseService
+from src.delivery_summary import SUMMARY_COLLECTION, build_summary_pipeline, refresh_delivery_summary, ensure_delivery_summary
+from src.snapshots import load_delta
+from src.sync_pipeline import ENTITIES_BY_NAME
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        values = value if isinstance(value, list) else [value]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and operand not in values:
+                return False
+            if op == "$ne" and operand in values:
+                return False
+            if op == "$gte" and not (value is not None and value >= operand):
+                return False
+            if op == "$in" and not set(values) & set(operand):
+                return False
+    return True
+
+class FakeCollection:
+    """Coleção em memória com o subconjunto de consultas usado pelo resumo"""
+
+    def __init__(self, documents=None):
+        self.documents = documents or []
+        self.pipelines = []
+        self.updated = []
+        self.indexes = []
+
+    def find(self, query, projection=None):
+        return [doc for doc in self.documents if _matches(doc, query)]
+
+    def find_one(self, query, projection=None, sort=None):
+        found = self.find(query)
+        if sort:
+            field, direction = sort[0]
+            found.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return found[0] if found else None
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        return []
+
+    def update_many(self, query, update):
+        self.updated.append((query, update))
+        now = datetime.utcnow()
+        for doc in self.find(query):
+            for stage in update:
+                doc.update({key: now if value == "$$NOW" else value for key, value in stage["$set"].items()})
+
+    def create_index(self, keys):
+        self.indexes.append(keys)
+
+    def estimated_document_count(self):
+        return len(self.documents)
+
+def test_incremental_refresh():
+    """Só as ordens dos tickets alterados (atuais e anteriores) são recalculadas"""
+    print("🔄 Testando atualização incremental do resumo...")
+    watermark = datetime(2025, 6, 1)
+    tickets = FakeCollection([
+        {'_id': 't1', 'updatedAt': datetime(2025, 6, 2),
+         'transactions': [{'destinationOrder': 'A'}, {'destinationOrder': 'B'}]},
+        {'_id': 't2', 'updatedAt': datetime(2025, 5, 1), 'transactions': [{'destinationOrder': 'D'}]},
+        {'_id': 't3', 'updatedAt': watermark, 'transactions': [{'destinationOrder': None}]}
+    ])
+    # t1 atendia a ordem C antes da alteração
+    summary = FakeCollection([
+        {'_id': 'C', 'ticketIds': ['t1'], 'updatedAt': watermark},
+        {'_id': 'D', 'ticketIds': ['t2'], 'updatedAt': datetime(2025, 5, 1)}
+    ])
+    collections = {'ticketv2': tickets, SUMMARY_COLLECTION: summary}
+
+    assert refresh_delivery_summary(collections) == 3
+    pipeline = tickets.pipelines[-1]
+    assert pipeline[0] == {"$match": {"transactions.destinationOrder": {"$in": ['A', 'B', 'C']}}}
+    assert pipeline[-1]["$merge"]["into"] == SUMMARY_COLLECTION
+    # Ordem C ficou sem tickets: vira lápide por não ter sido regravada nesta execução
+    run_id = pipeline[-2]["$addFields"]["refreshRun"]
+    (query, update), = summary.updated
+    assert query == {"refreshRun": {"$ne": run_id}, "tombstone": {"$ne": True}, "_id": {"$in": ['A', 'B', 'C']}}
+    tombstone = update[0]["$set"]
+    assert tombstone["tombstone"] is True and tombstone["refreshedAt"] == "$$NOW"
+    assert (tombstone["deliveredBags"], tombstone["ticketIds"]) == (0, [])
+    assert "transactions.destinationOrder" in tickets.indexes
+
+    # Resumo vazio (ou SYNC_FULL): reconstrução completa sem filtro de ordens
+    assert refresh_delivery_summary(collections, full=True) == 2
+    assert tickets.pipelines[-1][0] == {"$match": {"transactions.destinationOrder": {"$ne": None}}}
+    assert "_id" not in summary.updated[-1][0]
+    print("✅ Atualização incremental do resumo")
+
+def test_contracts_join_summary():
+    """Contratos juntam o resumo por _id (sem sub-pipeline correlacionado)"""
+    print("🔄 Testando junção dos contratos com o resumo...")
+    names = ['ticketv2', 'ticketv2_transactions', 'orderv2', 'users', 'provisionings']
+    pipeline = DatabaseService({name: FakeCollection() for name in names}).build_contracts_pipeline()
+    lookups = [stage["$lookup"] for stage in pipeline if "$lookup" in stage]
+    assert lookups[0] == {"from": SUMMARY_COLLECTION, "localField": "_id", "foreignField": "_id", "as": "tickets"}
+    assert all("pipeline" not in lookup for lookup in lookups)
+    group = build_summary_pipeline()[4]["$group"]
+    assert set(group) >= {'loadingDate', 'deliveryDate', 'deliveredBags', 'transactions', 'ticketIds'}
+
+    # Fallback da página sem snapshot traz todos os contratos, como o snapshot
+    collections = {name: FakeCollection() for name in names + [SUMMARY_COLLECTION]}
+    collections[SUMMARY_COLLECTION].documents = [{'_id': 'A'}]
+    DatabaseService(collections).get_contracts_data(limit=None)
+    assert not any("$limit" in stage for stage in collections['orderv2'].pipelines[-1])
+    print("✅ Junção dos contratos com o resumo")
+
+def test_empty_summary_bootstrap():
+    """Resumo vazio (job ainda não rodou) é calculado na primeira leitura dos contratos"""
+    print("🔄 Testando cálculo inicial do resumo...")
+    names = ['ticketv2', 'ticketv2_transactions', 'orderv2', 'users', 'provisionings', SUMMARY_COLLECTION]
+    collections = {name: FakeCollection() for name in names}
+    DatabaseService(collections).get_contracts_data()
+    pipeline, = collections['ticketv2'].pipelines
+    assert pipeline[-1]["$merge"]["into"] == SUMMARY_COLLECTION
+    # Sem remoção: outro pod pode estar gravando o mesmo resumo
+    assert collections[SUMMARY_COLLECTION].updated == []
+    assert collections['orderv2'].pipelines
+
+    # Já calculado: nenhuma agregação extra
+    collections[SUMMARY_COLLECTION].documents = [{'_id': 'A'}]
+    assert ensure_delivery_summary(collections) is True
+    assert len(collections['ticketv2'].pipelines) == 1
+
+    # Sem permissão de escrita: segue sem resumo
+    collections = {name: FakeCollection() for name in names}
+
+    def denied(pipeline, **kwargs):
+        raise PermissionError("not authorized")
+
+    collections['ticketv2'].aggregate = denied
+    assert ensure_delivery_summary(collections) is False
+    print("✅ Cálculo inicial do resumo")
+
+def test_changed_deliveries_reach_contracts():
+    """Contratos com entregas recalculadas entram no delta e na réplica com as novas colunas"""
+    print("🔄 Testando propagação das entregas...")
+    watermark = datetime(2025, 6, 1)
+    # A perdeu um ticket: updatedAt antigo, mas recalculada depois da marca
+    summary = FakeCollection([
+        {'_id': 'A', 'updatedAt': datetime(2025, 5, 1), 'refreshedAt': datetime(2025, 6, 2)},
+        {'_id': 'B', 'updatedAt': datetime(2025, 5, 1), 'refreshedAt': datetime(2025, 5, 2)},
+        {'_id': 'C', 'tombstone': True, 'updatedAt': datetime(2025, 4, 1), 'refreshedAt': datetime(2025, 6, 3)}
+    ])
+    orders = FakeCollection()
+    names = ['ticketv2', 'ticketv2_transactions', 'users', 'provisionings']
+    collections = {name: FakeCollection() for name in names}
+    collections.update({'orderv2': orders, SUMMARY_COLLECTION: summary})
+
+    assert load_delta('contratos', collections, watermark).empty
+    assert orders.pipelines[-1][0] == {"$match": {"$or": [
+        {"updatedAt": {"$gte": watermark}}, {"_id": {"$in": ['A', 'C']}}
+    ]}}
+
+    contratos = ENTITIES_BY_NAME['contratos']
+    row = contratos.to_row({'_id': 'A', 'deliveredBags': 500, 'remainingBags': 1500, 'deliveryDivergence': True})
+    values = dict(zip(contratos.columns, row))
+    assert len(row) == len(contratos.columns)
+    assert (values['delivered_bags'], values['remaining_bags'], values['delivery_divergence']) == (500, 1500, True)
+    print("✅ Propagação das entregas")
+
+def test_moved_ticket_resyncs_both_contracts():
+    """Ticket movido de ordem: a antiga (que vira lápide) e a nova voltam à réplica"""
+    print("🔄 Testando ticket movido entre ordens...")
+    since = datetime(2025, 6, 1)
+    # t1 atendia A e agora atende B; A fica sem tickets
+    tickets = FakeCollection([
+        {'_id': 't1', 'updatedAt': datetime(2025, 6, 2), 'transactions': [{'destinationOrder': 'B'}]}
+    ])
+    summary = FakeCollection([
+        {'_id': 'A', 'ticketIds': ['t1'], 'updatedAt': datetime(2025, 5, 1), 'refreshedAt': datetime(2025, 5, 1)}
+    ])
+
+    def merge(pipeline, **kwargs):
+        """$merge simulado: regrava o resumo das ordens que ainda têm tickets"""
+        tickets.pipelines.append(pipeline)
+        run_id = pipeline[-2]["$addFields"]["refreshRun"]
+        for order in pipeline[0]["$match"]["transactions.destinationOrder"]["$in"]:
+            served = [t for t in tickets.documents
+                      if order in [tr['destinationOrder'] for tr in t['transactions']]]
+            if served:
+                summary.documents = [doc for doc in summary.documents if doc['_id'] != order]
+                summary.documents.append({
+                    '_id': order, 'ticketIds': [t['_id'] for t in served],
+                    'updatedAt': max(t['updatedAt'] for t in served),
+                    'refreshRun': run_id, 'refreshedAt': datetime.utcnow()
+                })
+        return []
+
+    tickets.aggregate = merge
+    names = ['ticketv2_transactions', 'orderv2', 'users', 'provisionings']
+    collections = {name: FakeCollection() for name in names}
+    collections.update({'ticketv2': tickets, SUMMARY_COLLECTION: summary})
+
+    assert refresh_delivery_summary(collections) == 2
+    order_a, = [doc for doc in summary.documents if doc['_id'] == 'A']
+    assert order_a['tombstone'] is True and order_a['deliveredBags'] == 0
+
+    # Réplica no Postgres e delta do snapshot relêem as duas ordens
+    ENTITIES_BY_NAME['contratos'].extract(collections, since)
+    resynced = collections['orderv2'].pipelines[-1][0]["$match"]["$or"][1]["_id"]["$in"]
+    assert sorted(resynced) == ['A', 'B']
+    load_delta('contratos', collections, since)
+    assert collections['orderv2'].pipelines[-1][0]["$match"]["$or"][1] == {"_id": {"$in": resynced}}
+    print("✅ Ticket movido entre ordens")
+
+if __name__ == "__main__":
+    test_incremental_refresh()
+    test_contracts_join_summary()
+    test_empty_summary_bootstrap()
+    test_changed_deliveries_reach_contracts()
+    test_moved_ticket_resyncs_both_contracts()
+    print("🎉 Testes do resumo de entregas concluídos")
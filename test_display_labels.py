@@ -0,0 +1,53 @@
+"""
+Teste das colunas derivadas de exibição (produtor/comprador e cliente)
+Compara a versão vetorizada com a regra linha a linha usada antes pelas páginas
+"""
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from pages.cargas import add_display_columns
+from pages.contratos import add_cliente_column
+
+def test_seller_buyer_display():
+    """'[últimos 6] Nome' quando há contrato, só o nome quando não há"""
+    print("🔄 Testando produtor/comprador...")
+    origin = ObjectId()
+    df = pd.DataFrame({
+        'seller_name': ['Fazenda A', 'Fazenda B', None, 'Fazenda D'],
+        'originOrder': [origin, None, 'abc', ''],
+        'buyer_name': ['Trading X', 'Trading Y', 'Trading Z', None],
+        'destinationOrder': ['1234567890', np.nan, '99', '000001']
+    })
+    df = add_display_columns(df)
+    assert list(df['seller_display']) == [f"[{str(origin)[-6:]}] Fazenda A", 'Fazenda B', '[abc] N/A', 'Fazenda D']
+    assert list(df['buyer_display']) == ['[567890] Trading X', 'Trading Y', '[99] Trading Z', '[000001] N/A']
+
+    # Sem a coluna do contrato, só o nome
+    only_names = add_display_columns(pd.DataFrame({'seller_name': ['Fazenda A']}))
+    assert list(only_names['seller_display']) == ['Fazenda A']
+    assert 'buyer_display' not in only_names.columns
+    print("✅ Produtor/comprador")
+
+def test_cliente():
+    """Frete usa o vendedor; fora da originação, o comprador"""
+    print("🔄 Testando cliente...")
+    df = pd.DataFrame({
+        'contract_type': ['🚛 Frete', '🌾 Grão', '🌾 Grão', None],
+        'direction_type': ['Venda', 'Venda', 'Originação', None],
+        'seller_name': ['Transp', 'Fazenda', 'Fazenda 2', 'Fazenda 3'],
+        'buyer_name': ['Trading', 'Trading 2', 'Trading 3', 'Trading 4']
+    })
+    assert list(add_cliente_column(df)['cliente']) == ['Transp', 'Trading 2', 'Fazenda 2', 'Trading 4']
+    print("✅ Cliente")
+
+if __name__ == "__main__":
+    test_seller_buyer_display()
+    test_cliente()
+    print("🎉 Testes de colunas de exibição concluídos")
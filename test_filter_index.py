@@ -0,0 +1,69 @@
+"""
+Teste do índice de filtros (bitmaps por valor + datas ordenadas)
+Compara com a filtragem encadeada por máscaras booleanas usada antes pelas páginas
+"""
+import sys
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from src.filter_index import FilterIndex
+
+def _frame(n=5000):
+    rng = np.random.default_rng(3)
+    return pd.DataFrame({
+        'status': rng.choice(['done', 'open', None], n),
+        'seller': rng.choice([f"Fazenda {i}" for i in range(400)], n),
+        'year': rng.choice([2024.0, 2025.0, np.nan], n),
+        'loadingDate': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 200 * 86400, n), unit='s'),
+        'ticket': np.arange(n)
+    }, index=np.arange(n) * 2)
+
+def test_matches_chained_filters():
+    """Mesmas linhas, na mesma ordem, que os filtros aplicados um a um"""
+    print("🔄 Testando índice de filtros...")
+    df = _frame()
+    df.loc[df.index[:10], 'loadingDate'] = pd.NaT
+    index = FilterIndex(df, ['status', 'seller', 'year', 'ausente'], ['loadingDate'])
+    sellers = [f"Fazenda {i}" for i in range(0, 400, 5)] + ['Inexistente']
+    mask = (df['ticket'] % 3 == 0).to_numpy()
+
+    result = index.filter(
+        equals={'status': 'done', 'seller': sellers, 'year': 2025, 'ausente': 'x'},
+        date_ranges={'loadingDate': (date(2025, 2, 1), date(2025, 4, 30))},
+        mask=mask
+    )
+    expected = df[
+        (df['status'] == 'done') & df['seller'].isin(sellers) & (df['year'] == 2025) & mask
+        & (df['loadingDate'].dt.date >= date(2025, 2, 1)) & (df['loadingDate'].dt.date <= date(2025, 4, 30))
+    ]
+    assert len(expected) > 0
+    assert result.index.equals(expected.index)
+
+    # Valores densos (bitmap pronto) e esparsos (lista de linhas) juntos
+    both = index.filter(equals={'status': ['open', 'done']})
+    assert both.index.equals(df[df['status'].isin(['open', 'done'])].index)
+    print("✅ Índice de filtros")
+
+def test_no_filters_and_options():
+    """Sem filtros devolve o próprio DataFrame; valores ordenados sem nulos"""
+    print("🔄 Testando opções e filtros vazios...")
+    df = _frame(100)
+    index = FilterIndex(df, ['status', 'year'], ['loadingDate'])
+    assert index.filter(equals={'status': None, 'year': []}, date_ranges={'loadingDate': None}) is df
+    assert index.values('status') == ['done', 'open']
+    assert index.values('year') == [2024.0, 2025.0]
+    assert index.values('ausente') == []
+    assert index.filter(equals={'status': 'nenhum'}).empty
+    assert (index.codes('status') == -1).sum() == df['status'].isna().sum()
+    print("✅ Opções e filtros vazios")
+
+if __name__ == "__main__":
+    test_matches_chained_filters()
+    test_no_filters_and_options()
+    print("🎉 Testes do índice de filtros concluídos")
@@ -0,0 +1,137 @@
+"""
+Teste do relatório do Financeiro (razão mensal, classificação de categorias e filtro de ano)
+Compara com a busca por trecho linha a linha usada antes pela página
+"""
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from fakes import FakeCollection
+from src.database_service import DatabaseService
+from src.finance_ledger import DRE_ORDER, build_ledger, classify_categories, compute_report, empty_ledger, ledger_from_rollup
+from src.pg_rollups import UNDATED_DAY
+import pages.financeiro as financeiro
+from pages.financeiro import build_finance_report
+
+def _finances(n=3000):
+    rng = np.random.default_rng(11)
+    categories = ['Receita Operacional', 'DESPESAS NAO OPERACIONAL', 'Impostos', 'financiamento',
+                  'Despesas Administrativas', 'Investimentos', 'Outros', 'Não Operacional', None]
+    return pd.DataFrame({
+        'category_name': rng.choice(np.array(categories, dtype=object), n),
+        'category_item': rng.choice(['A', 'B', 'C'], n),
+        'value': rng.normal(0, 1000, n).round(2),
+        'date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D')
+    })
+
+def test_one_pass_classification():
+    """Mesmas linhas do DRE e seções que o str.contains por linha"""
+    print("🔄 Testando classificação de categorias...")
+    df = _finances()
+    flags = classify_categories(df['category_name'])
+    for token in flags.columns:
+        expected = df['category_name'].str.upper().str.contains(token, na=False)
+        assert np.array_equal(flags[token].to_numpy(), expected.to_numpy()), token
+
+    report = build_finance_report(df)
+    oper = df[df['category_name'].str.upper().str.contains('OPERACIONAL', na=False)]
+    for line in DRE_ORDER:
+        if line == 'RECEITA OPERACIONAL':
+            expected = oper.loc[oper['value'] > 0, 'value'].sum()
+        elif line == 'CUSTO OPERACIONAL':
+            expected = oper.loc[~(oper['value'] > 0), 'value'].sum()
+        elif line == 'CAIXA TOTAL':
+            expected = df['value'].sum()
+        else:
+            expected = df.loc[df['category_name'].str.upper().str.contains(line, na=False), 'value'].sum()
+        assert np.isclose(report['dre'][line], expected), line
+
+    sections = dict(report['sections'])
+    taxes = df[df['category_name'].str.upper().str.contains('IMPOSTOS', na=False)]
+    assert np.isclose(sections['IMPOSTOS'].to_numpy().sum(), taxes['value'].sum())
+    print("✅ Classificação de categorias")
+
+def test_ledger_sources_agree():
+    """Lançamentos, somas mensais por sinal e linhas do agregado dão o mesmo relatório"""
+    print("🔄 Testando razão mensal...")
+    df = _finances()
+    df.loc[df.index[:5], 'date'] = pd.NaT
+    report = build_finance_report(df)
+
+    # Somas por mês e sinal (formato do motor analítico)
+    month = df['date'].dt.to_period('M').dt.to_timestamp()
+    monthly = df.groupby([month, df['category_name'], df['category_item'], df['value'] > 0],
+                         dropna=False)['value'].sum().reset_index(level=3, drop=True).reset_index()
+    assert len(monthly) < len(df)
+    from_monthly = build_finance_report(monthly)
+
+    # Linhas do agregado no PostgreSQL (coluna day, valores decimais); sem data no dia fictício
+    rollup = build_ledger(df).rename(columns={'month': 'day'})
+    rollup['day'] = rollup['day'].fillna(pd.Timestamp(UNDATED_DAY)).dt.date
+    from_rollup = compute_report(ledger_from_rollup(rollup))
+
+    for other in (from_monthly, from_rollup):
+        assert all(np.isclose(report['dre'][line], other['dre'][line]) for line in DRE_ORDER)
+        for (_, expected), (_, actual) in zip(report['sections'], other['sections']):
+            pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+        pd.testing.assert_frame_equal(report['cash_flow'], other['cash_flow'])
+
+    cash = report['cash_flow']
+    dated = df[df['date'].notna()]
+    assert np.isclose(cash['Saldo'].sum(), dated['value'].sum())
+    assert np.isclose(cash['Saldo Acumulado'].iloc[-1], cash['Saldo'].sum())
+    assert np.isclose(cash['Entradas'].sum(), dated.loc[dated['value'] > 0, 'value'].sum())
+    value, pct = report['ebitda']
+    dre = report['dre']
+    assert np.isclose(value, sum(dre[line] for line in DRE_ORDER[:4]))
+    assert np.isclose(pct, value / dre['RECEITA OPERACIONAL'] * 100)
+    print("✅ Razão mensal")
+
+def test_empty_pg_ledger_years():
+    """Réplica sem lançamentos: nenhum ano, sem erro no acessor .dt"""
+    print("🔄 Testando anos com o razão vazio...")
+    original = financeiro.load_pg_finance_ledger
+    try:
+        financeiro.load_pg_finance_ledger = lambda year_filter=None: empty_ledger()
+        assert financeiro.load_finance_years(financeiro.SOURCE_POSTGRES) == []
+        ledger = ledger_from_rollup(pd.DataFrame({
+            'day': [UNDATED_DAY, pd.Timestamp('2024-03-01').date()], 'category_name': ['A', 'A'],
+            'category_item': ['x', 'x'], 'inflow': [1, 2], 'outflow': [0, 0],
+            'inflow_entries': [1, 1], 'outflow_entries': [0, 0]
+        }))
+        financeiro.load_pg_finance_ledger = lambda year_filter=None: ledger
+        # Lançamentos sem data contam no DRE, mas não viram ano
+        assert financeiro.load_finance_years(financeiro.SOURCE_POSTGRES) == [2024]
+    finally:
+        financeiro.load_pg_finance_ledger = original
+    print("✅ Anos com o razão vazio")
+
+def test_year_pushdown():
+    """Ano vai para o $match no inteiro AAAAMMDD; anos agrupados no servidor"""
+    print("🔄 Testando filtro de ano no MongoDB...")
+    finances = FakeCollection([{'_id': 2025.0}, {'_id': 2024.0}])
+    names = ['ticketv2', 'ticketv2_transactions', 'orderv2', 'users', 'provisionings']
+    collections = {name: FakeCollection() for name in names}
+    collections['finances'] = finances
+    service = DatabaseService(collections)
+
+    service.get_finances_with_lookups(year_filter='2025')
+    assert finances.pipelines[-1][0]["$match"]["date"] == {"$gte": 20250101, "$lte": 20251231}
+    service.get_finances_with_lookups(year_filter='Todos')
+    assert "date" not in finances.pipelines[-1][0]["$match"]
+
+    assert service.get_finance_years() == [2025, 2024]
+    assert "$group" in finances.pipelines[-1][-1]
+    print("✅ Filtro de ano no MongoDB")
+
+if __name__ == "__main__":
+    test_one_pass_classification()
+    test_ledger_sources_agree()
+    test_empty_pg_ledger_years()
+    test_year_pushdown()
+    print("🎉 Testes do relatório financeiro concluídos")
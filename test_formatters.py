@@ -0,0 +1,71 @@
+"""
+Teste da formatação vetorizada no padrão brasileiro
+Compara com a formatação célula a célula usada antes pelas páginas
+"""
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+import utils.formatters as formatters
+from utils.formatters import (
+    format_brl, format_brl_series, format_number_series, format_percent_series,
+    format_date_series, format_frame
+)
+
+def _brl_reference(x):
+    return f"R$ {x:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+def test_brl_matches_reference():
+    """Mesmo texto da formatação célula a célula, com e sem pyarrow"""
+    print("🔄 Testando moeda...")
+    rng = np.random.default_rng(7)
+    values = pd.Series(np.concatenate([rng.normal(0, 1e6, 2000), [0, 0.5, 999.999, 1000, -1234567.891, 1e12]]))
+    expected = [_brl_reference(x) for x in values]
+    assert list(format_brl_series(values)) == expected
+
+    available = formatters.PYARROW_AVAILABLE
+    formatters.PYARROW_AVAILABLE = False
+    try:
+        assert list(format_brl_series(values)) == expected
+    finally:
+        formatters.PYARROW_AVAILABLE = available
+    print("✅ Moeda")
+
+def test_missing_and_small_values():
+    """Vazios, nulos, texto e -0,00"""
+    print("🔄 Testando valores especiais...")
+    assert list(format_brl_series([])) == []
+    assert list(format_brl_series([np.nan, None, 'abc', -0.001])) == ["R$ 0,00"] * 4
+    assert format_brl(5) == "R$ 5,00"
+    assert list(format_number_series([1234.6, 12, np.nan], na_rep='-')) == ['1.235', '12', '-']
+    assert list(format_number_series([1234.56], decimals=1)) == ['1.234,6']
+    assert list(format_percent_series([12.346, -3, None])) == ['12,35%', '-3,00%', '']
+    print("✅ Valores especiais")
+
+def test_format_frame():
+    """Colunas formatadas mantêm o índice; colunas ausentes são ignoradas"""
+    print("🔄 Testando formatação de tabela...")
+    df = pd.DataFrame({
+        'Total': [1500.0, -2.5],
+        'Quantidade': [1000, 25],
+        'Data': ['2025-03-01', None]
+    }, index=[10, 20])
+    result = format_frame(df, currency=['Total', 'Ausente'], numbers=['Quantidade'], dates=['Data'])
+    assert list(result.index) == [10, 20]
+    assert list(result['Total']) == ['R$ 1.500,00', 'R$ -2,50']
+    assert list(result['Quantidade']) == ['1.000', '25']
+    assert list(result['Data']) == ['01/03/2025', '']
+    assert df['Total'].dtype == float
+    assert list(format_date_series(pd.Series(['x']))) == ['']
+    print("✅ Formatação de tabela")
+
+if __name__ == "__main__":
+    test_brl_matches_reference()
+    test_missing_and_small_values()
+    test_format_frame()
+    print("🎉 Testes de formatação concluídos")
@@ -0,0 +1,39 @@
+"""
+Teste da paginação em memória usada pela tabela paginada
+Percorre as páginas como a tabela faz, sem Streamlit rodando
+"""
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from utils.paginated_grid import frame_page_fetcher
+
+def test_frame_pages():
+    """Páginas cobrem todas as linhas na ordem pedida, nulos por último"""
+    print("🔄 Testando paginação em memória...")
+    df = pd.DataFrame({'valor': [3.0, np.nan, 1.0, 5.0, 2.0], 'id': list('abcde')}, index=[10, 10, 11, 12, 13])
+    fetch = frame_page_fetcher(df, page_size=2)
+
+    ids, after = [], None
+    while True:
+        page, after = fetch('valor', True, after)
+        assert len(page) <= 2
+        ids += list(page['id'])
+        if after is None:
+            break
+    assert ids == ['d', 'a', 'e', 'c', 'b']
+
+    page, after = fetch('valor', False, None)
+    assert list(page['id']) == ['c', 'e'] and after == 2
+    page, after = fetch('valor', False, 4)
+    assert list(page['id']) == ['b'] and after is None
+    print("✅ Paginação em memória")
+
+if __name__ == "__main__":
+    test_frame_pages()
+    print("🎉 Testes da tabela paginada concluídos")
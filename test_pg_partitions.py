@@ -0,0 +1,88 @@
+"""
+Teste do particionamento mensal da tabela cargas
+Usa um cursor falso que só registra os comandos, sem acesso ao PostgreSQL
+"""
+import sys
+import os
+from datetime import datetime, date
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from fakes import RecordingConnection
+from src.pg_partitions import months_between, partition_for, detach_partitions_before
+from src.sync_pipeline import ENTITIES_BY_NAME, SYNC_START_DATE, upsert_rows
+import src.postgres_service as postgres_service
+
+def _cursor(partitions=()):
+    """Cursor falso cuja listagem de partições devolve `partitions`"""
+    return RecordingConnection({'FROM pg_inherits': [(name,) for name in partitions]}).cursor()
+
+def _carga(ticket_id, loading_date):
+    entity = ENTITIES_BY_NAME['cargas']
+    row = [None] * len(entity.columns)
+    row[entity.columns.index('ticket_id')] = ticket_id
+    row[entity.columns.index('loading_date')] = loading_date
+    return tuple(row)
+
+def test_month_ranges():
+    """Meses e nomes de partição, inclusive virada de ano e data nula"""
+    print("🔄 Testando cálculo de partições...")
+    assert months_between(datetime(2024, 11, 20), date(2025, 1, 1)) == [
+        date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1)
+    ]
+    assert partition_for('cargas', datetime(2025, 3, 31, 23, 59)) == 'cargas_y2025m03'
+    assert partition_for('cargas', None) == 'cargas_default'
+    print("✅ Partições calculadas")
+
+def test_sync_targets_partitions():
+    """Cada linha é inserida direto na partição do seu mês"""
+    print("🔄 Testando gravação por partição...")
+    cursor = _cursor()
+    upsert_rows(cursor, ENTITIES_BY_NAME['cargas'], [
+        _carga('a:0', datetime(2025, 1, 10)),
+        _carga('b:0', datetime(2025, 2, 10)),
+        _carga('c:0', None)
+    ])
+    commands = cursor.connection.statements()
+    inserts = [cmd.split()[2] for cmd in commands if cmd.startswith('INSERT')]
+    assert inserts == ['cargas_y2025m01', 'cargas_y2025m02', 'cargas_default']
+    assert any(cmd.startswith('DELETE FROM cargas WHERE ticket_id') for cmd in commands)
+    print("✅ Linhas gravadas nas partições do mês")
+
+def test_detach_old_partitions():
+    """Só meses anteriores ao corte saem; a default nunca é destacada"""
+    print("🔄 Testando retenção...")
+    cursor = _cursor(['cargas_default', 'cargas_y2024m12', 'cargas_y2025m01', 'cargas_y2025m02'])
+    detached = detach_partitions_before(cursor, 'cargas', date(2025, 1, 15), archive=False)
+    assert detached == ['cargas_y2024m12']
+    assert 'DROP TABLE cargas_y2024m12' in cursor.connection.statements()
+    print("✅ Retenção aplicada")
+
+def test_cargas_data_bounds():
+    """Sem data final a consulta fica aberta (cargas agendadas para meses futuros aparecem)"""
+    print("🔄 Testando limites da consulta de cargas...")
+    service = postgres_service.PostgreSQLService.__new__(postgres_service.PostgreSQLService)
+    service.pool = RecordingConnection()
+    ready = postgres_service._tables_ready
+    postgres_service._tables_ready = True
+    try:
+        service.get_cargas_data()
+        sql, params = service.pool.commands[-1]
+        assert "WHERE loading_date >= %s ORDER BY" in sql
+        assert params == (SYNC_START_DATE, 1000)
+
+        service.get_cargas_data(date(2025, 2, 1), date(2025, 2, 28), limit=10)
+        sql, params = service.pool.commands[-1]
+        assert "WHERE loading_date >= %s AND loading_date < %s ORDER BY" in sql
+        assert params == (date(2025, 2, 1), date(2025, 3, 1), 10)
+    finally:
+        postgres_service._tables_ready = ready
+    print("✅ Limites da consulta de cargas")
+
+if __name__ == "__main__":
+    test_month_ranges()
+    test_sync_targets_partitions()
+    test_detach_old_partitions()
+    test_cargas_data_bounds()
+    print("🎉 Testes de particionamento concluídos")
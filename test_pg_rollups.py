@@ -0,0 +1,90 @@
+"""
+Teste do cubo de KPIs (agregados diários incrementais)
+Usa um cursor falso que só registra os comandos, sem acesso ao PostgreSQL
+"""
+import sys
+import os
+from datetime import date
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from fakes import RecordingConnection
+from src.pg_rollups import refresh_rollup, build_slice_query, drop_retired_rollups, RETIRED_ROLLUPS, UNDATED_DAY
+
+def _cursor(dirty_days=()):
+    """Cursor falso cuja leitura dos dias pendentes devolve `dirty_days`"""
+    return RecordingConnection({'RETURNING day': [(day,) for day in dirty_days]}).cursor()
+
+def test_refresh_only_dirty_days():
+    """Só os dias marcados são apagados e recalculados, com poda por intervalo"""
+    print("🔄 Testando atualização incremental...")
+    cursor = _cursor([date(2025, 3, 2), date(2025, 1, 31)])
+    assert refresh_rollup(cursor, 'cargas') == 2
+
+    (_, _), (delete_sql, delete_params), (insert_sql, insert_params) = cursor.commands
+    assert delete_sql == "DELETE FROM cargas_daily_rollup WHERE day = ANY(%s)"
+    assert delete_params == ([date(2025, 1, 31), date(2025, 3, 2)],)
+    assert "loading_date >= %s AND loading_date < %s" in insert_sql
+    assert insert_params[:2] == (date(2025, 1, 31), date(2025, 3, 3))
+
+    # Nada pendente: nenhum recálculo
+    cursor = _cursor()
+    assert refresh_rollup(cursor, 'finances_monthly') == 0
+    assert len(cursor.commands) == 1
+
+    # Razão mensal: dias marcados viram os meses que os contêm
+    cursor = _cursor([date(2025, 2, 10), date(2025, 2, 28), date(2025, 12, 31)])
+    assert refresh_rollup(cursor, 'finances_monthly') == 2
+    (_, _), (_, delete_params), (insert_sql, insert_params) = cursor.commands
+    assert delete_params == ([date(2025, 2, 1), date(2025, 12, 1)],)
+    assert "date_trunc('month', entry_date)::date = ANY(%s)" in insert_sql
+    assert insert_params[:2] == (date(2025, 2, 1), date(2026, 1, 1))
+
+    # Lançamentos sem data: dia fictício recalculado a partir de entry_date nulo
+    cursor = _cursor([UNDATED_DAY, date(2025, 2, 10)])
+    assert refresh_rollup(cursor, 'finances_monthly') == 2
+    (_, _), (_, delete_params), (insert_sql, insert_params) = cursor.commands
+    assert delete_params == ([UNDATED_DAY, date(2025, 2, 1)],)
+    assert "OR (entry_date IS NULL))" in insert_sql
+    assert f"COALESCE(date_trunc('month', entry_date)::date, DATE '{UNDATED_DAY.isoformat()}')" in insert_sql
+    assert insert_params == (date(2025, 2, 1), date(2025, 3, 1), [date(2025, 2, 1)])
+    cursor = _cursor([UNDATED_DAY])
+    refresh_rollup(cursor, 'finances_monthly')
+    assert cursor.commands[-1][0].endswith("AND entry_date IS NULL GROUP BY 1, 2, 3")
+    assert cursor.commands[-1][1] == ()
+    print("✅ Atualização incremental")
+
+def test_slice_queries():
+    """Fatias reagregam as medidas; dimensões desconhecidas são rejeitadas"""
+    print("🔄 Testando consultas de fatia...")
+    sql, params = build_slice_query('cargas', ['grain_name'], {'seller_name': ['A', 'B']},
+                                    start=date(2025, 1, 1))
+    assert "SUM(bags) AS bags" in sql and "SUM(loads) AS loads" in sql
+    assert "GROUP BY grain_name" in sql
+    assert params == [date(2025, 1, 1), ['A', 'B']]
+
+    try:
+        build_slice_query('finances_monthly', ['buyer_name'])
+        assert False, "dimensão inválida aceita"
+    except ValueError:
+        pass
+    print("✅ Consultas de fatia")
+
+def test_drop_retired_rollups():
+    """Agregados aposentados saem com gatilho, função e dias pendentes"""
+    print("🔄 Testando remoção dos agregados aposentados...")
+    cursor = _cursor()
+    drop_retired_rollups(cursor)
+    commands = [sql for sql, _ in cursor.commands]
+    assert "DROP FUNCTION IF EXISTS contratos_daily_rollup_mark_days() CASCADE" in commands
+    assert "DROP TABLE IF EXISTS finances_daily_rollup" in commands
+    assert cursor.commands[-1] == ("DELETE FROM rollup_dirty_days WHERE rollup = ANY(%s)", (RETIRED_ROLLUPS,))
+    assert 'cargas_daily_rollup' not in RETIRED_ROLLUPS
+    print("✅ Agregados aposentados removidos")
+
+if __name__ == "__main__":
+    test_refresh_only_dirty_days()
+    test_slice_queries()
+    test_drop_retired_rollups()
+    print("🎉 Testes do cubo de KPIs concluídos")
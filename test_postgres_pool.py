@@ -0,0 +1,123 @@
+"""
+Teste do pool de conexões PostgreSQL do dashboard
+Usa conexões falsas que registram os comandos e podem ser marcadas como quebradas
+"""
+import sys
+import os
+import threading
+import time
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from config.postgres import PostgresPool, POOL_HEALTH_CHECK_IDLE
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        if self.connection.broken:
+            raise ConnectionError("conexão perdida")
+        self.connection.commands.append(sql)
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.broken = False
+        self.closed = False
+        self.commands = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        if self.broken:
+            raise ConnectionError("conexão perdida")
+
+    def close(self):
+        self.closed = True
+
+def _pool(**kwargs):
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection(len(opened)))
+        return opened[-1]
+
+    return PostgresPool(connect=connect, **kwargs), opened
+
+def test_acquire_timeout_and_handoff():
+    """Pool cheio espera até o timeout; conexão devolvida vai para quem está esperando"""
+    print("🔄 Testando limite do pool...")
+    pool, opened = _pool(min_size=1, max_size=2, statement_timeout_ms=5000)
+    assert opened[0].commands == ["SET statement_timeout = 5000"]
+
+    first, second = pool.acquire(), pool.acquire()
+    assert len(opened) == 2
+    start = time.monotonic()
+    try:
+        pool.acquire(timeout=0.1)
+        assert False, "pool esgotado não expirou"
+    except TimeoutError:
+        assert time.monotonic() - start < 1
+
+    received = []
+    waiter = threading.Thread(target=lambda: received.append(pool.acquire(timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    pool.release(first)
+    waiter.join(timeout=5)
+    assert received == [first] and len(opened) == 2
+    pool.release(second)
+    pool.release(received[0])
+    print("✅ Limite do pool")
+
+def test_health_check_and_discard():
+    """Conexão ociosa quebrada é trocada; erro numa conexão quebrada a tira do pool"""
+    print("🔄 Testando verificação de saúde...")
+    pool, opened = _pool(min_size=1, max_size=2)
+    connection, _ = pool._idle[-1]
+
+    # Recém-devolvida: reutilizada sem teste
+    assert pool.acquire() is connection
+    pool.release(connection)
+
+    # Ociosa há mais que o limite e quebrada: descartada e substituída
+    connection.broken = True
+    pool._idle[-1] = (connection, time.monotonic() - POOL_HEALTH_CHECK_IDLE - 1)
+    replacement = pool.acquire()
+    assert replacement is not connection and connection.closed
+    assert pool._size == 1
+
+    # Erro dentro do with: conexão saudável volta, quebrada é descartada
+    pool.release(replacement)
+    try:
+        with pool.connection() as borrowed:
+            raise ValueError("erro de SQL")
+    except ValueError:
+        pass
+    assert pool._idle[-1][0] is borrowed and not borrowed.closed
+
+    try:
+        with pool.connection() as borrowed:
+            borrowed.broken = True
+            raise ConnectionError("queda")
+    except ConnectionError:
+        pass
+    assert borrowed.closed and pool._size == 0 and not pool._idle
+    print("✅ Verificação de saúde")
+
+if __name__ == "__main__":
+    test_acquire_timeout_and_handoff()
+    test_health_check_and_discard()
+    print("🎉 Testes do pool PostgreSQL concluídos")
@@ -0,0 +1,205 @@
+"""
+Teste do cache compartilhado de consultas
+Usa um cliente Redis em memória e um diretório temporário, sem servidores reais
+"""
+import sys
+import os
+import pickle
+import tempfile
+import threading
+import time
+import zlib
+
+import pandas as pd
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+import src.query_cache as query_cache
+from src.query_cache import (
+    QueryCache, RedisCacheBackend, DiskCacheBackend, fingerprint, stale_while_revalidate
+)
+
+SECRET = b'chave-de-teste'
+
+class FakeRedis:
+    """Subconjunto da interface do redis-py usado pelo backend"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at and expires_at < time.time():
+            return None
+        return value
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self.get(key) is not None:
+            return None
+        self.data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def incr(self, key):
+        value = int(self.get(key) or 0) + 1
+        self.set(key, str(value).encode())
+        return value
+
+def _exercise(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return pd.DataFrame({'ticket': [1, 2, 3]})
+
+    key = fingerprint('load_cargas_data', limit=1000)
+    first = cache.get_or_compute('cargas', key, compute)
+    second = cache.get_or_compute('cargas', key, compute)
+    assert len(calls) == 1
+    assert second.equals(first)
+
+    cache.invalidate('cargas')
+    cache.get_or_compute('cargas', key, compute)
+    assert len(calls) == 2
+
+    # Resultado vazio não é gravado
+    cache.get_or_compute('cargas', 'vazio', lambda: pd.DataFrame())
+    assert cache.get('cargas', 'vazio') is None
+
+def test_redis_backend():
+    """Cache com backend Redis (cliente em memória)"""
+    print("🔄 Testando backend Redis...")
+    _exercise(QueryCache(RedisCacheBackend(FakeRedis()), secret=SECRET))
+    print("✅ Backend Redis")
+
+def test_disk_backend_and_ttl():
+    """Cache em disco compartilhado entre instâncias e expiração por TTL"""
+    print("🔄 Testando backend em disco...")
+    directory = tempfile.mkdtemp()
+    _exercise(QueryCache(DiskCacheBackend(directory)))
+
+    # Outra instância (outro processo) enxerga o mesmo valor
+    writer = QueryCache(DiskCacheBackend(directory))
+    reader = QueryCache(DiskCacheBackend(directory))
+    writer.set('contratos', 'k', [{'id': 1}], ttl=60)
+    assert reader.get('contratos', 'k') == [{'id': 1}]
+
+    writer.set('contratos', 'curto', [1], ttl=-1)
+    assert reader.get('contratos', 'curto') is None
+    print("✅ Backend em disco")
+
+def test_fingerprint():
+    """Mesmos parâmetros, mesma chave; ordem de kwargs não importa"""
+    print("🔄 Testando impressão digital...")
+    assert fingerprint('f', a=1, b=2) == fingerprint('f', b=2, a=1)
+    assert fingerprint('f', '2025') != fingerprint('f', '2024')
+    print("✅ Impressão digital")
+
+def test_stale_while_revalidate():
+    """Valor vencido é servido na hora e recalculado uma única vez em segundo plano"""
+    print("🔄 Testando stale-while-revalidate...")
+    query_cache._cache = QueryCache(RedisCacheBackend(FakeRedis()), secret=SECRET)
+    calls = []
+    release = threading.Event()
+
+    @stale_while_revalidate('teste', fresh_ttl=0)
+    def load():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(5)
+        return [len(calls)]
+
+    assert load() == [1]
+    time.sleep(0.01)
+
+    # Vencido: as duas chamadas recebem o valor antigo sem esperar o recálculo
+    start = time.time()
+    assert load() == [1]
+    assert load() == [1]
+    assert time.time() - start < 1
+    release.set()
+    for _ in range(50):
+        if query_cache._cache.get('teste', fingerprint(load.__qualname__)) == [2]:
+            break
+        time.sleep(0.05)
+    assert len(calls) == 2
+    assert load() == [2]
+
+    # Após invalidação o valor anterior continua sendo servido enquanto recalcula
+    query_cache._cache.invalidate('teste')
+    assert load() == [2]
+    print("✅ Stale-while-revalidate")
+
+def test_single_flight_cold_cache():
+    """Com o cache vazio, chamadas simultâneas compartilham um único cálculo"""
+    print("🔄 Testando single-flight...")
+    query_cache._cache = QueryCache(RedisCacheBackend(FakeRedis()), secret=SECRET)
+    calls = []
+
+    @stale_while_revalidate('frio')
+    def load():
+        calls.append(1)
+        time.sleep(0.2)
+        return ['ok']
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(load())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [['ok']] * 5
+    assert len(calls) == 1
+    print("✅ Single-flight")
+
+def test_concurrent_disk_invalidations():
+    """Incrementos de geração simultâneos em disco não se perdem"""
+    print("🔄 Testando invalidações concorrentes...")
+    backend = DiskCacheBackend(tempfile.mkdtemp())
+    threads = [threading.Thread(target=lambda: [backend.incr('gen') for _ in range(25)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert int(backend.get('gen')) == 200
+    print("✅ Invalidações concorrentes")
+
+def test_unsigned_entries_are_rejected():
+    """Bytes gravados sem a chave (ou com outra) nunca chegam ao pickle"""
+    print("🔄 Testando assinatura das entradas...")
+    redis_client = FakeRedis()
+    cache = QueryCache(RedisCacheBackend(redis_client), secret=SECRET)
+    cache.set('cargas', 'k', [1])
+    assert cache.get('cargas', 'k') == [1]
+
+    class Exploit:
+        def __reduce__(self):
+            return (os.system, ('echo invadido',))
+
+    key = cache._key('cargas', 'k')
+    redis_client.set(key, zlib.compress(pickle.dumps(Exploit())))
+    assert cache.get('cargas', 'k') is None
+    assert QueryCache(RedisCacheBackend(redis_client), secret=b'outra').get('cargas', 'k') is None
+
+    # Redis sem chave configurada não é aceito; disco usa a chave local do diretório
+    try:
+        QueryCache(RedisCacheBackend(FakeRedis()))
+        assert False, "Redis aceito sem FOX_CACHE_SECRET"
+    except ValueError:
+        pass
+    directory = tempfile.mkdtemp()
+    assert DiskCacheBackend(directory).local_secret() == DiskCacheBackend(directory).local_secret()
+    print("✅ Assinatura das entradas")
+
+if __name__ == "__main__":
+    test_redis_backend()
+    test_disk_backend_and_ttl()
+    test_fingerprint()
+    test_stale_while_revalidate()
+    test_single_flight_cold_cache()
+    test_concurrent_disk_invalidations()
+    test_unsigned_entries_are_rejected()
+    print("🎉 Testes de cache concluídos")
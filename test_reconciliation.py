@@ -0,0 +1,134 @@
+"""
+Teste da reconciliação MongoDB x PostgreSQL por digest de partição
+Usa coleções e conexão falsas, sem acesso aos bancos reais
+"""
+import sys
+import os
+import math
+from datetime import date, timedelta
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from fakes import RecordingConnection
+from src.reconciliation import ReconciliationEngine, diff_partitions, diff_rows, PARTITION_SPECS
+from src.sync_pipeline import _int_to_date
+
+class FakeCollection:
+    """Responde ao pipeline de digest ou ao de linhas de uma partição"""
+
+    def __init__(self, digests, rows_by_partition):
+        self.digests = digests
+        self.rows_by_partition = rows_by_partition
+        self.row_queries = []
+
+    def aggregate(self, pipeline, **kwargs):
+        if any('$group' in stage for stage in pipeline):
+            return iter(self.digests)
+        start = pipeline[0]['$match']['loadingDate']['$gte'].strftime('%Y-%m-%d')
+        self.row_queries.append(start)
+        return iter(self.rows_by_partition.get(start, []))
+
+def test_diff_partitions():
+    """Partições iguais são ignoradas; ausentes de um lado divergem"""
+    print("🔄 Testando comparação de digests...")
+    mongo = {'2025-01-01': (2, 300, 10), '2025-01-02': (1, 100, 5), '2025-01-03': (1, 50, 1)}
+    pg = {'2025-01-01': (2, 300, 10), '2025-01-02': (1, 100, 6), '2025-01-04': (1, 10, 1)}
+    assert diff_partitions(mongo, pg) == ['2025-01-02', '2025-01-03', '2025-01-04']
+    print("✅ Digests comparados")
+
+def test_diff_rows():
+    """Classifica chaves em faltantes, alteradas e órfãs"""
+    print("🔄 Testando comparação de linhas...")
+    missing, changed, orphans = diff_rows(
+        {'a:0': (100, 1), 'b:0': (200, 2), 'c:0': (300, 3)},
+        {'a:0': (100, 1), 'b:0': (200, 9), 'd:0': (400, 4)}
+    )
+    assert missing == ['c:0']
+    assert changed == ['b:0']
+    assert orphans == ['d:0']
+    print("✅ Linhas comparadas")
+
+def test_engine_drills_only_divergent_partitions():
+    """Só a partição divergente é lida linha a linha"""
+    print("🔄 Testando drill-down do motor...")
+    collection = FakeCollection(
+        digests=[
+            {'_id': '2025-01-01', 'rows': 2, 'cents': 300, 'updated_ms': 10},
+            {'_id': '2025-01-02', 'rows': 2, 'cents': 300, 'updated_ms': 20},
+        ],
+        rows_by_partition={
+            '2025-01-02': [
+                {'key': 'x:0', 'cents': 100, 'updated_ms': 10},
+                {'key': 'y:0', 'cents': 200, 'updated_ms': 10},
+            ]
+        }
+    )
+    # Digests por GROUP BY; linhas da partição pedida no primeiro parâmetro
+    pg_rows = {'2025-01-02': [('x:0', 100, 10), ('y:0', 200, 5)]}
+    connection = RecordingConnection({
+        'GROUP BY': [('2025-01-01', 2, 300, 10), ('2025-01-02', 2, 300, 15)],
+        '': lambda params: pg_rows.get(params[0], [])
+    })
+
+    report = ReconciliationEngine({'ticketv2': collection}, connection).reconcile('cargas')
+
+    assert report.partitions_checked == 2
+    assert report.divergent_partitions == ['2025-01-02']
+    assert collection.row_queries == ['2025-01-02']
+    assert report.resync_keys == ['y:0']
+    assert not report.in_sync
+    print("✅ Drill-down restrito às partições divergentes")
+
+def _evaluate(expression, doc, variables=None):
+    """Avalia o subconjunto de operadores de agregação usado no dia do lançamento"""
+    variables = variables or {}
+    if isinstance(expression, str) and expression.startswith('$$'):
+        return variables[expression[2:]]
+    if isinstance(expression, str) and expression.startswith('$'):
+        return doc.get(expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    (op, args), = expression.items()
+    if op == '$let':
+        scope = dict(variables)
+        scope.update({name: _evaluate(value, doc, variables) for name, value in args['vars'].items()})
+        return _evaluate(args['in'], doc, scope)
+    if op == '$dateFromParts':
+        parts = {name: _evaluate(value, doc, variables) for name, value in args.items()}
+        # Mês e dia fora da faixa transbordam para os seguintes, como no MongoDB
+        year = parts['year'] + (parts['month'] - 1) // 12
+        month = (parts['month'] - 1) % 12 + 1
+        return date(year, month, 1) + timedelta(days=parts['day'] - 1)
+    if op == '$dateToString':
+        return _evaluate(args['date'], doc, variables).strftime(args['format'])
+    values = [_evaluate(arg, doc, variables) for arg in (args if isinstance(args, list) else [args])]
+    operators = {
+        '$toLong': lambda v: int(v), '$toInt': lambda v: int(v), '$toString': lambda v: str(v),
+        '$floor': lambda v: math.floor(v), '$divide': lambda a, b: a / b, '$mod': lambda a, b: a % b,
+        '$eq': lambda a, b: a == b, '$cond': lambda c, a, b: a if c else b
+    }
+    return operators[op](*values)
+
+def test_finance_digest_skips_invalid_dates():
+    """Lançamentos sem data de calendário ficam fora dos dois lados (PostgreSQL grava NULL)"""
+    print("🔄 Testando digest financeiro com datas inválidas...")
+    pipeline = PARTITION_SPECS['finances'].mongo_digest_pipeline()
+    date_range, day = pipeline[0]['$match']['date'], pipeline[1]['$group']['_id']
+    for value in [231, 20250115, 20250115.0, 20240229, 20250231, 20251301, 20250100, 20250132, 19991231]:
+        in_range = date_range['$gte'] <= value <= date_range['$lte']
+        partition = _evaluate(day, {'date': value}) if in_range else None
+        expected = _int_to_date(value)
+        assert partition == (expected.strftime('%Y%m%d') if expected else None), value
+
+    rows = PARTITION_SPECS['finances'].mongo_rows_pipeline('20250115')
+    assert rows[0] == {'$match': {'date': {'$gte': 20250115, '$lt': 20250116}}}
+    assert "entry_date IS NOT NULL" in PARTITION_SPECS['finances'].pg_digest_sql
+    print("✅ Datas inválidas fora do digest financeiro")
+
+if __name__ == "__main__":
+    test_diff_partitions()
+    test_diff_rows()
+    test_engine_drills_only_divergent_partitions()
+    test_finance_digest_skips_invalid_dates()
+    print("🎉 Testes de reconciliação concluídos")
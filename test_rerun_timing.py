@@ -0,0 +1,42 @@
+"""
+Teste do registro de tempos de execução das páginas
+"""
+import sys
+import os
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from utils.rerun_timing import record, timed, timed_stage, timing_summary, reset_timings
+
+def test_timing_summary():
+    """Amostras por etapa viram execuções, mediana, p95 e máximo"""
+    print("🔄 Testando tempos de execução...")
+    reset_timings()
+    for ms in (10, 20, 30, 40, 1000):
+        record('pagina', ms / 1000)
+
+    @timed_stage('fragmento')
+    def render(value):
+        return value * 2
+
+    assert render(21) == 42
+    try:
+        with timed('falha'):
+            raise ValueError()
+    except ValueError:
+        pass
+
+    summary = timing_summary()
+    assert list(summary) == ['falha', 'fragmento', 'pagina']
+    assert summary['pagina']['runs'] == 5
+    assert round(summary['pagina']['p50_ms']) == 30
+    assert round(summary['pagina']['max_ms']) == 1000
+    assert summary['fragmento']['runs'] == 1 and summary['falha']['runs'] == 1
+    reset_timings()
+    assert timing_summary() == {}
+    print("✅ Tempos de execução")
+
+if __name__ == "__main__":
+    test_timing_summary()
+    print("🎉 Testes de tempos concluídos")
@@ -0,0 +1,66 @@
+"""
+Teste dos índices de busca (ticket por prefixo/faixa e nomes por trigramas)
+Compara com a varredura linha a linha equivalente
+"""
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from src.search_index import TicketIndex, NameIndex, parse_ticket_query, fold
+
+def test_ticket_prefix_and_range():
+    """Prefixo ancorado e faixa inclusiva, nas posições originais das linhas"""
+    print("🔄 Testando busca de ticket...")
+    rng = np.random.default_rng(5)
+    tickets = pd.Series(rng.integers(0, 50000, 3000).astype(float))
+    tickets.iloc[:5] = [np.nan, -1, 12.5, 0, 120]
+    index = TicketIndex(tickets)
+
+    text = tickets.map(lambda t: str(int(t)) if pd.notna(t) and t >= 0 and t == int(t) else '')
+    for prefix in ['1', '12', '120', '4999', '0']:
+        expected = np.flatnonzero(text.str.startswith(prefix))
+        assert np.array_equal(index.search(prefix), expected), prefix
+    assert len(index.search('07')) == 0
+
+    expected = np.flatnonzero((tickets >= 100) & (tickets <= 300) & (tickets == tickets.round()))
+    assert np.array_equal(index.search(' 300 - 100 '), expected)
+    assert index.search('') is None and index.mask('  ') is None
+    assert len(index.search('abc')) == 0
+    assert index.mask('120').sum() == len(index.search('120'))
+    assert parse_ticket_query('100-200') == ('range', 100, 200)
+    assert parse_ticket_query('12%') is None
+    print("✅ Busca de ticket")
+
+def test_name_search():
+    """'Contém' sem acentos e sem maiúsculas, em qualquer das colunas indexadas"""
+    print("🔄 Testando busca de nomes...")
+    rng = np.random.default_rng(9)
+    names = [f"{base} {i}" for i, base in enumerate(['São João', 'Agropecuária Três', 'JOSÉ', 'Conceição'] * 50)]
+    df = pd.DataFrame({
+        'buyer_name': rng.choice(names + [None], 2000),
+        'seller_name': rng.choice(names, 2000)
+    })
+    index = NameIndex(df, ['buyer_name', 'seller_name', 'ausente'])
+    folded = df.apply(lambda col: col.map(lambda v: fold(v) if isinstance(v, str) else ''))
+
+    for query in ['sao joao 1', 'AGROPECUARIA', 'jo', 'ão', 'cei', 'tres 99', 'x']:
+        term = fold(query)
+        expected = np.flatnonzero(
+            folded['buyer_name'].str.contains(term, regex=False) | folded['seller_name'].str.contains(term, regex=False)
+        )
+        assert np.array_equal(index.search(query), expected), query
+
+    assert index.search(' ') is None
+    assert len(index.search('inexistente')) == 0
+    assert NameIndex(df.iloc[:0], ['buyer_name']).search('sao') is not None
+    print("✅ Busca de nomes")
+
+if __name__ == "__main__":
+    test_ticket_prefix_and_range()
+    test_name_search()
+    print("🎉 Testes dos índices de busca concluídos")
@@ -0,0 +1,162 @@
+"""
+Teste dos snapshots colunares das páginas
+Grava e lê arquivos Arrow num diretório temporário; o MongoDB é simulado por
+coleções em memória que devolvem o resultado já agregado
+"""
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+from bson import ObjectId, Decimal128
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from fakes import FakeCollection
+from src.analytics import (
+    DUCKDB_AVAILABLE, open_engine, finance_years, finance_monthly, frame_totals, contract_totals, contract_client_volumes
+)
+from src.snapshots import (
+    write_snapshot, load_snapshot, load_dataset, documents_to_frame, merge_delta, latest_snapshot_path
+)
+
+def _collections(**overrides):
+    names = ['ticketv2', 'ticketv2_transactions', 'orderv2', 'users', 'provisionings',
+             'grains', 'finances', 'finances_categories']
+    collections = {name: FakeCollection() for name in names}
+    collections.update(overrides)
+    return collections
+
+def test_roundtrip_and_versions():
+    """Snapshot gravado é lido de volta com a marca d'água; só as últimas versões ficam"""
+    print("🔄 Testando gravação e leitura de snapshots...")
+    directory = tempfile.mkdtemp()
+    ticket_id = ObjectId()
+    df = documents_to_frame('cargas', [{
+        '_id': ticket_id, 'transaction_index': 0, 'ticket': 10, 'status': 'done',
+        'loadingDate': datetime(2025, 3, 1), 'amount': Decimal128('12.5'),
+        'transactions': {'amount': 12.5}, 'buyer_info': [{'name': 'X'}], 'misto': 'a'
+    }, {
+        '_id': ObjectId(), 'transaction_index': 0, 'ticket': 11, 'status': 'done',
+        'loadingDate': datetime(2025, 3, 2), 'amount': 3, 'misto': 7
+    }])
+    assert 'buyer_info' not in df.columns
+    assert df.loc[0, '_id'] == str(ticket_id)
+
+    watermark = datetime(2025, 3, 3, 12, 0)
+    for _ in range(5):
+        write_snapshot('cargas', df, watermark, directory)
+    assert len([f for f in os.listdir(os.path.join(directory, 'cargas')) if f.endswith('.arrow')]) == 3
+
+    loaded, loaded_watermark = load_snapshot('cargas', directory)
+    assert loaded_watermark == watermark
+    assert list(loaded['ticket']) == [10, 11]
+    assert loaded['amount'].tolist() == [12.5, 3.0]
+    assert loaded['misto'].tolist() == ['a', '7']
+    assert latest_snapshot_path('contratos', directory) is None
+    print("✅ Snapshot gravado e lido")
+
+def test_delta_replaces_changed_documents():
+    """Documento alterado substitui todas as suas linhas; cancelado sai do resultado"""
+    print("🔄 Testando mescla do delta...")
+    a, b = str(ObjectId()), str(ObjectId())
+    snapshot = documents_to_frame('cargas', [
+        {'_id': a, 'transaction_index': 0, 'status': 'done', 'amount': 1},
+        {'_id': a, 'transaction_index': 1, 'status': 'done', 'amount': 2},
+        {'_id': b, 'transaction_index': 0, 'status': 'done', 'amount': 3},
+    ])
+    delta = documents_to_frame('cargas', [
+        {'_id': a, 'transaction_index': 0, 'status': 'done', 'amount': 10},
+    ])
+    merged = merge_delta('cargas', snapshot, delta)
+    assert sorted(merged['amount'].tolist()) == [3, 10]
+
+    canceled = documents_to_frame('cargas', [{'_id': b, 'transaction_index': 0, 'status': 'Cancelado', 'amount': 3}])
+    assert merge_delta('cargas', snapshot, canceled)['_id'].tolist() == [a, a]
+    print("✅ Delta mesclado")
+
+def test_load_dataset_queries_only_delta():
+    """Com snapshot, o MongoDB é consultado só a partir da marca d'água"""
+    print("🔄 Testando leitura snapshot + delta...")
+    directory = tempfile.mkdtemp()
+    kept, changed = ObjectId(), ObjectId()
+    watermark = datetime.now() - timedelta(hours=1)
+    write_snapshot('finances', documents_to_frame('finances', [
+        {'_id': kept, 'date': 20250101, 'value': 100.0},
+        {'_id': changed, 'date': 20250102, 'value': 50.0},
+    ]), watermark, directory)
+
+    finances = FakeCollection([{'_id': changed, 'date': 20250102, 'value': 75.0, 'isIgnored': False}])
+    df = load_dataset('finances', _collections(finances=finances), directory)
+    assert sorted(df['value'].tolist()) == [75.0, 100.0]
+    assert finances.pipelines[0][0]['$match']['updatedAt'] == {'$gte': watermark}
+
+    assert load_dataset('contratos', _collections(), directory) is None
+    print("✅ Snapshot + delta")
+
+def test_analytics_engine():
+    """SQL sobre snapshot + delta devolve os mesmos totais que o pandas"""
+    print("🔄 Testando motor analítico...")
+    if not DUCKDB_AVAILABLE:
+        print("⚠️ duckdb não instalado, teste ignorado")
+        return
+    directory = tempfile.mkdtemp()
+    changed, ignored = ObjectId(), ObjectId()
+    rows = [
+        {'_id': ObjectId(), 'date': 20240105, 'value': 100.0, 'category_name': 'OPERACIONAL', 'category_item': 'Venda'},
+        {'_id': ObjectId(), 'date': 20240110, 'value': -40.0, 'category_name': 'OPERACIONAL', 'category_item': 'Venda'},
+        {'_id': changed, 'date': 20250201, 'value': 10.0, 'category_name': 'IMPOSTOS', 'category_item': 'ICMS'},
+        {'_id': ignored, 'date': 20250202, 'value': 5.0, 'category_name': 'IMPOSTOS', 'category_item': 'ICMS'},
+        {'_id': ObjectId(), 'date': 0, 'value': 7.0, 'category_name': 'OUTROS', 'category_item': 'X'},
+    ]
+    write_snapshot('finances', documents_to_frame('finances', rows), datetime.now(), directory)
+
+    finances = FakeCollection([
+        {'_id': changed, 'date': 20250201, 'value': 30.0, 'category_name': 'IMPOSTOS', 'category_item': 'ICMS'},
+        {'_id': ignored, 'date': 20250202, 'value': 5.0, 'category_name': 'IMPOSTOS', 'category_item': 'ICMS', 'isIgnored': True},
+    ])
+    engine = open_engine(_collections(finances=finances), ['finances'], directory)
+    assert finance_years(engine) == [2025, 2024]
+
+    monthly = finance_monthly(engine)
+    assert monthly['value'].sum() == 100.0 - 40.0 + 30.0 + 7.0
+    # Entradas e saídas do mesmo mês/item ficam separadas
+    assert sorted(monthly[monthly['category_item'] == 'Venda']['value']) == [-40.0, 100.0]
+    assert finance_monthly(engine, 2025)['value'].tolist() == [30.0]
+    engine.close()
+
+    assert open_engine(_collections(), ['contratos'], directory) is None
+    print("✅ Motor analítico")
+
+def test_frame_aggregations():
+    """Totais e volumes por cliente do recorte filtrado: mesmos números do pandas"""
+    print("🔄 Testando agregações do recorte...")
+    if not DUCKDB_AVAILABLE:
+        print("⚠️ duckdb não instalado, teste ignorado")
+        return
+    df = pd.DataFrame({
+        'cliente': ['A', 'B', None, 'A'],
+        'amount': [10.0, 20.0, 5.0, None],
+        'total': [100.0, 50.0, 1.0, 2.0],
+        'pis_cofins_value': [1.0, None, 2.0, 3.0],
+        '_id': ['c1', 'c2', 'c3', 'c4']
+    })
+    assert frame_totals(df, {'bags': 'amount', 'revenue': 'revenue_value'}) == {'bags': 35.0, 'revenue': 0.0}
+    assert contract_totals(df) == {'bags': 35.0, 'value': 153.0, 'clients': 2, 'pis_cofins': 6.0}
+
+    volumes = contract_client_volumes(df)
+    expected = df.groupby('cliente').agg({'amount': 'sum', 'total': 'sum', '_id': 'count'})
+    assert list(volumes.index) == ['B', 'A']
+    assert volumes.loc['A'].tolist() == expected.loc['A'].tolist() == [10.0, 102.0, 2]
+    assert contract_client_volumes(df.iloc[0:0]).empty
+    print("✅ Agregações do recorte")
+
+if __name__ == "__main__":
+    test_roundtrip_and_versions()
+    test_delta_replaces_changed_documents()
+    test_load_dataset_queries_only_delta()
+    test_analytics_engine()
+    test_frame_aggregations()
+    print("🎉 Testes de snapshots concluídos")
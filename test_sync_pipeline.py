@@ -0,0 +1,270 @@
+"""
+Teste do pipeline de sincronização por entidade
+O PostgreSQL é simulado por uma conexão que só registra os comandos e
+devolve a marca d'água configurada
+"""
+import sys
+import os
+import dataclasses
+import threading
+import time
+from datetime import datetime, date
+
+from bson import ObjectId
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+from fakes import FakeCollection, RecordingConnection
+import src.sync_pipeline as sync_pipeline
+from src.sync_pipeline import (
+    ENTITIES_BY_NAME, SYNC_START_DATE, BatchStream, sync_entity, get_watermark, save_watermark,
+    upsert_batch_with_fallback, run_after_sync, run_parallel_sync
+)
+from src.delivery_summary import SUMMARY_COLLECTION
+
+def _collections():
+    names = ['ticketv2', 'ticketv2_transactions', 'orderv2', 'users', 'provisionings',
+             'finances', SUMMARY_COLLECTION]
+    return {name: FakeCollection() for name in names}
+
+def _connection(watermark=None):
+    """Conexão falsa cujo SELECT da marca d'água devolve `watermark`"""
+    return RecordingConnection({'FROM sync_watermarks': [(watermark,)] if watermark else []})
+
+def _run(entity, watermark=None, docs=(), connection=None):
+    """Sincroniza a entidade contra a conexão falsa; retorna (resultado, comandos, extrações)"""
+    connection = connection or _connection(watermark)
+    extractions = []
+
+    def extract(collections, since, ids=None):
+        extractions.append((since, ids))
+        return list(docs)
+
+    entity = dataclasses.replace(entity, extract=extract, prepare=None)
+    original = sync_pipeline.get_postgres_connection
+    sync_pipeline.get_postgres_connection = lambda: connection
+    try:
+        result = sync_entity(entity, {})
+    finally:
+        sync_pipeline.get_postgres_connection = original
+    return result, connection.statements(), extractions
+
+def test_full_load_drops_legacy_keys():
+    """Sem marca d'água, as linhas com a chave antiga (só o _id) saem na mesma transação"""
+    print("🔄 Testando remoção das chaves antigas de cargas...")
+    result, commands, extractions = _run(ENTITIES_BY_NAME['cargas'])
+    assert result.success and extractions == [(None, None)]
+    assert "DELETE FROM cargas WHERE ticket_id NOT LIKE '%:%'" in commands
+
+    # Sincronização incremental não varre a tabela atrás de chaves antigas
+    result, commands, extractions = _run(ENTITIES_BY_NAME['cargas'], watermark=datetime(2025, 6, 1))
+    assert result.success and extractions == [(datetime(2025, 6, 1), None)]
+    assert not any('NOT LIKE' in sql for sql in commands)
+    print("✅ Chaves antigas removidas na carga completa")
+
+def test_extractors_filter_by_watermark():
+    """Cada extrator aplica a marca d'água (ou os ids da dead-letter) no primeiro $match"""
+    print("🔄 Testando extratores...")
+    since = datetime(2025, 6, 1)
+    oid = ObjectId()
+    assert sync_pipeline._since_match({"a": 1}, None) == {"a": 1}
+    assert sync_pipeline._since_match({"a": 1}, since) == {"a": 1, "updatedAt": {"$gte": since}}
+    # ids têm precedência sobre a marca d'água; strings válidas viram ObjectId
+    assert sync_pipeline._since_match({}, since, [str(oid), 'x']) == {"_id": {"$in": [oid, 'x']}}
+
+    collections = _collections()
+    for name, source in (('cargas', 'ticketv2'), ('provisionings', 'provisionings'), ('finances', 'finances')):
+        ENTITIES_BY_NAME[name].extract(collections, since)
+        match = collections[source].pipelines[-1][0]["$match"]
+        assert match["updatedAt"] == {"$gte": since}, name
+        assert collections[source].options[-1]["batchSize"] == sync_pipeline.STREAM_BATCH_SIZE
+    assert collections['ticketv2'].pipelines[-1][0]["$match"]["loadingDate"] == {"$gte": SYNC_START_DATE}
+
+    # Contratos: também os que tiveram entregas recalculadas no resumo
+    collections[SUMMARY_COLLECTION].documents = [{'_id': 'A', 'refreshedAt': datetime(2025, 6, 2)}]
+    ENTITIES_BY_NAME['contratos'].extract(collections, since)
+    assert collections['orderv2'].pipelines[-1][0] == {"$match": {"$or": [
+        {"updatedAt": {"$gte": since}}, {"_id": {"$in": ['A']}}
+    ]}}
+    # Carga completa: sem $match de marca d'água
+    ENTITIES_BY_NAME['contratos'].extract(collections, None)
+    assert "$match" not in collections['orderv2'].pipelines[-1][0]
+    print("✅ Extratores")
+
+def test_watermark_roundtrip():
+    """Marca d'água lida por entidade, gravada sem retroceder e avançada pelo maior updatedAt"""
+    print("🔄 Testando marca d'água...")
+    connection = _connection(datetime(2025, 6, 1))
+    cursor = connection.cursor()
+    assert get_watermark(cursor, 'finances') == datetime(2025, 6, 1)
+    assert connection.commands[-1][1] == ('finances',)
+    assert get_watermark(_connection().cursor(), 'finances') is None
+
+    save_watermark(cursor, 'finances', datetime(2025, 7, 1), 10)
+    sql, params = connection.commands[-1]
+    assert "GREATEST(sync_watermarks.last_updated_at, EXCLUDED.last_updated_at)" in sql
+    assert params == ('finances', datetime(2025, 7, 1), 10)
+
+    docs = [
+        {'_id': 'a', 'date': 20250102, 'value': 1, 'updatedAt': datetime(2025, 6, 3)},
+        {'_id': 'b', 'date': 20250103, 'value': 2, 'updatedAt': datetime(2025, 6, 9)}
+    ]
+    result, _, _ = _run(ENTITIES_BY_NAME['finances'], watermark=datetime(2025, 6, 1), docs=docs)
+    assert result.success and result.rows == 2
+    assert result.watermark == datetime(2025, 6, 9)
+
+    # Nada novo: a marca d'água anterior é mantida
+    result, _, _ = _run(ENTITIES_BY_NAME['finances'], watermark=datetime(2025, 6, 1))
+    assert result.watermark == datetime(2025, 6, 1) and result.rows == 0
+    assert sync_pipeline._int_to_date(20250231) is None
+    assert sync_pipeline._int_to_date(20250228) == date(2025, 2, 28)
+    print("✅ Marca d'água")
+
+def test_batch_stream_backpressure():
+    """Produtor para de ler o cursor quando a fila de lotes está cheia"""
+    print("🔄 Testando backpressure do stream...")
+    read = []
+
+    def docs():
+        for i in range(1000):
+            read.append(i)
+            yield {'_id': i, 'updatedAt': datetime(2025, 1, 1 + i % 28)}
+
+    stream = BatchStream(docs(), lambda doc: (doc['_id'],), batch_size=10, max_pending=2)
+    batches = iter(stream)
+    assert next(batches) == [(i,) for i in range(10)]
+    time.sleep(0.2)
+    # Um lote entregue, dois na fila e um montado esperando vaga
+    assert len(read) <= 10 * 4
+    batches.close()
+    assert len(read) < 1000
+
+    # Consumido até o fim: todos os lotes, marca d'água e falhas de conversão
+    def to_row(doc):
+        if doc['_id'] == 3:
+            raise KeyError('ticket')
+        return (doc['_id'],)
+
+    stream = BatchStream(({'_id': i, 'updatedAt': datetime(2025, 1, i + 1)} for i in range(25)), to_row, batch_size=10)
+    rows = [row for batch in stream for row in batch]
+    assert len(rows) == 24 and (3,) not in rows
+    assert stream.watermark == datetime(2025, 1, 25)
+    assert [doc['_id'] for doc, _ in stream.transform_failures] == [3]
+    print("✅ Backpressure do stream")
+
+def test_batch_stream_propagates_producer_error():
+    """Erro do cursor aparece no consumidor depois dos lotes já lidos"""
+    print("🔄 Testando erro do produtor...")
+
+    def docs():
+        yield from ({'_id': i} for i in range(5))
+        raise ConnectionError("cursor perdido")
+
+    received = []
+    try:
+        for batch in BatchStream(docs(), lambda doc: (doc['_id'],), batch_size=2):
+            received.extend(batch)
+        assert False, "erro do cursor engolido"
+    except ConnectionError as e:
+        assert str(e) == "cursor perdido"
+    assert received == [(0,), (1,), (2,), (3,)]
+    print("✅ Erro do produtor propagado")
+
+def test_upsert_bisection_isolates_bad_rows():
+    """Lote com uma linha ruim é dividido ao meio até isolá-la; as demais são gravadas"""
+    print("🔄 Testando isolamento de linhas com erro...")
+    entity = ENTITIES_BY_NAME['finances']
+    rows = [(f"id{i}",) + (None,) * (len(entity.columns) - 1) for i in range(16)]
+    rows[11] = ('RUIM',) + rows[11][1:]
+
+    connection = RecordingConnection(fail_on={'INSERT': 'RUIM'})
+    inserted, failures = upsert_batch_with_fallback(connection.cursor(), entity, rows)
+    assert inserted == 15
+    assert [row[0] for row, _ in failures] == ['RUIM']
+    assert isinstance(failures[0][1], ValueError)
+    # O(log n): 1 lote + 2 metades por nível até a linha isolada
+    commands = [sql.split()[0] for sql in connection.statements()]
+    assert commands.count('INSERT') == 1 + 2 * 4
+    assert commands.count('ROLLBACK') == 5
+
+    connection = RecordingConnection(fail_on={'INSERT': 'RUIM'})
+    assert upsert_batch_with_fallback(connection.cursor(), entity, rows[:8]) == (8, [])
+    assert [sql.split()[0] for sql in connection.statements()] == ['SAVEPOINT', 'INSERT', 'RELEASE']
+    print("✅ Linhas com erro isoladas")
+
+def test_after_sync_hook():
+    """Agregados atualizados numa transação própria, depois da carga, mesmo sem linhas novas"""
+    print("🔄 Testando pós-processamento...")
+    connection = _connection(datetime(2025, 6, 1))
+    result, commands, _ = _run(ENTITIES_BY_NAME['cargas'], connection=connection)
+    assert result.success and result.rows == 0
+    # Marca d'água confirmada antes da atualização do agregado
+    save = next(i for i, sql in enumerate(commands) if sql.startswith('INSERT INTO sync_watermarks'))
+    refresh = commands.index("DELETE FROM rollup_dirty_days WHERE rollup = %s RETURNING day")
+    assert save < refresh
+    assert connection.commits == 3
+
+    # Falha no pós-processamento não derruba a carga já confirmada
+    rolled_back = []
+    connection = RecordingConnection()
+    connection.rollback = lambda: rolled_back.append(True)
+
+    def failing_refresh(cursor):
+        raise RuntimeError("agregado indisponível")
+
+    entity = dataclasses.replace(ENTITIES_BY_NAME['cargas'], after_sync=failing_refresh)
+    assert run_after_sync(connection, entity) is False
+    assert rolled_back == [True] and connection.commits == 0
+    assert run_after_sync(connection, dataclasses.replace(entity, after_sync=None)) is True
+    print("✅ Pós-processamento")
+
+def test_schema_prepared_before_workers():
+    """DDL e agregados de todas as entidades rodam em sequência, antes dos workers"""
+    print("🔄 Testando preparo do esquema antes dos workers...")
+    connection = RecordingConnection()
+    events = []
+
+    def prepare(cursor, name):
+        events.append(('prepare', name, threading.current_thread().name))
+        if name == 'finances':
+            raise RuntimeError("sem permissão")
+
+    def extract(collections, since, ids=None, name=None):
+        events.append(('extract', name, threading.current_thread().name))
+        return []
+
+    entities = [
+        dataclasses.replace(ENTITIES_BY_NAME[name], after_sync=None,
+                            prepare=lambda cursor, name=name: prepare(cursor, name),
+                            extract=lambda collections, since, ids=None, name=name: extract(collections, since, ids, name))
+        for name in ['cargas', 'finances', 'contratos']
+    ]
+    original = sync_pipeline.get_postgres_connection
+    sync_pipeline.get_postgres_connection = lambda: connection
+    try:
+        results = run_parallel_sync({}, entities)
+    finally:
+        sync_pipeline.get_postgres_connection = original
+
+    main = threading.current_thread().name
+    assert [event[:2] for event in events[:3]] == [('prepare', 'cargas'), ('prepare', 'finances'), ('prepare', 'contratos')]
+    assert all(thread == main for kind, _, thread in events if kind == 'prepare')
+    assert sorted(name for kind, name, thread in events if kind == 'extract' and thread != main) == ['cargas', 'contratos']
+    # Entidade com falha no preparo não é sincronizada e não derruba as demais
+    assert not results['finances'].success and 'sem permissão' in results['finances'].error
+    assert results['cargas'].success and results['contratos'].success
+    commands = connection.statements()
+    assert commands.count(" ".join(ENTITIES_BY_NAME['contratos'].ddl[0].split())) == 1
+    print("✅ Esquema preparado antes dos workers")
+
+if __name__ == "__main__":
+    test_full_load_drops_legacy_keys()
+    test_extractors_filter_by_watermark()
+    test_watermark_roundtrip()
+    test_batch_stream_backpressure()
+    test_batch_stream_propagates_producer_error()
+    test_upsert_bisection_isolates_bad_rows()
+    test_after_sync_hook()
+    test_schema_prepared_before_workers()
+    print("🎉 Testes do pipeline de sincronização concluídos")
@@ -0,0 +1,103 @@
+"""
+Teste do aquecimento e da pré-carga das páginas
+Usa módulos de página falsos, sem banco nem Streamlit
+"""
+import sys
+import os
+import threading
+import types
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(__file__))
+
+import src.warmup as warmup
+
+def _fake_pages(calls, release=None):
+    """Registra módulos falsos com prefetch() e aponta PAGES para eles"""
+    pages = {}
+    for label in ['A', 'B', 'C']:
+        module = types.ModuleType(f"fake_page_{label}")
+
+        def prefetch(label=label):
+            if release is not None:
+                release.wait(5)
+            calls.append(label)
+            if label == 'C':
+                raise RuntimeError("banco fora do ar")
+
+        module.prefetch = prefetch
+        sys.modules[module.__name__] = module
+        pages[label] = module.__name__
+    warmup.PAGES = pages
+    warmup.NEXT_PAGES = {'A': ['B', 'C'], 'B': ['A'], 'C': ['A']}
+    warmup._transitions.clear()
+    warmup._last_prefetch.clear()
+    warmup._running.clear()
+    warmup._process_warmup = None
+
+def test_warm_all():
+    """Todas as páginas são aquecidas; falha em uma não interrompe as demais"""
+    print("🔄 Testando aquecimento completo...")
+    calls = []
+    _fake_pages(calls)
+    timings = warmup.warm_all()
+    assert calls == ['A', 'B', 'C']
+    assert set(timings) == {'A', 'B'}
+    print("✅ Aquecimento completo")
+
+def test_likely_next():
+    """Navegação observada tem prioridade sobre a ordem padrão"""
+    print("🔄 Testando próximas páginas prováveis...")
+    _fake_pages([])
+    assert warmup.likely_next('A') == ['B', 'C']
+    warmup.record_visit('A', 'C')
+    warmup.record_visit('A', 'C')
+    warmup.record_visit('A', 'A')
+    assert warmup.likely_next('A') == ['C', 'B']
+    assert warmup.likely_next('A', k=1) == ['C']
+    print("✅ Próximas páginas prováveis")
+
+def test_prefetch_async_dedup():
+    """Página em pré-carga ou aquecida há pouco não é carregada de novo"""
+    print("🔄 Testando pré-carga em segundo plano...")
+    calls = []
+    release = threading.Event()
+    _fake_pages(calls, release)
+
+    thread = warmup.prefetch_async(['A', 'B'])
+    assert thread is not None
+    # Enquanto a primeira roda, pedir as mesmas páginas não cria outra thread
+    assert warmup.prefetch_async(['A', 'B']) is None
+    release.set()
+    thread.join(5)
+    assert calls == ['A', 'B']
+
+    # Dentro do intervalo mínimo, nada a fazer; páginas desconhecidas são ignoradas
+    assert warmup.prefetch_async(['A', 'X']) is None
+    warmup._last_prefetch['A'] = 0
+    warmup.prefetch_async(['A']).join(5)
+    assert calls == ['A', 'B', 'A']
+    print("✅ Pré-carga em segundo plano")
+
+def test_warm_in_background_once():
+    """O aquecimento do processo roda uma única vez, mesmo com várias sessões"""
+    print("🔄 Testando aquecimento do processo...")
+    calls = []
+    release = threading.Event()
+    _fake_pages(calls, release)
+
+    thread = warmup.warm_in_background()
+    assert warmup.warm_in_background() is thread
+    release.set()
+    thread.join(5)
+    assert calls == ['A', 'B', 'C']
+    assert warmup.warm_in_background() is thread
+    assert calls == ['A', 'B', 'C']
+    print("✅ Aquecimento do processo")
+
+if __name__ == "__main__":
+    test_warm_all()
+    test_likely_next()
+    test_prefetch_async_dedup()
+    test_warm_in_background_once()
+    print("🎉 Testes de aquecimento concluídos")
@@ -0,0 +1,126 @@
+"""
+Formatação para exibição no padrão brasileiro
+Colunas inteiras são formatadas de uma vez (aritmética em numpy sobre uma
+matriz de bytes), sem uma chamada Python por célula
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    pa = None
+
+_ZERO, _COMMA, _DOT, _MINUS = ord('0'), ord(','), ord('.'), ord('-')
+_POWERS = 10 ** np.arange(19, dtype=np.int64)
+
+def _strings(data: np.ndarray, offsets: np.ndarray, index) -> pd.Series:
+    """Bytes contíguos + deslocamentos -> coluna de texto (sem laço Python com pyarrow)"""
+    if PYARROW_AVAILABLE:
+        array = pa.Array.from_buffers(pa.string(), len(offsets) - 1,
+                                      [None, pa.py_buffer(offsets), pa.py_buffer(data)])
+        text = array.to_pandas()
+        return text if index is None else text.set_axis(index)
+    text = data.tobytes().decode('ascii')
+    bounds = offsets.tolist()
+    return pd.Series([text[a:b] for a, b in zip(bounds[:-1], bounds[1:])], index=index, dtype=object)
+
+def _fixed(values, decimals: int, prefix: str = '', suffix: str = '', na_rep: str = '') -> pd.Series:
+    """Números -> prefix + '1.234.567,89' + suffix (na_rep onde não é número).
+
+    Os caracteres são montados numa matriz de bytes alinhada à direita, uma
+    coluna por posição, com operações sobre a coluna inteira; os bytes nulos
+    à esquerda são descartados e o resto vira texto de uma vez.
+    """
+    index = values.index if isinstance(values, pd.Series) else None
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    if not len(values):
+        return pd.Series([], index=index, dtype=object)
+    missing = ~np.isfinite(values)
+    scaled = np.round(np.abs(np.where(missing, 0, values)) * 10 ** decimals).astype(np.int64)
+    units, fraction = np.divmod(scaled, 10 ** decimals)
+    negative = (values < 0) & (scaled > 0)
+
+    # Tamanho de cada linha: prefixo, sinal, dígitos com separadores, decimais, sufixo
+    digits = np.maximum(np.searchsorted(_POWERS, units, side='right'), 1)
+    head, tail = prefix.encode(), suffix.encode()
+    length = len(head) + negative + digits + (digits - 1) // 3 + (decimals + 1 if decimals else 0) + len(tail)
+    width = int(length.max())
+    # Ordem de colunas: cada escrita abaixo percorre memória contígua
+    chars = np.zeros((len(values), width), dtype=np.uint8, order='F')
+
+    pos = width
+    for byte in reversed(tail):
+        pos -= 1
+        chars[:, pos] = byte
+    for _ in range(decimals):
+        fraction, digit = np.divmod(fraction, 10)
+        pos -= 1
+        chars[:, pos] = _ZERO + digit
+    if decimals:
+        pos -= 1
+        chars[:, pos] = _COMMA
+    remaining = units
+    for i in range(int(digits.max())):
+        present = digits > i
+        if i and i % 3 == 0:
+            pos -= 1
+            chars[:, pos] = np.where(present, _DOT, 0)
+        remaining, digit = np.divmod(remaining, 10)
+        pos -= 1
+        chars[:, pos] = np.where(present, _ZERO + digit, 0)
+
+    # Sinal e prefixo logo antes do primeiro dígito de cada linha
+    rows = np.arange(len(values))
+    start = width - length
+    chars[rows[negative], (start + len(head))[negative]] = _MINUS
+    for offset, byte in enumerate(head):
+        chars[rows, start + offset] = byte
+
+    offsets = np.zeros(len(values) + 1, dtype=np.int32)
+    np.cumsum(length, out=offsets[1:])
+    chars = np.ascontiguousarray(chars)
+    text = _strings(chars[chars != 0], offsets, index)
+    return text.mask(missing, na_rep) if missing.any() else text
+
+def format_brl_series(values, na_rep: str = "R$ 0,00") -> pd.Series:
+    """Coluna em reais: 'R$ 1.234,56'"""
+    return _fixed(values, 2, prefix='R$ ', na_rep=na_rep)
+
+def format_number_series(values, decimals: int = 0, na_rep: str = "0") -> pd.Series:
+    """Coluna numérica com separador de milhar: '12.345' ou '12.345,6'"""
+    return _fixed(values, decimals, na_rep=na_rep)
+
+def format_percent_series(values, decimals: int = 2, na_rep: str = "") -> pd.Series:
+    """Coluna já em pontos percentuais: 12.346 -> '12,35%'"""
+    return _fixed(values, decimals, suffix='%', na_rep=na_rep)
+
+def format_date_series(values, fmt: str = '%d/%m/%Y', na_rep: str = "") -> pd.Series:
+    """Coluna de datas como texto (valores inválidos ficam vazios)"""
+    return pd.to_datetime(values, errors='coerce').dt.strftime(fmt).fillna(na_rep)
+
+def format_brl(value, na_rep: str = "R$ 0,00") -> str:
+    """Valor único em reais (métricas)"""
+    return format_brl_series([value], na_rep).iloc[0]
+
+def format_number(value, decimals: int = 0, na_rep: str = "0") -> str:
+    return format_number_series([value], decimals, na_rep).iloc[0]
+
+def format_percent(value, decimals: int = 2, na_rep: str = "") -> str:
+    return format_percent_series([value], decimals, na_rep).iloc[0]
+
+def format_frame(df: pd.DataFrame, currency: Optional[Iterable[str]] = None,
+                 numbers: Optional[Iterable[str]] = None, percents: Optional[Iterable[str]] = None,
+                 dates: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Cópia do DataFrame com as colunas indicadas formatadas (as ausentes são ignoradas)"""
+    df = df.copy()
+    for formatter, columns in ((format_brl_series, currency), (format_number_series, numbers),
+                               (format_percent_series, percents), (format_date_series, dates)):
+        for column in columns or []:
+            if column in df.columns:
+                df[column] = formatter(df[column])
+    return df
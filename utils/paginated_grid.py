@@ -0,0 +1,77 @@
+"""
+Tabela paginada para as páginas do sistema
+Só a página visível vai para o navegador; ordenação e paginação ficam com quem
+busca os dados (consulta por chave no PostgreSQL ou o DataFrame já filtrado).
+A tabela é um fragmento: trocar ordenação ou página reexecuta só ela
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import streamlit as st
+import pandas as pd
+
+from utils.rerun_timing import timed
+
+DEFAULT_PAGE_SIZE = 100
+
+# fetch_page(coluna, decrescente, chave) -> (página, chave da próxima página ou None)
+PageFetcher = Callable[[str, bool, Any], Tuple[pd.DataFrame, Any]]
+
+def frame_page_fetcher(df: pd.DataFrame, page_size: int = DEFAULT_PAGE_SIZE) -> PageFetcher:
+    """Páginas de um DataFrame em memória; a chave é a posição inicial da página"""
+    def fetch(sort: str, descending: bool, after: Optional[int]) -> Tuple[pd.DataFrame, Any]:
+        start = after or 0
+        # Ordena só a coluna escolhida e recorta as posições da página
+        order = df[sort].reset_index(drop=True).sort_values(
+            ascending=not descending, kind='stable', na_position='last'
+        ).index
+        end = start + page_size
+        return df.iloc[order[start:end]], end if end < len(df) else None
+    return fetch
+
+@st.fragment
+def paginated_grid(key: str, fetch_page: PageFetcher, sort_options: Dict[str, str],
+                   default_sort: str, render: Callable[[pd.DataFrame], None],
+                   reset_on: Any = None, default_descending: bool = True,
+                   empty_message: str = "Nenhum registro encontrado.") -> pd.DataFrame:
+    """Seletor de ordenação, página atual e navegação anterior/próxima.
+
+    `sort_options` mapeia rótulo -> coluna; `reset_on` (ex.: os filtros) volta
+    para a primeira página quando muda. Retorna a página exibida.
+    """
+    with timed(f"{key}:tabela"):
+        return _grid(key, fetch_page, sort_options, default_sort, render,
+                     reset_on, default_descending, empty_message)
+
+def _grid(key, fetch_page, sort_options, default_sort, render, reset_on, default_descending, empty_message):
+    labels = list(sort_options)
+    col_sort, col_order = st.columns([3, 1])
+    with col_sort:
+        sort_label = st.selectbox("Ordenar por", labels, index=labels.index(default_sort), key=f"{key}_sort")
+    with col_order:
+        ascending = st.checkbox("Ascendente", value=not default_descending, key=f"{key}_ascending")
+    sort, descending = sort_options[sort_label], not ascending
+
+    # Pilha com a chave inicial de cada página visitada
+    state = (reset_on, sort, descending)
+    if st.session_state.get(f"{key}_state") != state:
+        st.session_state[f"{key}_state"] = state
+        st.session_state[f"{key}_pages"] = [None]
+    pages = st.session_state[f"{key}_pages"]
+
+    df_page, next_key = fetch_page(sort, descending, pages[-1])
+    if df_page.empty:
+        st.info(empty_message)
+        return df_page
+
+    render(df_page)
+
+    # A pilha muda no callback, antes do rerun do fragmento
+    col_prev, col_page, col_next = st.columns([1, 1, 1])
+    with col_prev:
+        st.button("⬅️ Página anterior", disabled=len(pages) == 1, key=f"{key}_prev", on_click=pages.pop)
+    with col_page:
+        st.caption(f"Página {len(pages)}")
+    with col_next:
+        st.button("Próxima página ➡️", disabled=next_key is None, key=f"{key}_next",
+                  on_click=pages.append, args=(next_key,))
+    return df_page
@@ -0,0 +1,66 @@
+"""
+Tempos de execução das páginas: rerun completo e reruns parciais (fragmentos)
+Amostras guardadas por processo para comparar a estrutura das páginas
+"""
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Amostras mantidas por etapa (as mais antigas são descartadas)
+MAX_SAMPLES = int(os.getenv('FOX_TIMING_SAMPLES', 500))
+# Exibe o resumo na barra lateral
+SHOW_TIMINGS = os.getenv('FOX_SHOW_TIMINGS', '0') == '1'
+
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_lock = threading.Lock()
+
+def record(name: str, seconds: float):
+    with _lock:
+        _samples[name].append(seconds)
+    logger.debug(f"⏱️ {name}: {seconds * 1000:.1f} ms")
+
+@contextmanager
+def timed(name: str):
+    """Mede o bloco e registra a amostra em `name`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def timed_stage(name: str):
+    """Decorator: cada execução da função (ex.: rerun de um fragmento) vira uma amostra"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timing_summary() -> Dict[str, Dict[str, float]]:
+    """Por etapa: execuções, mediana, p95 e máximo (ms)"""
+    with _lock:
+        samples = {name: np.array(values) * 1000 for name, values in _samples.items() if values}
+    return {
+        name: {
+            'runs': len(values),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)),
+            'max_ms': float(values.max())
+        }
+        for name, values in sorted(samples.items())
+    }
+
+def reset_timings():
+    with _lock:
+        _samples.clear()